@@ -0,0 +1,132 @@
+"""
+Aggregation of extraction results into error patterns.
+
+Usage:
+    python main.py --records records.jsonl.gz    # extraction, also writes per-line records
+    python aggregate.py records.jsonl.gz         # rebuild the output files from records only
+
+Output files:
+    - Error_message.txt
+    - Error_pattern_example.json / Error_pattern_example.txt
+    - Error_pattern.json / Error_pattern.txt
+
+Note:
+    - adjust threshold() for desired result, or filter with
+      --min-count 11 --top-k 5 --min-score 3 --score pmi|llr|rel_freq|count
+    - --scores scores.tsv writes every (headword, change) with frequency, relative frequency, PMI and log-likelihood
+    - counts and examples are kept in a CompactAggregator,
+      --memory-budget MB spills example indices to disk beyond that size
+"""
+import argparse
+import json
+from datetime import datetime
+
+from extraction_records import read_records
+from compact_aggregator import CompactAggregator
+from rule_scoring import RuleScores, SCORES
+
+
+def threshold(dic, min_count=11, top_k=None, min_score=None, score=None):
+    """
+    Patterns with frequency > 10 by default,
+    optionally only the top_k of each headword, by score if given, otherwise by frequency,
+    or with association score >= min_score (see rule_scoring.py)
+    """
+    return RuleScores.from_counts(dic).filter(min_count, top_k, min_score, score)
+
+
+def add_filter_arguments(parser):
+    """
+    Command line options of threshold()
+    """
+    parser.add_argument('--min-count', type=int, default=11, help='minimum frequency of a change')
+    parser.add_argument('--top-k', type=int, default=None, help='keep the k best changes of each headword, by --score or by frequency')
+    parser.add_argument('--min-score', type=float, default=None, help='minimum association score')
+    parser.add_argument('--score', default=None, choices=SCORES, help='score compared with --min-score (default pmi) and ranked by --top-k')
+
+
+def filter_kwargs(args):
+    return dict(min_count=args.min_count, top_k=args.top_k, min_score=args.min_score, score=args.score)
+
+
+def aggregate_results(results, error_file=None, aggregator=None):
+    """
+    Count (headword, change) of results from main.gen_ef_pattern(),
+    and collect the index of lines they are found in.
+    Error logs are written into error_file.
+
+    Return the aggregator, a CompactAggregator unless another one is given
+    """
+    if aggregator is None:
+        aggregator = CompactAggregator()
+    for res in results:
+        aggregator.add_result(res, error_file)
+
+    return aggregator
+
+
+def write_outputs(hw_pat_dict, hw_pat_dict_example, prefix='Error_pattern'):
+    """
+    Write thresholded counts and examples, in json and txt format
+
+    hw_pat_dict_example is an aggregator, its examples are written one pair at a time
+    """
+    # Output json file
+    with open(prefix+'.json', 'w') as f:
+        json.dump(hw_pat_dict, f)
+
+    # Output in txt format
+    hw_pat_dict = [ (hw, pat, hw_pat_dict[hw][pat]) for hw in hw_pat_dict for pat in hw_pat_dict[hw] ]
+    with open(prefix+'.txt', 'w') as f:
+        for line in hw_pat_dict:
+            f.write(str(line)+'\n')
+
+    # Output example json file and txt format together, same layout as json.dump() of nested dicts
+    with open(prefix+'_example.json','w') as f_json, open(prefix+'_example.txt', 'w') as f_txt:
+        f_json.write('{')
+        prev_hw = None
+        for hw, pat, examples in hw_pat_dict_example.iter_examples():
+            if hw != prev_hw:
+                if prev_hw is not None:
+                    f_json.write('}, ')
+                f_json.write(json.dumps(hw)+': {')
+            else:
+                f_json.write(', ')
+            f_json.write(json.dumps(pat)+': '+json.dumps(examples))
+            f_txt.write(str((hw, pat, examples))+'\n')
+            prev_hw = hw
+        if prev_hw is not None:
+            f_json.write('}')
+        f_json.write('}')
+
+
+if __name__=='__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('records', help='record file written by main.py --records')
+    parser.add_argument('--prefix', default='Error_pattern', help='prefix of output files')
+    parser.add_argument('--error-file', default='Error_message.txt', help='where error logs are written')
+    parser.add_argument('--memory-budget', type=int, default=None, help='MB of example indices kept in memory before spilling to disk')
+    parser.add_argument('--no-delta', action='store_true', help='keep example indices as array(\'I\') instead of varint deltas')
+    parser.add_argument('--scores', default=None, help='also write every (headword, change) with its scores into a tsv file')
+    add_filter_arguments(parser)
+    args = parser.parse_args()
+
+    start_time = datetime.now()
+
+    aggregator = CompactAggregator(delta=not args.no_delta, memory_budget=args.memory_budget*2**20 if args.memory_budget else None)
+    with open(args.error_file, 'w') as error_file:
+        aggregate_results(read_records(args.records), error_file, aggregator)
+
+    counts = aggregator.counts_dict()
+    if args.scores:
+        with open(args.scores, 'w') as f:
+            f.write('\t'.join(['headword', 'change'] + SCORES)+'\n')
+            for row in RuleScores.from_counts(counts).iter_scores():
+                f.write('\t'.join(map(str, row))+'\n')
+
+    hw_pat_dict = threshold(counts, **filter_kwargs(args))
+    write_outputs(hw_pat_dict, aggregator, args.prefix)
+    aggregator.close()
+
+    print(str(datetime.now()-start_time))
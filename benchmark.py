@@ -0,0 +1,318 @@
+"""
+Stage level benchmark of the extraction on a synthetic EF-style corpus,
+so that changes can be measured without the EF corpus.
+
+from benchmark import make_corpus, run_stages, run_end_to_end
+
+Sample:
+    make_corpus(3, fmt='slash', seed=1)
+Return:
+    ['We depended [-of//XC-]{+on//XC+} my parents with my friends .',
+     'He [-agred//SP-]{+agreed//SP+} [-to//XC-]{+with//XC+} her answer with my friends .',
+     'Our parents listened to the music after school .']
+
+Usage:
+    python benchmark.py --lines 2000 --format mixed --workers 1,2,4 --output bench.json
+    python benchmark.py --lines 2000 --baseline bench.json     # print ratios against an earlier run
+    python benchmark.py --lines 100000 --write-corpus synthetic.edit.txt --no-run   # corpus for main.py
+
+Stages:
+    - removeEditTag: edit_sentences() of every line (removeEditTag_regex: the former regex functions)
+    - parse: nlp.pipe() of every before/after sentence
+    - makeNPsent: SentenceAnalysis.from_doc() of every parse, noun phrases substituted into 'NP'
+      and Collins tags of every token, in one pass (the NP sentences are not parsed again)
+    - pattern_detection: patterns of after_edit sentences, with the Collins lexicon
+    - checkInCollins: (headword, pattern) kept if in Collins
+    - twoSequenceAlignment: every window, with an empty alignment_cache,
+      twoSequenceAlignment_batch the same pairs at once
+    - alignment_post_process: every alignment
+    - aggregation: CompactAggregator.add_result() of every result, then threshold()
+    - Every stage runs on the output of the previous one, timed separately, best of --repeat
+
+Output:
+    {"config": {...}, "stages": {"parse": {"calls": 4000, "seconds": 1.23, "us_per_call": 307.5}, ...},
+     "end_to_end": [{"workers": 1, "lines": 2000, "seconds": 4.1, "lines_per_sec": 487.8}, ...]}
+    - end_to_end runs main.gen_ef_pattern_batch() (gen_ef_pattern() with --no-batch) in a Pool,
+      timed after every worker has loaded the model
+
+Note:
+    - Lines are generated from a small grammar of Collins verbs with preposition errors (XC),
+      and spelling (SP) or punctuation (PU) edits that are not kept
+    - Slash format: [-x//XC-]{+y//XC+}, paren format: [-x-]{+y+}(XC), mixed: both, line by line
+
+Files needed:
+    - main.py and the files it needs
+"""
+import json
+import random
+import sys
+import time
+from functools import partial
+from multiprocessing import Pool
+
+from removeEditTag import edit_sentences, detect_format, removeEditTag_exclusive, removeEditTag_P_exclusive, SLASH, PAREN
+from gpv_24 import SentenceAnalysis, pattern_detection
+from spacy_model import set_model, get_nlp, model_report, model_version
+from twoSequenceAlignment import twoSequenceAlignment, twoSequenceAlignment_batch, alignment_cache
+from compact_aggregator import CompactAggregator
+from aggregate import threshold
+import main
+
+FORMATS = [SLASH, PAREN, 'mixed']
+
+SUBJECTS = ['I', 'We', 'They', 'He', 'She', 'My friend', 'The teacher', 'Our parents']
+# (past form, misspelling, object, wrong preposition or None, correct preposition or None)
+VERBS = [
+    ('listened', 'listend', 'the music', None, 'to'),
+    ('discussed', 'discused', 'the problem', 'about', None),
+    ('depended', 'dependded', 'my parents', 'of', 'on'),
+    ('arrived', 'arived', 'the station', 'in', 'at'),
+    ('waited', 'waitted', 'the bus', 'to', 'for'),
+    ('talked', 'talkked', 'the weather', 'of', 'about'),
+    ('agreed', 'agred', 'her answer', 'to', 'with'),
+    ('looked', 'lookd', 'the picture', None, 'at'),
+    ('explained', 'explaned', 'the rule', None, None),
+    ('enjoyed', 'enjoied', 'the party', None, None),
+]
+TAILS = ['', 'every day', 'yesterday', 'with my friends', 'after school']
+
+
+def tag_edit(deleted, inserted, feature, fmt):
+    """
+    An edit in fmt, deleted or inserted may be None
+    """
+    if fmt==SLASH:
+        deletion = '[-{}//{}-]'.format(deleted, feature) if deleted else ''
+        insertion = '{{+{}//{}+}}'.format(inserted, feature) if inserted else ''
+        return deletion + insertion
+    deletion = '[-{}-]'.format(deleted) if deleted else ''
+    insertion = '{{+{}+}}'.format(inserted) if inserted else ''
+    return deletion + insertion + '({})'.format(feature)
+
+
+def make_line(rng, fmt):
+    """
+    One synthetic line: subject, verb, preposition edit, object, tail,
+    with a spelling or punctuation edit now and then
+    """
+    verb, misspelling, obj, wrong, correct = rng.choice(VERBS)
+    words = [rng.choice(SUBJECTS)]
+
+    if rng.random() < 0.2:
+        words.append(tag_edit(misspelling, verb, 'SP', fmt))
+    else:
+        words.append(verb)
+
+    # Preposition error in most lines, the correct sentence otherwise
+    if wrong != correct and rng.random() < 0.8:
+        words.append(tag_edit(wrong, correct, 'XC', fmt))
+    elif correct:
+        words.append(correct)
+
+    words.append(obj)
+    tail = rng.choice(TAILS)
+    if tail:
+        words.append(tail)
+
+    if rng.random() < 0.1:
+        words.append(tag_edit(',', '.', 'PU', fmt))
+    else:
+        words.append('.')
+    return ' '.join(words)
+
+
+def make_corpus(n_lines, fmt=SLASH, seed=0):
+    """
+    n_lines synthetic edit tagged lines, the same for the same seed
+    """
+    rng = random.Random(seed)
+    return [ make_line(rng, rng.choice([SLASH, PAREN]) if fmt=='mixed' else fmt) for _ in range(n_lines) ]
+
+
+def best_time(fn, repeat):
+    """
+    (best seconds of repeat runs, output of the last run)
+    """
+    best = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        output = fn()
+        seconds = time.perf_counter() - start_time
+        best = seconds if best is None else min(best, seconds)
+    return best, output
+
+
+def run_stages(lines, repeat=3, batch_size=256):
+    """
+    {stage: {'calls', 'seconds', 'us_per_call'}}, each stage fed with the output of the previous one
+    """
+    stages = {}
+    def timed(name, fn, calls):
+        seconds, output = best_time(fn, repeat)
+        stages[name] = {'calls': calls, 'seconds': seconds, 'us_per_call': seconds/calls*1e6 if calls else None}
+        return output
+
+    nlp = get_nlp()
+
+    edits = timed('removeEditTag', lambda: [ edit_sentences(line) for line in lines ], len(lines))
+    regex_fns = { SLASH: removeEditTag_exclusive, PAREN: removeEditTag_P_exclusive }
+    line_fns = [ regex_fns[detect_format(line)] for line in lines ]
+    timed('removeEditTag_regex', lambda: [ fn(line) for fn, line in zip(line_fns, lines) ], len(lines))
+
+    sents = [ before_edit for before_edit, _ in edits ] + [ after_edit for _, after_edit in edits ]
+    docs = timed('parse', lambda: list(nlp.pipe(sents, batch_size=batch_size)), len(sents))
+
+    def make_analyses():
+        analyses = []
+        for doc in docs:
+            try:
+                analyses.append(SentenceAnalysis.from_doc(doc))
+            except Exception:
+                analyses.append(None)
+        return analyses
+    analyses = timed('makeNPsent', make_analyses, len(docs))
+    analyses_before = analyses[:len(lines)]
+    analyses_after = analyses[len(lines):]
+
+    pairs = [ (EF_i, before_edit, after_edit, analysis_before, analysis_after)
+              for EF_i, ((before_edit, after_edit), analysis_before, analysis_after) in enumerate(zip(edits, analyses_before, analyses_after))
+              if analysis_before is not None and analysis_after is not None ]
+
+    patterns = timed('pattern_detection', lambda: [ list(dict.fromkeys(pattern_detection(a.Collins_sent, a.lemmas, a.words, main.Collins_lexicon)))
+                                                    for _, _, _, _, a in pairs ], len(pairs))
+    timed('checkInCollins', lambda: [ main.checkInCollins(pattern_after) for pattern_after in patterns ], len(patterns))
+
+    # Windows as main.py builds them, not timed
+    line_windows = [ (EF_i, main.prepare_alignment(EF_i, before_edit, after_edit, analysis_before, analysis_after))
+                     for EF_i, before_edit, after_edit, analysis_before, analysis_after in pairs ]
+    windows = [ window for _, (line_window, _) in line_windows if line_window for window in line_window ]
+
+    def align():
+        alignment_cache.clear()
+        return [ twoSequenceAlignment(str1, str2, 0, 0, 1) for _, str1, str2 in windows ]
+    alignments = timed('twoSequenceAlignment', align, len(windows))
+
+    def align_batch():
+        alignment_cache.clear()
+        return twoSequenceAlignment_batch([ (str1, str2) for _, str1, str2 in windows ], 0, 0, 1)
+    timed('twoSequenceAlignment_batch', align_batch, len(windows))
+
+    timed('alignment_post_process', lambda: [ main.alignment_post_process(s1, s2, score) for s1, s2, score in alignments ], len(alignments))
+
+    # Results of every line, for aggregation
+    alignment_iter = iter(alignments)
+    results = []
+    for EF_i, (line_window, error) in line_windows:
+        if line_window is None:
+            results.append(error)
+        else:
+            results.append(main.finish_alignment(EF_i, line_window, [ next(alignment_iter) for _ in line_window ]))
+
+    def aggregate():
+        aggregator = CompactAggregator()
+        for res in results:
+            aggregator.add_result(res)
+        return threshold(aggregator.counts_dict())
+    timed('aggregation', aggregate, len(results))
+
+    alignment_cache.clear()
+    return stages
+
+
+def _ready(_):
+    return True
+
+
+def run_end_to_end(lines, workers, model_name, block_size=1000, batch_size=256, no_batch=False):
+    """
+    Lines per second of main.gen_ef_pattern_batch() in a Pool of workers processes,
+    with block_size lines per task and batch_size sentences per nlp.pipe() batch, as main.py
+    """
+    with Pool(workers, initializer=main.init_worker, initargs=(model_name,)) as p:
+        # Wait until workers are up, model loading is not part of the throughput
+        p.map(_ready, range(workers), chunksize=1)
+        alignment_cache.clear()
+
+        start_time = time.perf_counter()
+        input_f_idx = enumerate(lines)
+        if no_batch:
+            n_results = sum( 1 for _ in p.imap(main.gen_ef_pattern, input_f_idx, chunksize=64) )
+        else:
+            tasks = main.read_blocks(input_f_idx, block_size)
+            n_results = sum( len(res_block) for res_block in p.imap(partial(main.gen_ef_pattern_batch, batch_size=batch_size), tasks) )
+        seconds = time.perf_counter() - start_time
+
+    return {'workers': workers, 'lines': n_results, 'seconds': seconds, 'lines_per_sec': n_results/seconds if seconds else None}
+
+
+def compare(report, baseline):
+    """
+    Print each stage and worker count against a baseline report, ratio > 1 is faster
+    """
+    print('{:28} {:>12} {:>12} {:>7}'.format('stage', 'baseline us', 'us', 'ratio'))
+    for name, stage in report['stages'].items():
+        old = baseline.get('stages', {}).get(name)
+        if old and old['us_per_call'] and stage['us_per_call']:
+            print('{:28} {:12.1f} {:12.1f} {:6.2f}x'.format(name, old['us_per_call'], stage['us_per_call'], old['us_per_call']/stage['us_per_call']))
+    old_runs = { run['workers']: run for run in baseline.get('end_to_end', []) }
+    for run in report['end_to_end']:
+        old = old_runs.get(run['workers'])
+        if old and old['lines_per_sec'] and run['lines_per_sec']:
+            print('{:28} {:12.1f} {:12.1f} {:6.2f}x'.format('workers={} lines/sec'.format(run['workers']),
+                  old['lines_per_sec'], run['lines_per_sec'], run['lines_per_sec']/old['lines_per_sec']))
+
+
+if __name__=='__main__':
+    import argparse
+    import platform
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=2000, help='number of synthetic lines')
+    parser.add_argument('--format', default='mixed', choices=FORMATS, help='edit tag format of the lines')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each stage, the best is kept')
+    parser.add_argument('--workers', default='1,2,4', help='comma separated worker counts of the end to end runs, empty to skip')
+    parser.add_argument('--model', default='en_core_web_lg', help='SpaCy model name')
+    parser.add_argument('--block-size', type=int, default=200, help='lines sent to a worker at once, small enough to give every worker blocks')
+    parser.add_argument('--batch-size', type=int, default=256, help='batch_size of nlp.pipe()')
+    parser.add_argument('--no-batch', action='store_true', help='end to end with gen_ef_pattern() line by line')
+    parser.add_argument('--output', default='benchmark.json', help='json report')
+    parser.add_argument('--baseline', default=None, help='earlier json report to compare with')
+    parser.add_argument('--write-corpus', default=None, help='also write the synthetic lines into this file')
+    parser.add_argument('--no-run', action='store_true', help='only write the corpus')
+    args = parser.parse_args()
+
+    lines = make_corpus(args.lines, args.format, args.seed)
+    if args.write_corpus:
+        with open(args.write_corpus, 'w') as f:
+            for line in lines:
+                f.write(line+'\n')
+    if args.no_run:
+        sys.exit()
+
+    set_model(args.model)
+    get_nlp()
+    report = {
+        'config': {
+            'lines': args.lines, 'format': args.format, 'seed': args.seed, 'repeat': args.repeat,
+            'model': args.model, 'model_version': model_version(), 'model_load_seconds': model_report()['load_seconds'],
+            'block_size': args.block_size, 'batch_size': args.batch_size, 'no_batch': args.no_batch,
+            'python': platform.python_version(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'stages': run_stages(lines, args.repeat, args.batch_size),
+        'end_to_end': [],
+    }
+    for name, stage in report['stages'].items():
+        print('{:28} {:8d} calls {:9.3f}s {:10.1f} us/call'.format(name, stage['calls'], stage['seconds'], stage['us_per_call'] or 0), file=sys.stderr)
+
+    for workers in [ int(w) for w in args.workers.split(',') if w ]:
+        run = run_end_to_end(lines, workers, args.model, args.block_size, args.batch_size, args.no_batch)
+        report['end_to_end'].append(run)
+        print('workers={:<3} {:8d} lines {:9.3f}s {:10.1f} lines/sec'.format(workers, run['lines'], run['seconds'], run['lines_per_sec'] or 0), file=sys.stderr)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
@@ -0,0 +1,47 @@
+"""
+Checkpoints of a main.py run, so that a killed run can be resumed.
+
+from checkpoint import save_checkpoint, load_checkpoint
+
+Content:
+    {"input": "EF877.edit.txt", "offset": 500000, "aggregator": {...}, "error_file_size": 1234, "records_size": 5678}
+    - offset: number of corpus lines whose results are in aggregator
+    - aggregator: CompactAggregator.state(), main.py spills examples into main.ckpt.spill next to the checkpoint,
+      resuming without it raises an error instead of losing examples
+    - error_file_size / records_size: size of Error_message.txt and of the record file at offset,
+      anything written after that is truncated on resume
+
+Note:
+    - Saved as json, which keeps the insertion order of headwords and changes,
+      so a resumed run writes the same Error_pattern.json as an uninterrupted run
+    - Written into a temporary file and renamed, a kill while saving keeps the previous checkpoint
+"""
+import json
+import os
+
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    """
+    Return the saved checkpoint, None if there is none
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def truncate_file(path, size):
+    """
+    Cut off what was written into path after a checkpoint
+    """
+    with open(path, 'r+b') as f:
+        f.truncate(size)
@@ -0,0 +1,152 @@
+"""
+Compiled index of Collins' verb patterns (verb_pattern.json),
+shared by main.checkInCollins() and gpv_24.pattern_extract().
+
+from collins_lexicon import load_lexicon
+
+Sample:
+    lexicon = load_lexicon('verb_pattern.json')
+    lexicon.has_headword('abandon')
+    lexicon.has_pattern('abandon', 'V n to n')
+Return:
+    True
+    True
+
+Index:
+    - Headwords and patterns are interned to integer ids
+    - Each headword has a bitset (int) of its pattern ids, membership is one shift and and
+    - Saved next to the json as verb_pattern.idx, a binary file of both string tables and
+      fixed-width bitsets, loaded in a few milliseconds and rebuilt when the json changes
+
+Usage:
+    python collins_lexicon.py verb_pattern.json    # build verb_pattern.idx
+"""
+import json
+import os
+import struct
+
+MAGIC = b'CLX1'
+_HEADER = struct.Struct('<4sQqIII')  # magic, json size, json mtime_ns, n_headwords, n_patterns, bitset bytes
+
+
+class CollinsLexicon:
+    """
+    Read-only index of headword -> Collins' patterns
+    """
+    def __init__(self, headwords, patterns, masks):
+        self.headwords = headwords
+        self.patterns = patterns
+        self.pattern_id = { pattern: pid for pid, pattern in enumerate(patterns) }
+        self.masks = dict(zip(headwords, masks))
+
+    @classmethod
+    def from_dict(cls, verb_pattern):
+        patterns = []
+        pattern_id = {}
+        masks = []
+        for hw, hw_patterns in verb_pattern.items():
+            mask = 0
+            for pattern in hw_patterns:
+                pid = pattern_id.get(pattern)
+                if pid is None:
+                    pid = pattern_id[pattern] = len(patterns)
+                    patterns.append(pattern)
+                mask |= 1 << pid
+            masks.append(mask)
+        return cls(list(verb_pattern), patterns, masks)
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def has_headword(self, hw):
+        return hw in self.masks
+
+    def has_pattern(self, hw, pattern):
+        mask = self.masks.get(hw)
+        if mask is None:
+            return False
+        pid = self.pattern_id.get(pattern)
+        return pid is not None and (mask >> pid) & 1 == 1
+
+    def patterns_of(self, hw):
+        mask = self.masks.get(hw, 0)
+        return [ pattern for pid, pattern in enumerate(self.patterns) if (mask >> pid) & 1 ]
+
+    def __contains__(self, hw):
+        return hw in self.masks
+
+    def save(self, path, json_stat=(0, 0)):
+        """
+        Write the binary index, json_stat is (size, mtime_ns) of the source json
+        """
+        n_bytes = (len(self.patterns) + 7) // 8
+        headwords = '\n'.join(self.headwords).encode('utf-8')
+        patterns = '\n'.join(self.patterns).encode('utf-8')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, json_stat[0], json_stat[1], len(self.headwords), len(self.patterns), n_bytes))
+            f.write(struct.pack('<II', len(headwords), len(patterns)))
+            f.write(headwords)
+            f.write(patterns)
+            for hw in self.headwords:
+                f.write(self.masks[hw].to_bytes(n_bytes, 'little'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, json_stat=None):
+        """
+        Read the binary index, None if it is missing, broken or built from another json_stat
+        """
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            magic, size, mtime_ns, n_headwords, n_patterns, n_bytes = _HEADER.unpack_from(data)
+        except (OSError, struct.error):
+            return None
+        if magic != MAGIC or (json_stat is not None and (size, mtime_ns) != tuple(json_stat)):
+            return None
+
+        pos = _HEADER.size
+        len_headwords, len_patterns = struct.unpack_from('<II', data, pos)
+        pos += 8
+        headwords = data[pos:pos+len_headwords].decode('utf-8').split('\n') if n_headwords else []
+        pos += len_headwords
+        patterns = data[pos:pos+len_patterns].decode('utf-8').split('\n') if n_patterns else []
+        pos += len_patterns
+        masks = [ int.from_bytes(data[start:start+n_bytes], 'little') for start in range(pos, pos+n_headwords*n_bytes, n_bytes) ]
+        return cls(headwords, patterns, masks)
+
+
+def load_lexicon(json_path='verb_pattern.json', index_path=None):
+    """
+    Load the compiled index of json_path, building it first if missing or out of date
+    """
+    if index_path is None:
+        index_path = os.path.splitext(json_path)[0] + '.idx'
+    stat = os.stat(json_path)
+    json_stat = (stat.st_size, stat.st_mtime_ns)
+
+    lexicon = CollinsLexicon.load(index_path, json_stat)
+    if lexicon is None:
+        lexicon = CollinsLexicon.from_json(json_path)
+        try:
+            lexicon.save(index_path, json_stat)
+        except OSError:
+            pass
+    return lexicon
+
+
+# Build index
+if __name__ == '__main__':
+    import sys
+    import time
+
+    json_path = sys.argv[1] if len(sys.argv) > 1 else 'verb_pattern.json'
+    lexicon = load_lexicon(json_path)
+
+    start_time = time.perf_counter()
+    lexicon = load_lexicon(json_path)
+    print('{} headwords, {} patterns, index loaded in {:.2f} ms'.format(
+        len(lexicon.headwords), len(lexicon.patterns), (time.perf_counter()-start_time)*1000))
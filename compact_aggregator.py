@@ -0,0 +1,332 @@
+"""
+Memory bounded aggregation of (headword, change) counts and example line indices,
+for corpora much larger than EF877.
+
+from compact_aggregator import CompactAggregator
+
+Sample:
+    aggregator = CompactAggregator(delta=True, memory_budget=512*2**20)
+    aggregator.add('give', 'V to n>>V n', 9)
+    aggregator.add('give', 'V to n>>V n', 7469)
+    aggregator.counts_dict()
+    list(aggregator.iter_examples())
+Return:
+    {'give': {'V to n>>V n': 2}}
+    [('give', 'V to n>>V n', [9, 7469])]
+
+Note:
+    - Headwords and changes are interned to integer ids,
+      every (headword, change) pair gets an id in the order it is first seen
+    - Counts are a flat array('I') indexed by pair id
+    - Example indices of a pair are kept in array('I'), or as zigzag varint deltas
+      in a bytearray with delta=True (1-3 bytes instead of 4 for sorted indices)
+    - memory_budget covers example buffers and the fixed cost of every pair and string
+      (interning dicts, lists, arrays, estimated as PAIR_BYTES and STRING_BYTES + the string),
+      beyond it every buffer is spilled into a file and read back pair by pair when writing the output
+    - Only buffers can be spilled, when pairs alone take most of the budget,
+      buffers are still spilled every memory_budget/8 bytes
+    - Spilled chunks of a pair are chained in the file, each header holds the offset of
+      the previous chunk of its pair, so only the offset of the last one is kept, 8 bytes per pair
+    - Iteration order is the same as nested dicts {headword: {change: ...}} filled in the order results are added
+"""
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+# Spilled chunk: pair id, bytes of examples, offset of the previous chunk of the pair or -1
+_SPILL_HEADER = struct.Struct('<IIq')
+
+# Bytes held by a pair besides its examples: pair_id and pairs entries, hw_pairs entry,
+# count, last, spill_head (measured on CPython 3.8-3.12)
+PAIR_BYTES = 260
+# Bytes of the interning dict and list entries of a headword or change, besides the string
+STRING_BYTES = 100
+# Empty buffer of a pair, allocated again after a spill
+BUFFER_BYTES = sys.getsizeof(bytearray())
+
+
+def encode_deltas(values, last, out):
+    """
+    Append values as zigzag varint deltas into bytearray out, return the last value
+    """
+    for value in values:
+        delta = value - last
+        last = value
+        zigzag = (delta << 1) ^ (delta >> 63)
+        while zigzag >= 0x80:
+            out.append((zigzag & 0x7f) | 0x80)
+            zigzag >>= 7
+        out.append(zigzag)
+    return last
+
+
+def decode_deltas(data, last=0):
+    values = []
+    zigzag = 0
+    shift = 0
+    for byte in data:
+        zigzag |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        last += (zigzag >> 1) ^ -(zigzag & 1)
+        values.append(last)
+        zigzag = 0
+        shift = 0
+    return values
+
+
+class CompactAggregator:
+    """
+    Count (headword, change) and collect the index of lines they are found in,
+    with interned ids, typed arrays and optional spilling to disk.
+    """
+    def __init__(self, delta=True, memory_budget=None, spill_path=None):
+        self.delta = delta
+        self.memory_budget = memory_budget
+        self.spill_path = spill_path
+
+        self.headwords = []
+        self.headword_id = {}
+        self.changes = []
+        self.change_id = {}
+        self.pairs = []          # pair id -> (headword id, change id)
+        self.pair_id = {}
+        self.hw_pairs = []       # headword id -> [pair id, ...]
+
+        self.counts = array('I')
+        self.buffers = []        # pair id -> bytearray or array('I') of examples not spilled, None if empty
+        self.last = array('q')   # pair id -> last example index, base of the next delta
+        self.buffer_bytes = 0
+        self.fixed_bytes = 0     # estimated bytes of pairs, headwords and changes
+
+        self.spill_file = None
+        self.spill_head = array('q')   # pair id -> offset of its last spilled chunk, -1 if none
+
+    def _intern(self, hw, change):
+        key = (hw, change)
+        pid = self.pair_id.get(key)
+        if pid is not None:
+            return pid
+
+        hid = self.headword_id.get(hw)
+        if hid is None:
+            hid = self.headword_id[hw] = len(self.headwords)
+            self.headwords.append(hw)
+            self.hw_pairs.append([])
+            self.fixed_bytes += STRING_BYTES + sys.getsizeof(hw)
+        cid = self.change_id.get(change)
+        if cid is None:
+            cid = self.change_id[change] = len(self.changes)
+            self.changes.append(change)
+            self.fixed_bytes += STRING_BYTES + sys.getsizeof(change)
+
+        pid = self.pair_id[key] = len(self.pairs)
+        self.pairs.append( (hid, cid) )
+        self.hw_pairs[hid].append(pid)
+        self.counts.append(0)
+        self.buffers.append(None)
+        self.last.append(0)
+        self.spill_head.append(-1)
+        self.fixed_bytes += PAIR_BYTES
+        return pid
+
+    def add(self, hw, change, i):
+        pid = self._intern(hw, change)
+        self.counts[pid] += 1
+        self.add_examples(pid, [i])
+
+    def add_examples(self, pid, indices):
+        buf = self.buffers[pid]
+        if buf is None:
+            buf = self.buffers[pid] = bytearray() if self.delta else array('I')
+            self.buffer_bytes += BUFFER_BYTES
+        size = len(buf) if self.delta else len(buf) * buf.itemsize
+        if self.delta:
+            self.last[pid] = encode_deltas(indices, self.last[pid], buf)
+            self.buffer_bytes += len(buf) - size
+        else:
+            buf.extend(indices)
+            self.buffer_bytes += len(buf) * buf.itemsize - size
+
+        if self.over_budget():
+            self.spill()
+
+    def over_budget(self):
+        if self.memory_budget is None:
+            return False
+        return self.buffer_bytes > max(self.memory_budget - self.fixed_bytes, self.memory_budget // 8)
+
+    def add_counted(self, hw, change, count, indices):
+        """
+        Add the count and example indices of a pair at once, e.g. from a partial result
+        """
+        pid = self._intern(hw, change)
+        self.counts[pid] += count
+        self.add_examples(pid, indices)
+
+    def add_result(self, res, error_file=None):
+        """
+        Add a result from main.gen_ef_pattern(),
+        its error log is written into error_file.
+        """
+        if res['status'] == 'success':
+            for hw,change,i in res['result']:
+                self.add(hw, change, i)
+        elif res['status'] == 'error' and error_file is not None:
+            print(res['log'], file=error_file)
+
+    def _open_spill(self):
+        if self.spill_file is None:
+            if self.spill_path is None:
+                fd, self.spill_path = tempfile.mkstemp(prefix='aggregator_', suffix='.spill')
+                os.close(fd)
+            self.spill_file = open(self.spill_path, 'w+b')
+        return self.spill_file
+
+    def spill(self):
+        """
+        Move every example buffer into the spill file
+        """
+        f = self._open_spill()
+        f.seek(0, os.SEEK_END)
+        for pid, buf in enumerate(self.buffers):
+            if not buf:
+                continue
+            data = bytes(buf) if self.delta else buf.tobytes()
+            offset = f.tell()
+            f.write(_SPILL_HEADER.pack(pid, len(data), self.spill_head[pid]))
+            f.write(data)
+            self.spill_head[pid] = offset
+            self.buffers[pid] = None
+        f.flush()
+        self.buffer_bytes = 0
+
+    def examples_of(self, pid):
+        """
+        Example line indices of a pair id, in the order they were added
+        """
+        chunks = []
+        offset = self.spill_head[pid]
+        while offset >= 0:
+            f = self.spill_file
+            f.seek(offset)
+            _, nbytes, offset = _SPILL_HEADER.unpack(f.read(_SPILL_HEADER.size))
+            chunks.append(f.read(nbytes))
+        chunks.reverse()
+        buf = self.buffers[pid]
+        if self.delta:
+            if buf:
+                chunks.append(bytes(buf))
+            return decode_deltas(b''.join(chunks))
+        values = array('I')
+        for chunk in chunks:
+            values.frombytes(chunk)
+        if buf:
+            values.extend(buf)
+        return values.tolist()
+
+    def iter_pairs(self):
+        """
+        Yield (headword, change, pair id), grouped by headword in the order first seen
+        """
+        for hid, pids in enumerate(self.hw_pairs):
+            hw = self.headwords[hid]
+            for pid in pids:
+                yield hw, self.changes[self.pairs[pid][1]], pid
+
+    def iter_first_seen(self):
+        """
+        Yield (headword, change, count, [line_index, ...]) in the order pairs were first seen
+        """
+        for pid, (hid, cid) in enumerate(self.pairs):
+            yield self.headwords[hid], self.changes[cid], self.counts[pid], self.examples_of(pid)
+
+    def counts_dict(self):
+        """
+        {headword: {change: count}}
+        """
+        dic = {}
+        for hw, change, pid in self.iter_pairs():
+            dic.setdefault(hw, {})[change] = self.counts[pid]
+        return dic
+
+    def iter_examples(self):
+        """
+        Yield (headword, change, [line_index, ...]), one pair at a time
+        """
+        for hw, change, pid in self.iter_pairs():
+            yield hw, change, self.examples_of(pid)
+
+    def examples_dict(self):
+        """
+        {headword: {change: [line_index, ...]}}, holds every example in memory
+        """
+        dic = {}
+        for hw, change, examples in self.iter_examples():
+            dic.setdefault(hw, {})[change] = examples
+        return dic
+
+    def memory_bytes(self):
+        """
+        Estimated bytes held by pairs, interned strings and example buffers, what memory_budget bounds
+        """
+        return self.fixed_bytes + self.buffer_bytes
+
+    def state(self):
+        """
+        Json serializable state, for checkpoints.
+        Spilled examples stay in the spill file, which is cut back to spill_size on restore,
+        so it has to be kept with the checkpoint.
+        """
+        if self.spill_file is not None:
+            self.spill_file.flush()
+        return {
+            'delta': self.delta,
+            'memory_budget': self.memory_budget,
+            'spill_path': self.spill_path,
+            'spill_size': os.path.getsize(self.spill_path) if self.spill_file is not None else 0,
+            'spill_head': self.spill_head.tolist(),
+            'headwords': self.headwords,
+            'changes': self.changes,
+            'pairs': self.pairs,
+            'counts': self.counts.tolist(),
+            'buffers': [ list(buf) if buf else [] for buf in self.buffers ],
+            'last': self.last.tolist(),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        aggregator = cls(state['delta'], state['memory_budget'], state['spill_path'])
+        for hid, cid in state['pairs']:
+            aggregator._intern(state['headwords'][hid], state['changes'][cid])
+        aggregator.counts = array('I', state['counts'])
+        if state['delta']:
+            aggregator.buffers = [ bytearray(buf) if buf else None for buf in state['buffers'] ]
+            aggregator.buffer_bytes = sum( BUFFER_BYTES + len(buf) for buf in aggregator.buffers if buf )
+        else:
+            aggregator.buffers = [ array('I', buf) if buf else None for buf in state['buffers'] ]
+            aggregator.buffer_bytes = sum( BUFFER_BYTES + len(buf)*buf.itemsize for buf in aggregator.buffers if buf )
+        aggregator.last = array('q', state['last'])
+        aggregator.spill_head = array('q', state['spill_head'])
+        if state['spill_size']:
+            # Spilled examples are only in the spill file, never carry on without them
+            spill_path = state['spill_path']
+            if not os.path.exists(spill_path):
+                raise ValueError('spill file {} of the checkpoint is missing, its examples are lost'.format(spill_path))
+            if os.path.getsize(spill_path) < state['spill_size']:
+                raise ValueError('spill file {} is shorter than the {} bytes of the checkpoint'.format(spill_path, state['spill_size']))
+            aggregator.spill_file = open(spill_path, 'r+b')
+            aggregator.spill_file.truncate(state['spill_size'])
+        return aggregator
+
+    def close(self):
+        """
+        Remove the spill file
+        """
+        if self.spill_file is not None:
+            self.spill_file.close()
+            os.remove(self.spill_path)
+            self.spill_file = None
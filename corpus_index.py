@@ -0,0 +1,208 @@
+"""
+Byte offset index of a corpus, to read the lines behind Error_pattern_example.json
+without scanning the corpus again.
+
+from corpus_index import get_examples
+
+Sample:
+    get_examples('give', 'V to n>>V n', limit=1)
+Return:
+    [{'index': 1,
+      'line': 'He gave [-to//XC-] me a pen .',
+      'before': 'He gave to me a pen .',
+      'after': 'He gave me a pen .'}]
+    - index is the line index in Error_pattern_example.json (enumerate() of the corpus)
+    - before and after are given by edit_sentences()
+
+Usage:
+    python corpus_index.py EF877.edit.txt                              # build EF877.edit.txt.offsets
+    python corpus_index.py EF877.edit.txt give 'V to n>>V n' --limit 5  # print examples
+
+Index:
+    - EF877.edit.txt.offsets holds a header and the byte offset of every line start as uint64,
+      plus the corpus size, so line i is corpus[offsets[i]:offsets[i+1]]
+    - Both files are memory-mapped, reading a line is two array reads and one slice
+    - Built with one pass of large reads, rebuilt when the size or mtime of the corpus changes
+
+Note:
+    - Lines are split at '\\n' only, the same as enumerate(open(corpus)) for '\\n' and '\\r\\n' files
+    - A compressed corpus (gzip, bz2, xz, see corpus_reader.compression()) cannot be read at an offset,
+      it raises ValueError, decompress it first
+
+Files needed:
+    - corpus_reader.py
+    - removeEditTag.py
+    - Error_pattern_example.json
+    - EF877.edit.txt
+"""
+import json
+import mmap
+import os
+import struct
+
+from corpus_reader import compression
+from removeEditTag import edit_sentences
+
+MAGIC = b'LOF1'
+DECOMPRESS_COMMANDS = {'gzip': 'gunzip -k', 'bz2': 'bunzip2 -k', 'xz': 'unxz -k'}
+_HEADER = struct.Struct('<4sQqQ')  # magic, corpus size, corpus mtime_ns, n_lines
+READ_SIZE = 16 * 2**20
+
+
+def _corpus_stat(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def build_offsets(corpus_path, index_path, read_size=READ_SIZE):
+    """
+    Write the line offsets of corpus_path into index_path, return the number of lines
+    """
+    import numpy as np
+
+    size, mtime_ns = _corpus_stat(corpus_path)
+    tmp_path = index_path + '.tmp'
+    n_lines = 0
+    with open(corpus_path, 'rb') as corpus, open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, size, mtime_ns, 0))
+        f.write(struct.pack('<Q', 0))
+        position = 0
+        last_start = 0
+        while True:
+            chunk = corpus.read(read_size)
+            if not chunk:
+                break
+            # Start of the next line after every '\n'
+            starts = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8)==10).astype(np.uint64) + (position + 1)
+            f.write(starts.astype('<u8').tobytes())
+            n_lines += len(starts)
+            if len(starts):
+                last_start = int(starts[-1])
+            position += len(chunk)
+        # Last line without '\n'
+        if position > last_start:
+            f.write(struct.pack('<Q', position))
+            n_lines += 1
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, size, mtime_ns, n_lines))
+    os.replace(tmp_path, index_path)
+    return n_lines
+
+
+class CorpusIndex:
+    """
+    Random access to the lines of a corpus through its offset index
+    """
+    def __init__(self, corpus_path, index_path=None):
+        if index_path is None:
+            index_path = corpus_path + '.offsets'
+        self.corpus_path = corpus_path
+        self.index_path = index_path
+
+        kind = compression(corpus_path)
+        if kind is not None:
+            raise ValueError('{} is {} compressed, lines cannot be read at their offset: decompress it first ({} {})'.format(
+                corpus_path, kind, DECOMPRESS_COMMANDS[kind], corpus_path))
+
+        if not self._open_offsets():
+            build_offsets(corpus_path, index_path)
+            if not self._open_offsets():
+                raise ValueError('cannot read offset index {}'.format(index_path))
+
+        with open(corpus_path, 'rb') as f:
+            self.corpus = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(corpus_path) else b''
+
+    def _open_offsets(self):
+        try:
+            with open(self.index_path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, size, mtime_ns, n_lines = _HEADER.unpack_from(data)
+        except (OSError, ValueError, struct.error):
+            return False
+        if magic != MAGIC or (size, mtime_ns) != _corpus_stat(self.corpus_path) \
+                or len(data) != _HEADER.size + 8*(n_lines+1):
+            data.close()
+            return False
+        self.offsets_data = data
+        self.offsets = memoryview(data)[_HEADER.size:].cast('Q')
+        self.n_lines = n_lines
+        return True
+
+    def __len__(self):
+        return self.n_lines
+
+    def line(self, i):
+        """
+        Line i of the corpus, without its line break
+        """
+        if not 0 <= i < self.n_lines:
+            raise IndexError('line {} out of range, corpus has {} lines'.format(i, self.n_lines))
+        data = self.corpus[self.offsets[i]:self.offsets[i+1]]
+        return data.decode('utf-8').rstrip('\r\n')
+
+    def lines(self, indices):
+        return [ self.line(i) for i in indices ]
+
+
+class ExampleStore:
+    """
+    Examples of (headword, change) from Error_pattern_example.json, read from the corpus index
+    """
+    def __init__(self, examples_path='Error_pattern_example.json', corpus_path='EF877.edit.txt', index_path=None):
+        self.examples_path = examples_path
+        with open(examples_path) as f:
+            self.examples = json.load(f)
+        self.corpus = CorpusIndex(corpus_path, index_path)
+
+    def get_examples(self, headword, change, limit=10):
+        """
+        [{'index', 'line', 'before', 'after'}, ...] of at most limit examples, in corpus order
+        """
+        indices = self.examples.get(headword, {}).get(change, [])
+        if limit is not None:
+            indices = indices[:limit]
+
+        examples = []
+        for i in indices:
+            line = self.corpus.line(i)
+            before_edit, after_edit = edit_sentences(line)
+            examples.append({'index': i, 'line': line, 'before': before_edit, 'after': after_edit})
+        return examples
+
+
+_store = None
+
+def get_examples(headword, change, limit=10, examples_path='Error_pattern_example.json', corpus_path='EF877.edit.txt'):
+    """
+    Examples of a rule, through an ExampleStore opened on first call
+    """
+    global _store
+    if _store is None or (_store.examples_path, _store.corpus.corpus_path) != (examples_path, corpus_path):
+        _store = ExampleStore(examples_path, corpus_path)
+    return _store.get_examples(headword, change, limit)
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('corpus', help='corpus file, e.g. EF877.edit.txt')
+    parser.add_argument('headword', nargs='?', default=None)
+    parser.add_argument('change', nargs='?', default=None, help='wrong_pattern>>correct_pattern')
+    parser.add_argument('--examples', default='Error_pattern_example.json')
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    corpus = CorpusIndex(args.corpus)
+    print('{} lines, index ready in {:.3f}s'.format(len(corpus), time.perf_counter()-start_time))
+
+    if args.headword is not None:
+        store = ExampleStore(args.examples, args.corpus)
+        start_time = time.perf_counter()
+        examples = store.get_examples(args.headword, args.change, args.limit)
+        seconds = time.perf_counter() - start_time
+        for example in examples:
+            print(json.dumps(example, ensure_ascii=False))
+        print('{} examples in {:.2f} ms'.format(len(examples), seconds*1000))
@@ -0,0 +1,174 @@
+"""
+Streaming reader of corpus files, plain or compressed, and line aligned byte-range shards of them.
+
+from corpus_reader import read_lines, shard_ranges, read_shard
+
+Sample:
+    for i, line in read_lines('EF877.edit.txt.gz'):     # as enumerate(open('EF877.edit.txt'))
+        ...
+    shards = shard_ranges('EF877.edit.txt.gz', 4)
+    shards[1]
+    list(read_shard(shards[1]))[0]
+Return:
+    Shard(path='EF877.edit.txt.gz', start=1048601, end=2097190, first_line=17532)
+    (17532, 'I go to a beautiful park and see green trees .\\n')
+
+Usage:
+    python corpus_reader.py EF877.edit.txt.xz --shards 4    # print shards, and read them to check line numbers
+
+Note:
+    - Compression is detected from the first bytes (gzip, bz2, xz), whatever the file name
+    - Files are read through buffers of READ_SIZE bytes, decompressed on the fly, never to disk
+    - Lines are split at '\\n' only and kept as they are, so line indices are the same as
+      enumerate(open(corpus)) unless the corpus has a lone '\\r', and as in corpus_index.py
+    - Shard offsets are in the uncompressed stream, every shard starts at a line start
+      and knows the index of its first line in the whole corpus
+    - shard_ranges() reads the corpus once; in a compressed corpus, read_shard() decompresses
+      and skips what comes before its shard, since compressed streams cannot be entered midway
+"""
+import bz2
+import gzip
+import io
+import lzma
+import os
+from bisect import bisect_left
+from collections import namedtuple
+from itertools import islice
+
+READ_SIZE = 2**20
+MARK_STEP = 2**20
+
+_MAGIC = [
+    (b'\x1f\x8b', gzip.open),
+    (b'BZh', bz2.open),
+    (b'\xfd7zXZ\x00', lzma.open),
+]
+
+Shard = namedtuple('Shard', ['path', 'start', 'end', 'first_line'])
+
+
+def compression(path):
+    """
+    'gzip', 'bz2', 'xz' or None, from the first bytes of path
+    """
+    with open(path, 'rb') as f:
+        head = f.read(6)
+    for (magic, _), name in zip(_MAGIC, ['gzip', 'bz2', 'xz']):
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def open_corpus(path, read_size=READ_SIZE):
+    """
+    Binary stream of the uncompressed content of path, with a read buffer of read_size
+    """
+    with open(path, 'rb') as f:
+        head = f.read(6)
+    for magic, opener in _MAGIC:
+        if head.startswith(magic):
+            return io.BufferedReader(opener(path, 'rb'), buffer_size=read_size)
+    return open(path, 'rb', buffering=read_size)
+
+
+def read_lines(path, start_line=0, read_size=READ_SIZE):
+    """
+    Yield (line index, line) of the corpus from start_line on
+    """
+    with io.TextIOWrapper(open_corpus(path, read_size), encoding='utf-8', newline='\n') as f:
+        yield from islice(enumerate(f), start_line, None)
+
+
+def line_marks(path, step=MARK_STEP, read_size=READ_SIZE):
+    """
+    One pass over the corpus, return ([(offset, line index), ...], size),
+    the first line start at or after every step bytes, with (0, 0) first
+    """
+    marks = [(0, 0)]
+    position = 0
+    lines = 0
+    next_mark = step
+    with open_corpus(path, read_size) as stream:
+        while True:
+            chunk = stream.read(read_size)
+            if not chunk:
+                break
+            end = position + len(chunk)
+            while next_mark <= end:
+                # The '\n' ending the line that holds byte next_mark-1
+                newline = chunk.find(b'\n', max(next_mark - 1 - position, 0))
+                if newline == -1:
+                    break
+                line_start = position + newline + 1
+                marks.append( (line_start, lines + chunk.count(b'\n', 0, newline+1)) )
+                next_mark = (line_start // step + 1) * step
+            lines += chunk.count(b'\n')
+            position = end
+    # A mark at the very end of the corpus starts no line
+    if marks[-1][0] >= position and len(marks) > 1:
+        marks.pop()
+    return marks, position
+
+
+def shard_ranges(path, n_shards, step=MARK_STEP):
+    """
+    Split the corpus into at most n_shards Shards of about the same size, aligned to lines
+    """
+    # Marks at least 16 per shard for small files, compressed ones only get more marks
+    step = max(min(step, os.path.getsize(path) // (16 * n_shards)), 1)
+    marks, size = line_marks(path, step)
+    offsets = [ offset for offset, _ in marks ]
+
+    starts = [ marks[0] ]
+    for k in range(1, n_shards):
+        idx = bisect_left(offsets, k * size / n_shards)
+        if idx < len(marks) and marks[idx][0] > starts[-1][0]:
+            starts.append(marks[idx])
+
+    return [ Shard(path, start, starts[k+1][0] if k+1 < len(starts) else size, first_line)
+             for k, (start, first_line) in enumerate(starts) ]
+
+
+def read_shard(shard, read_size=READ_SIZE):
+    """
+    Yield (line index in the corpus, line) of the lines of a shard
+    """
+    with open_corpus(shard.path, read_size) as stream:
+        stream.seek(shard.start)
+        position = shard.start
+        i = shard.first_line
+        for line in stream:
+            if position >= shard.end:
+                break
+            yield i, line.decode('utf-8')
+            position += len(line)
+            i += 1
+
+
+# Read every shard and compare with read_lines()
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('corpus')
+    parser.add_argument('--shards', type=int, default=4)
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    n_lines = sum( 1 for _ in read_lines(args.corpus) )
+    read_seconds = time.perf_counter() - start_time
+    print('{}: {}, {} lines read in {:.2f}s'.format(args.corpus, compression(args.corpus) or 'plain', n_lines, read_seconds))
+
+    start_time = time.perf_counter()
+    shards = shard_ranges(args.corpus, args.shards)
+    print('{} shards in {:.2f}s'.format(len(shards), time.perf_counter()-start_time))
+
+    expected = read_lines(args.corpus)
+    for shard in shards:
+        n = 0
+        for (i, line), (j, expected_line) in zip(read_shard(shard), expected):
+            assert (i, line)==(j, expected_line), (shard, i, j)
+            n += 1
+        print(shard, n, 'lines')
+    assert next(expected, None) is None
@@ -0,0 +1,224 @@
+"""
+Grammar pattern error checker, with the rules mined by main.py (Error_pattern.json).
+
+from error_checker import ErrorChecker
+
+Sample:
+    checker = ErrorChecker.from_json('Error_pattern.json')
+    checker.check('We discussed about the plan.')
+Return:
+    [{'headword': 'discuss', 'start': 1, 'end': 4, 'text': 'discussed about the plan',
+      'wrong': 'V about n', 'suggestions': [('V n', 7990)]}]
+    - start and end are token positions in NP_sentence (see gpv_24.py),
+      text has the noun phrases put back
+    - suggestions are correct patterns ranked by frequency in the corpus
+
+    - Check many sentences at once, parsed with nlp.pipe()
+        checker.check_batch(sents, batch_size=256)
+
+Usage:
+    python error_checker.py --input learner.txt                # one json line of flags per sentence
+    python error_checker.py --input learner.txt --benchmark    # parse and check latency
+
+Note:
+    - Rules are indexed by headword, then by wrong pattern in a PatternMatcher,
+      so a verb costs one dict lookup and one trie walk, whatever the number of rules
+    - The window after a verb is built as in main.prepare_alignment(),
+      wrong patterns are matched as a prefix of its alphabetic tags, like pat_before
+    - A suggestion is dropped if its correct pattern also matches the window,
+      a verb is flagged only if some suggestion is left
+
+Files needed:
+    - gpv_24.py
+    - pattern_matcher.py
+    - Error_pattern.json
+"""
+import argparse
+import json
+import sys
+import time
+
+from gpv_24 import analyze_sentence, analyze_sentences, set_parse_cache
+from pattern_matcher import PatternMatcher, edit_window
+from spacy_model import set_model
+
+VERB_TAGS = ['V|inf|v','V','-ed','-ing']
+
+
+class ErrorChecker:
+    """
+    Index of {headword: {'wrong>>correct': frequency}} for checking sentences
+    """
+    def __init__(self, rules, min_count=None):
+        self.matchers = {}     # headword -> PatternMatcher of wrong patterns
+        self.suggestions = {}  # (headword, wrong pattern) -> [(correct pattern, frequency), ...]
+        for hw, changes in rules.items():
+            for change, count in changes.items():
+                if min_count is not None and count < min_count:
+                    continue
+                wrong, correct = change.split('>>')
+                self.suggestions.setdefault( (hw, wrong), [] ).append( (correct, count) )
+
+        hw_wrongs = {}
+        for hw, wrong in self.suggestions:
+            hw_wrongs.setdefault(hw, []).append(wrong.split())
+            # Most frequent first, ties in the order of the rules
+            self.suggestions[(hw, wrong)].sort(key=lambda suggestion: -suggestion[1])
+        for hw, wrongs in hw_wrongs.items():
+            self.matchers[hw] = PatternMatcher(wrongs)
+
+    @classmethod
+    def from_json(cls, path='Error_pattern.json', min_count=None):
+        with open(path) as f:
+            return cls(json.load(f), min_count)
+
+    def check_analysis(self, analysis):
+        """
+        Flags of a gpv_24.SentenceAnalysis
+        """
+        flags = []
+        words = None
+        for hw_idx, tag in enumerate(analysis.Collins_sent):
+            if tag not in VERB_TAGS:
+                continue
+            hw = analysis.lemmas[hw_idx]
+            matcher = self.matchers.get(hw)
+            if matcher is None:
+                continue
+
+            # Alphabetic tags of the window, and the token each one comes from
+            window = edit_window(analysis.Collins_sent_prep, hw_idx)
+            last_idx = hw_idx + min(len(window), len(analysis.Collins_sent_prep)-hw_idx) - 1
+            tags = []
+            positions = []
+            for offset, window_tag in enumerate(window):
+                if window_tag.isalpha():
+                    tags.append(window_tag)
+                    positions.append( min(hw_idx+offset, last_idx) )
+
+            matched = matcher.match(tags)
+            if not matched:
+                continue
+
+            # Suggestions of every matched wrong pattern, unless the sentence already has them
+            best = {}
+            for wrong in matched:
+                for correct, count in self.suggestions[(hw, wrong)]:
+                    correct_tags = correct.split()
+                    if tags[:len(correct_tags)]==correct_tags:
+                        continue
+                    if count > best.get(correct, (None, 0))[1]:
+                        best[correct] = (wrong, count)
+            if not best:
+                continue
+
+            wrong = matched[0]
+            end = positions[len(wrong.split())-1] + 1
+            if words is None:
+                words = restore_noun_phrases(analysis)
+            suggestions = sorted( ((correct, count) for correct, (_, count) in best.items()), key=lambda suggestion: -suggestion[1] )
+            flags.append({
+                'headword': hw,
+                'start': hw_idx,
+                'end': end,
+                'text': ' '.join(words[hw_idx:end]),
+                'wrong': wrong,
+                'suggestions': suggestions,
+            })
+        return flags
+
+    def check(self, sentence):
+        """
+        Flags of a sentence, a string or a gpv_24.SentenceAnalysis
+        """
+        return self.check_analysis(analyze_sentence(sentence))
+
+    def check_batch(self, sentences, batch_size=256):
+        """
+        Flags of each sentence, None for sentences that cannot be parsed
+        """
+        return [ None if analysis is None else self.check_analysis(analysis)
+                 for analysis in analyze_sentences(sentences, batch_size) ]
+
+
+def restore_noun_phrases(analysis):
+    """
+    Words of NP_sent with each 'NP' replaced by the text of its noun phrase
+    """
+    noun_phrases = iter(analysis.noun_phrases)
+    words = []
+    for word in analysis.words:
+        if word=='NP':
+            chunk = next(noun_phrases, None)
+            if chunk is not None:
+                word = getattr(chunk[0], 'text', chunk[0])
+        words.append(word)
+    return words
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values)-1, int(q*len(values)))]
+
+
+def benchmark(checker, sentences, batch_size=256):
+    """
+    Parse time and check time of each sentence, in ms
+    """
+    start_time = time.perf_counter()
+    analyses = analyze_sentences(sentences, batch_size)
+    parse_seconds = time.perf_counter() - start_time
+
+    check_ms = []
+    n_flags = 0
+    for analysis in analyses:
+        if analysis is None:
+            continue
+        start_time = time.perf_counter()
+        flags = checker.check_analysis(analysis)
+        check_ms.append( (time.perf_counter()-start_time)*1000 )
+        n_flags += len(flags)
+
+    return {
+        'sentences': len(sentences),
+        'flags': n_flags,
+        'parse_ms_per_sentence': parse_seconds*1000/max(len(sentences), 1),
+        'check_ms_mean': sum(check_ms)/max(len(check_ms), 1),
+        'check_ms_p50': percentile(check_ms, 0.5) if check_ms else None,
+        'check_ms_p99': percentile(check_ms, 0.99) if check_ms else None,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', default='-', help='one sentence per line, - for stdin')
+    parser.add_argument('--rules', default='Error_pattern.json', help='rules written by main.py or aggregate.py')
+    parser.add_argument('--min-count', type=int, default=None, help='ignore rules less frequent than this')
+    parser.add_argument('--model', default=None, help='SpaCy model, default is $SPACY_MODEL or en_core_web_lg')
+    parser.add_argument('--batch-size', type=int, default=256, help='sentences parsed at once by nlp.pipe()')
+    parser.add_argument('--parse-cache', default=None, help='sqlite file of sentence analyses (see parse_cache.py)')
+    parser.add_argument('--benchmark', action='store_true', help='report parse and check latency instead of flags')
+    args = parser.parse_args()
+
+    if args.model is not None:
+        set_model(args.model)
+    if args.parse_cache is not None:
+        from parse_cache import ParseCache, cache_namespace
+        set_parse_cache(ParseCache(args.parse_cache, cache_namespace('alignment.json')))
+
+    start_time = time.perf_counter()
+    checker = ErrorChecker.from_json(args.rules, args.min_count)
+    load_ms = (time.perf_counter()-start_time)*1000
+
+    f = sys.stdin if args.input=='-' else open(args.input)
+    sentences = [ line.strip() for line in f if line.strip() ]
+
+    if args.benchmark:
+        report = benchmark(checker, sentences, args.batch_size)
+        report['rules_load_ms'] = load_ms
+        print(json.dumps(report, indent=1))
+    else:
+        for start in range(0, len(sentences), args.batch_size):
+            block = sentences[start:start+args.batch_size]
+            for sentence, flags in zip(block, checker.check_batch(block, args.batch_size)):
+                print(json.dumps({'sentence': sentence, 'flags': flags}, ensure_ascii=False))
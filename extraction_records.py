@@ -0,0 +1,115 @@
+"""
+Per-line extraction records, written by main.py and read by aggregate.py,
+so that counting and thresholding can be redone without running the extraction again.
+
+from extraction_records import RecordWriter, read_records
+
+Format:
+    - One json object per corpus line (json lines), gzip compressed if the file name ends with .gz
+        {"i": 9, "status": "success", "result": [["give", "V to n>>V n"]], "windows": [["give", "V n", "V to n"]]}
+        {"i": 10, "status": "error", "log": "give is newly inserted into after_edit"}
+        {"i": 11, "status": "skipped", "reason": "no_kept_edit"}
+    - i: line index in the corpus
+    - result: (headword, wrong_pattern>>correct_pattern) found in the line
+    - windows: (headword, after_edit Collins window, before_edit Collins window) that were aligned
+    - reason: why main.py --prescreen skipped the line (see prescreen.py)
+
+Note:
+    - read_records() yields results in the format returned by main.gen_ef_pattern()
+"""
+import gzip
+import json
+import os
+
+from checkpoint import truncate_file
+
+
+def open_text(path, mode='rt'):
+    """
+    Open a text file, gzip compressed if path ends with .gz
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def result_to_record(res):
+    record = {'i': res['index'], 'status': res['status']}
+    if res['status'] == 'success':
+        record['result'] = [ (hw, change) for hw, change, _ in res['result'] ]
+        record['windows'] = res.get('windows', [])
+    elif res['status'] == 'skipped':
+        record['reason'] = res['reason']
+    else:
+        record['log'] = res['log']
+    return record
+
+
+def record_to_result(record):
+    res = {'index': record['i'], 'status': record['status']}
+    if record['status'] == 'success':
+        res['result'] = [ (hw, change, record['i']) for hw, change in record['result'] ]
+        res['windows'] = [ tuple(window) for window in record.get('windows', []) ]
+    elif record['status'] == 'skipped':
+        res['reason'] = record['reason']
+    else:
+        res['log'] = record['log']
+    return res
+
+
+class RecordWriter:
+    """
+    Stream results of main.gen_ef_pattern() into a record file
+
+    With resume_size, the file is cut to that size (from checkpoint()) and appended to.
+    """
+    def __init__(self, path, resume_size=None):
+        self.path = path
+        if resume_size is None:
+            self.f = open_text(path, 'wt')
+        else:
+            truncate_file(path, resume_size)
+            self.f = open_text(path, 'at')
+
+    def write(self, res):
+        self.f.write(json.dumps(result_to_record(res), ensure_ascii=False, separators=(',', ':')))
+        self.f.write('\n')
+
+    def tee(self, results):
+        """
+        Write every result while passing it on
+        """
+        for res in results:
+            self.write(res)
+            yield res
+
+    def checkpoint(self):
+        """
+        Make everything written so far durable, return the file size to resume from.
+        A gzip file is closed and reopened, so that it ends with a complete gzip member.
+        """
+        if self.path.endswith('.gz'):
+            self.f.close()
+            self.f = open_text(self.path, 'at')
+        else:
+            self.f.flush()
+        return os.path.getsize(self.path)
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_records(path):
+    """
+    Yield results stored in a record file, in the order they were written
+    """
+    with open_text(path) as f:
+        for line in f:
+            if line.strip():
+                yield record_to_result(json.loads(line))
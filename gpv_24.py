@@ -7,23 +7,38 @@ from gpv_24 import pattern_extract
 Sample:
     pattern_extract('I go to a beautiful park and see green trees.', return_sent=False)
 Return:
-    [('see', 'V n', 5), ('go', 'V to', 1), ('go', 'V to n', 1), ('see', 'V', 5), ('go', 'V', 1)]
+    [('go', 'V to n', 1), ('go', 'V to', 1), ('go', 'V', 1), ('see', 'V n', 5), ('see', 'V', 5)]
     - The integer represents the position of the headword in NP_sentence
+    - Patterns are ordered by headword position, then from the longest to shortest
 
     - Can also return Collins_sentence, NP_sentence, noun_phrases by setting return_sent=True
         ['n', 'V', 'to', 'n', 'and', 'V|inf|v', 'n', '.']
         NP go to NP and see NP .
         [(I, 0, 0), (a beautiful park, 3, 5), (green trees, 8, 9)]
 
+    - Parse once and reuse the result with analyze_sentence()
+        analysis = analyze_sentence('I go to a beautiful park and see green trees.')
+        pattern_extract(analysis)
+        sent2Collins_NP(analysis)
+        analysis.lemmas
+
+    - Parse many sentences at once with analyze_sentences(sents, batch_size=256)
+
+    - Reuse analyses across runs with a parse cache (see parse_cache.py)
+        set_parse_cache(ParseCache('parse_cache.sqlite'))
+
 Note:
     - 'prep' will be present in its lemma form in output
     - Cannot detect 'V and v'
     - Cannot detect 'singular_noun and singular_noun' as 'pl-n'
-    - pattern_detection() only extract patterns that start with verb
+    - pattern_detection() only extract patterns that start with verb,
+      matching whole tags from the verb on (see pattern_matcher.py)
     - 'V-ed' is not aligned
     - Will return all patterns regardless of their length as output
 
 Files needed:
+    - spacy_model.py
+    - pattern_matcher.py
     - alignment.json
     - Collins_verb_pattern.txt
 
@@ -31,10 +46,10 @@ Edited Collins' verb grammar pattern:
     - Substitude 'wh-to-inf' to 'wh- to inf'
     - Substitude 'to-inf' to 'to inf'
 """
-import spacy
 import json
 
-nlp = spacy.load('en_core_web_lg')
+from spacy_model import get_nlp
+from pattern_matcher import PatternMatcher, normalize_window
 
 #texts that are within Collins' pattern
 #keys = ['about', 'across', 'after', 'against', 'among', 'and', 'around', 'as',\
@@ -46,53 +61,176 @@ nlp = spacy.load('en_core_web_lg')
 keys = []
 
 
-def pattern_extract(input_string, return_sent=False):
+class SentenceAnalysis:
     """
-    Extract Collins' pattern from a sentence
-    Output format in list of tuples, [(headword, pattern), (), ...]
+    Everything the extraction needs from one sentence, parsed only once.
+
+    Attributes:
+        NP_sent: sentence with noun phrases substituded into 'NP'
+        noun_phrases: [(chunk, start, end), ...]
+        words: text of each token of NP_sent
+        lemmas: lemma of each token of NP_sent
+        Collins_sent: Collins' tags of NP_sent, prepositions as 'prep'
+        Collins_sent_prep: Collins' tags of NP_sent, prepositions in text form
+        doc: SpaCy Doc of the input sentence, None if loaded from parse cache
+    """
+    def __init__(self, NP_sent, noun_phrases, words, lemmas, Collins_sent, Collins_sent_prep, doc=None):
+        self.NP_sent = NP_sent
+        self.noun_phrases = noun_phrases
+        self.words = words
+        self.lemmas = lemmas
+        self.Collins_sent = Collins_sent
+        self.Collins_sent_prep = Collins_sent_prep
+        self.doc = doc
+
+    @classmethod
+    def from_doc(cls, doc):
+        """
+        Analysis of a parsed sentence, without parsing its NP sentence again:
+        'NP' is tagged 'n' as alignment() tags it, other tokens keep the tags of doc
+        """
+        NP_sent, noun_phrases, tokens = makeNPsent(doc)
+        return cls(
+            NP_sent,
+            noun_phrases,
+            [ 'NP' if token is None else token.text for token in tokens ],
+            [ 'NP' if token is None else token.lemma_ for token in tokens ],
+            [ 'n' if token is None else alignment(token, Spacy_Collins) for token in tokens ],
+            [ 'n' if token is None else alignment(token, Spacy_Collins, prep_in_text=True) for token in tokens ],
+            doc=doc,
+        )
+
+    def to_record(self):
+        """
+        Plain data of the analysis, noun phrase chunks are kept as text
+        """
+        return {
+            'NP_sent': self.NP_sent,
+            'noun_phrases': [ (getattr(chunk, 'text', chunk), start, end) for chunk, start, end in self.noun_phrases ],
+            'words': self.words,
+            'lemmas': self.lemmas,
+            'Collins_sent': self.Collins_sent,
+            'Collins_sent_prep': self.Collins_sent_prep,
+        }
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(
+            record['NP_sent'],
+            [ tuple(noun_phrase) for noun_phrase in record['noun_phrases'] ],
+            record['words'],
+            record['lemmas'],
+            record['Collins_sent'],
+            record['Collins_sent_prep'],
+        )
+
+
+def set_parse_cache(cache):
     """
+    Make analyze_sentence() and analyze_sentences() look up a ParseCache before parsing,
+    None to stop using it.
+    """
+    global parse_cache
+    parse_cache = cache
+
+
+def analyze_sentence(input_string):
+    """
+    Parse a sentence into SentenceAnalysis,
+    which can be passed to pattern_extract() and sent2Collins_NP() instead of a string.
+    """
+    if isinstance(input_string, SentenceAnalysis):
+        return input_string
+
     # Preprocess
     input_string = input_string.strip()
+    if parse_cache is not None:
+        record = parse_cache.get(input_string)
+        if record is not None:
+            return SentenceAnalysis.from_record(record)
+
+    nlp = get_nlp()
     tokenized_string = nlp(input_string)
-    #for token in tokenized_string:
-    #    print(token.text, token.tag_)
-    NP_sent, noun_phrases = makeNPsent(tokenized_string)
-    token_sent = nlp(NP_sent)
-    
-    # Alignment between SpaCy and Collins
-    Collins_sent = [ alignment(token, Spacy_Collins) for token in token_sent ]
-    #print(Collins_sent)
+
+    # Generating NP sentence
+    analysis = SentenceAnalysis.from_doc(tokenized_string)
+    if parse_cache is not None:
+        parse_cache.put(input_string, analysis.to_record())
+    return analysis
+
+
+def analyze_sentences(input_strings, batch_size=256):
+    """
+    Parse many sentences into SentenceAnalysis with nlp.pipe().
+    Each distinct sentence is parsed once, and only if it is not in parse cache.
+
+    Return a list aligned with input_strings,
+    None for sentences whose NP sentence cannot be generated.
+    """
+    input_strings = [ input_string.strip() for input_string in input_strings ]
+    unique_strings = list(dict.fromkeys(input_strings))
+
+    results = {}
+    if parse_cache is not None:
+        for input_string, record in parse_cache.get_many(unique_strings).items():
+            results[input_string] = SentenceAnalysis.from_record(record)
+    to_parse = [ input_string for input_string in unique_strings if input_string not in results ]
+
+    if to_parse:
+        nlp = get_nlp()
+
+        # Generating NP sentences
+        parsed = []
+        for input_string, tokenized_string in zip(to_parse, nlp.pipe(to_parse, batch_size=batch_size)):
+            try:
+                analysis = SentenceAnalysis.from_doc(tokenized_string)
+            except Exception:
+                results[input_string] = None
+            else:
+                results[input_string] = analysis
+                parsed.append( (input_string, analysis.to_record()) )
+
+        if parse_cache is not None:
+            parse_cache.put_many(parsed)
+
+    return [ results[input_string] for input_string in input_strings ]
+
+
+def pattern_extract(input_string, return_sent=False, lexicon=None, skipped=None):
+    """
+    Extract Collins' pattern from a sentence
+    Output format in list of tuples, [(headword, pattern), (), ...]
+
+    input_string can be a string or a SentenceAnalysis
+    lexicon (collins_lexicon.CollinsLexicon) skips verbs which are not headwords in Collins,
+    their patterns are put into the list skipped if given (see pattern_detection())
+    """
+    analysis = analyze_sentence(input_string)
     
     # Detect pattern
-    hw_pat = pattern_detection(Collins_sent, token_sent)
+    hw_pat = pattern_detection(analysis.Collins_sent, analysis.lemmas, analysis.words, lexicon, skipped)
     #print(hw_pat)
 
-    # Eliminate duplicate
-    hw_pat = list(set(hw_pat))
+    # Eliminate duplicate, keeping the order of detection
+    hw_pat = list(dict.fromkeys(hw_pat))
+    if skipped is not None:
+        skipped[:] = dict.fromkeys(skipped)
 
     if return_sent==False:
         return hw_pat
     else:
-        Collins_sent = [ alignment(token, Spacy_Collins, prep_in_text=True) for token in token_sent ]
-        return hw_pat, Collins_sent, NP_sent, noun_phrases
+        return hw_pat, analysis.Collins_sent_prep, analysis.NP_sent, analysis.noun_phrases
 
 
 def sent2Collins_NP(input_string):
     """
     Generate a sentence into Collins and NP sentence form.
+
+    input_string can be a string or a SentenceAnalysis
     """
-    # Preprocess
-    input_string = input_string.strip()
-    tokenized_string = nlp(input_string)
+    analysis = analyze_sentence(input_string)
     
-    # Generating NP sentence
-    NP_sent, noun_phrases = makeNPsent(tokenized_string)
-    token_sent = nlp(NP_sent)
-    
-    # Generating Collins sentence
-    Collins_sent = [ alignment(token, Spacy_Collins, prep_in_text=True) for token in token_sent ]
-    
-    return Collins_sent, NP_sent, noun_phrases
+    return analysis.Collins_sent_prep, analysis.NP_sent, analysis.noun_phrases
 
 
 def alignment(token, align_dict, prep_in_text=False):
@@ -116,50 +254,47 @@ def alignment(token, align_dict, prep_in_text=False):
     return new_tag
 
 
-def pattern_detection(c_sent, t_sent):
+def pattern_detection(c_sent, lemmas, words, lexicon=None, skipped=None):
     """
     Iterate through each token of a sentence,
     start detecting for pattern if it is a verb.
+    With lexicon, verbs without Collins' entry are skipped,
+    or their patterns are detected into the list skipped when it is given, to count them.
     """
     hw_pat = []
     for start_idx,tag in enumerate(c_sent):
         
         # Looking for verb to start searching
         if tag in ['V|inf|v','V','-ed','-ing']:
+            found = hw_pat
+            if lexicon is not None and lemmas[start_idx] not in lexicon:
+                if skipped is None:
+                    continue
+                found = skipped
             
-            # Extract possible 5-gram with pattern
-            if start_idx+5 <= len(c_sent):
-                extract = c_sent[start_idx:start_idx+5] # len(Longest pattern starting with V)==5
-            else:
-                extract = c_sent[start_idx:]
-            
-            # Substitude misleading tag
-            extract = ['V']+(' '.join(extract[1:])).replace('V|inf|v','inf').replace(' it ',' n ').split()
-            extract = ' '.join(extract)
+            # Extract possible pattern window, with misleading tag substituded
+            extract = normalize_window(c_sent, start_idx, pattern_matcher.max_len)
             
-            # Determine pattern
-            for pattern in patterns:
-                pattern = ' '.join(pattern)
-                if pattern in extract:
-                    headword = t_sent[start_idx].lemma_
-                    #break
-                    if 'prep' in pattern:
-                        new_pattern = prep_in_pattern(c_sent, t_sent, pattern, extract, start_idx)
-                        hw_pat.append( (headword, new_pattern, start_idx) )
-                    else:
-                        hw_pat.append( (headword, pattern, start_idx) )
+            # Determine pattern, every pattern that is a prefix of extract
+            for pattern in pattern_matcher.match(extract):
+                headword = lemmas[start_idx]
+                if 'prep' in pattern:
+                    new_pattern = prep_in_pattern(words, pattern, start_idx)
+                    found.append( (headword, new_pattern, start_idx) )
+                else:
+                    found.append( (headword, pattern, start_idx) )
 
     return hw_pat
 
 
-def prep_in_pattern(c_sent, t_sent, orig_pattern, extract, start_idx):
+def prep_in_pattern(words, orig_pattern, start_idx):
     
     orig_pattern = orig_pattern.split()
 
     new_pat = []
     for prep_idx,tag in enumerate(orig_pattern):
         if tag == 'prep':
-            new_pat.append( t_sent[start_idx + prep_idx].text )
+            new_pat.append( words[start_idx + prep_idx] )
         else:
             new_pat.append(tag)
         
@@ -168,25 +303,30 @@ def prep_in_pattern(c_sent, t_sent, orig_pattern, extract, start_idx):
 
 def makeNPsent(sentence):
     """
-    Substitude noun phrases of a sentence into 'NP'
+    Substitude noun phrases of a sentence into 'NP', in one pass over its tokens
+
+    Return NP_sent, noun_phrases with start and end token index of each chunk in sentence,
+    and the token of each word of NP_sent, None for 'NP'
     """
-    chunks = list(sentence.noun_chunks)
-    sent = [token.text for token in sentence]
-    
+    chunks = iter([ chunk for chunk in sentence.noun_chunks if chunk.text not in ['it', 'It'] ])
+    chunk = next(chunks, None)
+
     noun_phrases = []
-    for chunk in chunks:
-        if chunk.text in ['it', 'It']:
-            continue
-        end = chunk.root.i
-        start = chunk.root.i - len(chunk.text.split()) + 1
-        space = ['' for i in range(len(chunk.text.split())-1)]
-        sent = sent[:start] + ['NP'] + space + sent[end+1:]
-        noun_phrases.append( (chunk,start,end ) )
-    
-    sent = [word for word in sent if word != '']
-    sent = ' '.join(sent)
+    tokens = []
+    i = 0
+    while i < len(sentence):
+        if chunk is not None and i == chunk.start:
+            noun_phrases.append( (chunk, chunk.start, chunk.end-1) )
+            tokens.append(None)
+            i = chunk.end
+            chunk = next(chunks, None)
+        else:
+            tokens.append(sentence[i])
+            i += 1
 
-    return sent, noun_phrases
+    sent = ' '.join( 'NP' if token is None else token.text for token in tokens )
+
+    return sent, noun_phrases, tokens
 
 
 def candidate_generate(patterns):
@@ -213,9 +353,12 @@ def takeSecond(elem):
 with open('alignment.json') as f:
     Spacy_Collins = json.load(f)
 
+parse_cache = None
+
 with open('Collins_verb_pattern.txt') as f:
     patterns = f.read().split('\n')
     patterns = candidate_generate(patterns)
+    pattern_matcher = PatternMatcher(patterns)
 
 
 # Testing code
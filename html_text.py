@@ -0,0 +1,305 @@
+"""
+In-process HTML to plain text rendering, modelled on the layout of `w3m -dump -cols 80`,
+for the html written by local_api.turn_json_to_html().
+
+from html_text import html_to_text
+
+Sample:
+    html_to_text('<p>Verbs in this group</p><table border="1"><tr><th colspan="2">kill</th></tr>'
+                 '<tr><td>abandon</td><td>destroy</td></tr></table><div> chapter: 0 page: 20 </div>')
+Return:
+    Verbs in this group
+
+    ┌─────────────────┐
+    │       kill      │
+    ├────────┬────────┤
+    │abandon │destroy │
+    └────────┴────────┘
+
+    chapter: 0 page: 20
+
+Note:
+    - Handles what the verb tables use: paragraphs, div, br, headings, lists, and tables
+      with colspan, border or not; other tags are rendered as their text
+    - Text is wrapped to width, table columns are shrunk to fit width when needed
+    - No temp file and no subprocess, so it is safe to call from many threads
+    - w3m_dump() renders with w3m itself, through a pipe: the reference layout,
+      and a fallback of local_api (set_ascii_renderer('w3m'))
+    - The layout is pinned by the pages in tests/golden/html_text,
+      `python tests/test_html_text.py` rewrites them with w3m
+"""
+import subprocess
+import textwrap
+from html.parser import HTMLParser
+
+BLOCK_TAGS = {'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol', 'table', 'blockquote', 'pre', 'hr'}
+LINE_TAGS = {'div', 'br', 'li', 'tr', 'dt', 'dd'}
+CELL_TAGS = {'td', 'th'}
+
+
+class _Table:
+    def __init__(self, border):
+        self.border = border
+        self.rows = []     # [[(text, colspan, is_header), ...], ...]
+        self.cell = None   # text pieces of the cell being read
+        self.nested = 0    # depth of tables inside a cell, read as text
+
+    def start_row(self):
+        self.end_cell()
+        self.rows.append([])
+
+    def start_cell(self, colspan, is_header):
+        self.end_cell()
+        if not self.rows:
+            self.rows.append([])
+        self.cell = ([], colspan, is_header)
+
+    def end_cell(self):
+        if self.cell is not None:
+            pieces, colspan, is_header = self.cell
+            text = '\n'.join( ' '.join(line.split()) for line in ''.join(pieces).split('\n') ).strip('\n')
+            self.rows[-1].append( (text, colspan, is_header) )
+            self.cell = None
+
+
+def _wrap(text, width):
+    lines = []
+    for line in text.split('\n'):
+        lines.extend(textwrap.wrap(line, max(width, 1), break_on_hyphens=False) or [''])
+    return lines
+
+
+def render_table(table, width=80):
+    """
+    Lines of a table, columns sized by their content and shrunk to fit width
+    """
+    rows = [ row for row in table.rows if row ]
+    if not rows:
+        return []
+    n_cols = max( sum(colspan for _, colspan, _ in row) for row in rows )
+    # Short rows get empty cells, as the last row of a verb table
+    rows = [ row + [('', 1, False)] * (n_cols - sum(colspan for _, colspan, _ in row)) for row in rows ]
+    sep = 1 if table.border else 2
+
+    # Natural width of columns, from cells spanning one column first
+    widths = [0] * n_cols
+    for row in rows:
+        col = 0
+        for text, colspan, _ in row:
+            if colspan==1:
+                widths[col] = max(widths[col], max( len(line) for line in text.split('\n') ) + table.border)
+            col += colspan
+    for row in rows:
+        col = 0
+        for text, colspan, _ in row:
+            if colspan > 1:
+                need = max( len(line) for line in text.split('\n') ) + table.border
+                have = sum(widths[col:col+colspan]) + sep*(colspan-1)
+                if need > have:
+                    widths[col+colspan-1] += need - have
+            col += colspan
+
+    # Shrink the widest column until the table fits
+    outer = sep*(n_cols-1) + (2 if table.border else 0)
+    while sum(widths) + outer > width and max(widths) > 1:
+        widths[widths.index(max(widths))] -= 1
+
+    def cell_lines(row):
+        cells = []
+        col = 0
+        for text, colspan, is_header in row:
+            cell_width = sum(widths[col:col+colspan]) + sep*(colspan-1)
+            lines = _wrap(text, cell_width)
+            if is_header:
+                lines = [ line.center(cell_width).rstrip() for line in lines ]
+            cells.append( (lines, cell_width) )
+            col += colspan
+        height = max( len(lines) for lines, _ in cells )
+        joiner = '│' if table.border else ' '*sep
+        out = []
+        for idx in range(height):
+            line = joiner.join( (lines[idx] if idx < len(lines) else '').ljust(cell_width) for lines, cell_width in cells )
+            out.append( '│' + line + '│' if table.border else line.rstrip() )
+        return out
+
+    def bounds(row):
+        found = set()
+        col = 0
+        for _, colspan, _ in row[:-1]:
+            col += colspan
+            found.add(col)
+        return found
+
+    def rule(left, right, above, below):
+        # Junctions where a column boundary of the row above and/or below meets the line
+        above = bounds(above) if above is not None else set()
+        below = bounds(below) if below is not None else set()
+        parts = [ '─'*widths[0] ]
+        for col in range(1, n_cols):
+            if col in above and col in below:
+                junction = '┼'
+            elif col in below:
+                junction = '┬'
+            elif col in above:
+                junction = '┴'
+            else:
+                junction = '─'
+            parts.append( junction + '─'*widths[col] )
+        return left + ''.join(parts) + right
+
+    lines = []
+    for idx, row in enumerate(rows):
+        if table.border:
+            if idx==0:
+                lines.append(rule('┌', '┐', None, row))
+            else:
+                lines.append(rule('├', '┤', rows[idx-1], row))
+        lines.extend(cell_lines(row))
+    if table.border:
+        lines.append(rule('└', '┘', rows[-1], None))
+    return lines
+
+
+class _TextRenderer(HTMLParser):
+    def __init__(self, width):
+        super().__init__(convert_charrefs=True)
+        self.width = width
+        self.lines = []
+        self.inline = []
+        self.tables = []
+        self.list_depth = 0
+
+    def flush(self, blank=False):
+        text = ' '.join(''.join(self.inline).split())
+        self.inline = []
+        if text:
+            indent = '  ' * max(self.list_depth-1, 0)
+            self.lines.extend( indent + line for line in _wrap(text, self.width - len(indent)) )
+        if blank and self.lines and self.lines[-1]!='':
+            self.lines.append('')
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if self.tables:
+            table = self.tables[-1]
+            if tag=='table':
+                table.nested += 1
+            elif tag=='br' and table.cell is not None:
+                table.cell[0].append('\n')
+            elif table.nested:
+                pass
+            elif tag=='tr':
+                table.start_row()
+            elif tag in CELL_TAGS:
+                colspan = attrs.get('colspan') or '1'
+                table.start_cell(max(int(colspan), 1) if colspan.isdigit() else 1, tag=='th')
+            return
+
+        if tag=='table':
+            self.flush(blank=True)
+            border = attrs.get('border')
+            self.tables.append(_Table(1 if border is not None and border!='0' else 0))
+        elif tag in BLOCK_TAGS:
+            self.flush(blank=True)
+            if tag in ('ul', 'ol'):
+                self.list_depth += 1
+            elif tag=='hr':
+                self.lines.append('─' * self.width)
+        elif tag in LINE_TAGS:
+            self.flush()
+            if tag=='li':
+                self.inline.append('• ')
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in ('br', 'hr'):
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self.tables:
+            table = self.tables[-1]
+            if table.nested:
+                if tag=='table':
+                    table.nested -= 1
+            elif tag in CELL_TAGS or tag=='tr':
+                table.end_cell()
+            elif tag=='table':
+                table.end_cell()
+                self.tables.pop()
+                self.lines.extend(render_table(table, self.width))
+                self.lines.append('')
+            return
+
+        if tag in BLOCK_TAGS:
+            self.flush(blank=True)
+            if tag in ('ul', 'ol'):
+                self.list_depth = max(self.list_depth-1, 0)
+        elif tag in LINE_TAGS:
+            self.flush()
+
+    def handle_data(self, data):
+        if self.tables:
+            if self.tables[-1].cell is not None:
+                self.tables[-1].cell[0].append(data)
+        else:
+            self.inline.append(data)
+
+    def text(self):
+        self.close()
+        while self.tables:
+            table = self.tables.pop()
+            table.end_cell()
+            self.lines.extend(render_table(table, self.width))
+        self.flush()
+        lines = []
+        for line in self.lines:
+            if line=='' and (not lines or lines[-1]==''):
+                continue
+            lines.append(line.rstrip())
+        while lines and lines[-1]=='':
+            lines.pop()
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+def html_to_text(html, width=80):
+    """
+    Plain text of html, wrapped to width columns
+    """
+    renderer = _TextRenderer(width)
+    renderer.feed(html)
+    return renderer.text()
+
+
+def w3m_dump(html, width=80):
+    """
+    Plain text of html rendered by `w3m -dump`, html is passed through stdin, no temp file
+    """
+    full = subprocess.run(['w3m', '-dump', '-cols', str(width), '-T', 'text/html', '-I', 'UTF-8', '-O', 'UTF-8'],
+                          input=html.encode('utf-8'), stdout=subprocess.PIPE, check=True)
+    return full.stdout.decode('utf-8')
+
+
+# Compared with w3m, when it is installed
+if __name__ == '__main__':
+    import shutil
+    import time
+
+    html = ('<p>These verbs are concerned with stopping or abandoning something.</p>'
+            '<table border="1"><tr><th colspan="4">start/stop</th></tr>'
+            + ''.join( '<tr>' + ''.join( '<td>verb{}</td>'.format(row*4+col) for col in range(4) ) + '</tr>' for row in range(10) )
+            + '</table><br><div> chapter: 0 page: 40 </div> ')
+    print(html_to_text(html))
+
+    n = 1000
+    start_time = time.perf_counter()
+    for _ in range(n):
+        html_to_text(html)
+    print('in-process: {:.3f} ms / render'.format((time.perf_counter()-start_time)/n*1000))
+
+    if shutil.which('w3m'):
+        print('same as w3m: {}'.format(html_to_text(html) == w3m_dump(html)))
+        n = 50
+        start_time = time.perf_counter()
+        for _ in range(n):
+            w3m_dump(html)
+        print('w3m:        {:.3f} ms / render'.format((time.perf_counter()-start_time)/n*1000))
@@ -1,29 +1,55 @@
 import json
 from copy import deepcopy
+from functools import lru_cache
 
 from typing import List
 from jinja2 import Environment, PackageLoader, select_autoescape
 
 from jinja2 import FileSystemLoader
 import pathlib
+import shutil
 from IPython.core.display import display, HTML
 
+from html_text import html_to_text, w3m_dump
+from tree_index import load_verb_tree, load_pattern_tree
+
 WIDTH = 80
+RENDER_CACHE_SIZE = 2048
 
 p = pathlib.Path(__file__)
 path = '{}/templates/'.format(p.parent.absolute())
 
 env = Environment(
     loader=FileSystemLoader(path),
+    auto_reload=False,
 )
 
-def turn_html_to_ascii(html):
-    with open('tmp.html', 'w') as f:
-        f.write(html)
-    import subprocess
-    full = subprocess.run(["w3m", "-dump","-cols" ,f'{WIDTH}','tmp.html'], stdout=subprocess.PIPE)
+# 模板只編譯一次
+_templates = {}
+def get_template(name):
+    template = _templates.get(name)
+    if template is None:
+        template = _templates[name] = env.get_template(name)
+    return template
+
+# 在程式內把 html 轉成 WIDTH 欄寬的純文字, 不寫暫存檔也不呼叫 w3m (see html_text.py)
+# set_ascii_renderer('w3m') 改用 w3m 排版 (需安裝 w3m)
+ASCII_RENDERER = 'html_text'
+ASCII_RENDERERS = ['html_text', 'w3m']
+
+def set_ascii_renderer(name):
+    global ASCII_RENDERER
+    if name not in ASCII_RENDERERS:
+        raise ValueError('ascii renderer {} is not one of {}'.format(name, ASCII_RENDERERS))
+    if name == 'w3m' and shutil.which('w3m') is None:
+        raise ValueError('w3m is not installed')
+    ASCII_RENDERER = name
+    render_pattern.cache_clear()
 
-    return full.stdout.decode('utf-8')
+def turn_html_to_ascii(html):
+    if ASCII_RENDERER == 'w3m':
+        return w3m_dump(html, WIDTH)
+    return html_to_text(html, WIDTH)
 
 # 讀入存放反轉查詢表的 json 檔
 def load_json(path: str):
@@ -36,6 +62,12 @@ def load_json(path: str):
 def get_verb_describe(verb_index):
     return PT[verb_index[0]][verb_index[1]][verb_index[2]]
 
+# 把動詞每四個分成一列
+def chunk_verbs(verbs, n=4):
+    datas = [ verbs[idx:idx+n] for idx in range(0, len(verbs) - len(verbs) % n, n) ]
+    datas.append(verbs[len(verbs) - len(verbs) % n:])
+    return datas
+
 # 把 json 轉換成 html 格式
 def turn_json_to_html(verb_describe):
     full = ''.join(verb_describe['describe'])
@@ -43,19 +75,10 @@ def turn_json_to_html(verb_describe):
 
     verb_html_lists = []
 
+    template = get_template('verb_table.html')
     for verb_list in verb_lists:
         header = verb_list[0]
-        datas = []
-        data = []
-        for idx, verb in enumerate(verb_list[1:]):
- 
-            data.append(verb)
-
-            if (idx + 1) % 4 == 0:
-                datas.append(data)
-                data = []
-        datas.append(data)
-        template = env.get_template('verb_table.html')
+        datas = chunk_verbs(verb_list[1:])
         html = template.render(header=header, datas=datas)
         verb_html_lists.append(html)
     
@@ -75,8 +98,26 @@ def convert_to_return_format(json_format, return_format='json'):
     else: # json format
         return json_format
 
-PT = load_json('./pattern_tree.json')
-VT = load_json('./verb_tree.json')
+# 以 pattern tree 的路徑和格式記住轉換結果, 最多 RENDER_CACHE_SIZE 筆
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render_pattern(pattern, struct, verb_group, return_format):
+    return convert_to_return_format({'info': PT[pattern][struct][verb_group]}, return_format)
+
+# 預先轉換常查詢的動詞, verbs 由最常查詢的排起
+def warm_render_cache(verbs, formats=('html', 'ascii')):
+    n_rendered = 0
+    for verb in verbs:
+        for verb_index in VT.get(verb, []):
+            for return_format in formats:
+                if n_rendered >= RENDER_CACHE_SIZE:
+                    return n_rendered
+                render_pattern(verb_index[0], verb_index[1], verb_index[2], return_format)
+                n_rendered += 1
+    return n_rendered
+
+# 反轉查詢表編譯成 .idx 後以 mmap 讀取, 用到的動詞才解碼 (see tree_index.py)
+PT = load_pattern_tree('./pattern_tree.json')
+VT = load_verb_tree('./verb_tree.json')
 
 # 查詢 動詞 反轉表 verb tree
 def get_verb(verb = None, index = None, return_format='json'):
@@ -102,6 +143,9 @@ def get_verb(verb = None, index = None, return_format='json'):
     if return_format == 'json' or not all_filled:
         return reval
 
+    if return_format in ('html', 'ascii'):
+        verb_index = VT[verb][index]
+        return render_pattern(verb_index[0], verb_index[1], verb_index[2], return_format)
     return convert_to_return_format(reval, return_format)
 
 # 查詢 pattern tree
@@ -130,5 +174,7 @@ def get_pattern(pattern = None, struct = None, verb_group = None, return_format=
     if return_format == 'json' or not all_filled:
         return reval
 
+    if return_format in ('html', 'ascii'):
+        return render_pattern(pattern, struct, verb_group, return_format)
     return convert_to_return_format(reval, return_format)
     
@@ -0,0 +1,192 @@
+"""
+Local HTTP/JSON service of local_api.get_verb() and get_pattern(),
+keeping verb_tree.json and pattern_tree.json in memory between requests.
+
+Usage:
+    python local_server.py --port 8000 --cache-size 4096
+    python local_server.py --warm verbs.txt    # render html and ascii of these verbs at startup, one verb per line
+    python local_server.py --ascii-renderer w3m    # ascii rendered by w3m instead of html_text.py
+
+Queries, the same hierarchy as local_api (path segments are URL encoded):
+    GET /verb                                   -> candidates: every verb
+    GET /verb/abandon                           -> candidates: its patterns
+    GET /verb/abandon/2?format=html             -> info of its pattern at position 2
+    GET /pattern/V%20n%20to%20n/...             -> pattern, struct, verb_group as in get_pattern()
+    GET /stats                                  -> cache hits, misses and size, of responses and of renders
+
+    format is json (default), html or ascii, the same as return_format of local_api
+
+Note:
+    - Requests are served by a thread each (ThreadingHTTPServer)
+    - Responses are kept in an LRU cache keyed by query and format,
+      a cached response is only a dict lookup and a socket write
+    - Unknown keys return 404 with {"error": ...},
+      any other failure is logged to stderr and returns 500 with {"error": ...}, it is not cached
+
+Files needed:
+    - local_api.py
+    - verb_tree.json
+    - pattern_tree.json
+    - templates/verb_table.html
+"""
+import argparse
+import json
+import sys
+import threading
+import traceback
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+
+import local_api
+
+FORMATS = ['json', 'html', 'ascii']
+CONTENT_TYPES = {
+    'json': 'application/json; charset=utf-8',
+    'html': 'text/html; charset=utf-8',
+    'ascii': 'text/plain; charset=utf-8',
+}
+
+
+class LRUCache:
+    """
+    Thread safe least recently used cache of responses
+    """
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.items), 'maxsize': self.maxsize}
+
+
+def query(kind, args, return_format='json'):
+    """
+    Answer of local_api for a query, as (status, content type, body bytes)
+    """
+    if kind=='verb' and len(args) <= 2:
+        if len(args)==2:
+            args = [args[0], int(args[1])]
+        result = local_api.get_verb(*args, return_format=return_format)
+    elif kind=='pattern' and len(args) <= 3:
+        result = local_api.get_pattern(*args, return_format=return_format)
+    else:
+        raise KeyError('/'.join([kind]+list(args)))
+
+    if isinstance(result, str):
+        return 200, CONTENT_TYPES[return_format], result.encode('utf-8')
+    return 200, CONTENT_TYPES['json'], json.dumps(result, ensure_ascii=False).encode('utf-8')
+
+
+def error_response(status, message):
+    return status, CONTENT_TYPES['json'], json.dumps({'error': message}, ensure_ascii=False).encode('utf-8')
+
+
+class APIHandler(BaseHTTPRequestHandler):
+    """
+    GET handler, answers from the server's response cache when possible
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # headers and body are two writes on a kept-alive connection
+
+    def do_GET(self):
+        try:
+            response = self.respond()
+        except Exception as e:
+            # Always answer, a connection closed without response looks like a network failure
+            print('error serving {}\n{}'.format(self.path, traceback.format_exc()), file=sys.stderr, flush=True)
+            response = error_response(500, 'internal error: {}'.format(type(e).__name__))
+
+        status, content_type, body = response
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def respond(self):
+        """
+        (status, content type, body bytes) of the request
+        """
+        url = urlsplit(self.path)
+        segments = [ unquote(segment) for segment in url.path.split('/') if segment ]
+        return_format = parse_qs(url.query).get('format', ['json'])[0]
+
+        if segments==['stats']:
+            stats = self.server.cache.stats()
+            stats['render_cache'] = local_api.render_pattern.cache_info()._asdict()
+            response = (200, CONTENT_TYPES['json'], json.dumps(stats).encode('utf-8'))
+        elif not segments or return_format not in FORMATS:
+            response = error_response(400, 'expected /verb/... or /pattern/... and format in {}'.format(FORMATS))
+        else:
+            key = (tuple(segments), return_format)
+            response = self.server.cache.get(key)
+            if response is None:
+                try:
+                    response = query(segments[0], segments[1:], return_format)
+                except (KeyError, IndexError, ValueError) as e:
+                    response = error_response(404, 'not found: {}'.format(e))
+                else:
+                    self.server.cache.put(key, response)
+        return response
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(host='127.0.0.1', port=8000, cache_size=4096, verbose=False):
+    server = ThreadingHTTPServer((host, port), APIHandler)
+    server.daemon_threads = True
+    server.cache = LRUCache(cache_size)
+    server.verbose = verbose
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--cache-size', type=int, default=4096, help='number of responses kept, 0 to disable')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    parser.add_argument('--warm', default=None, help='file of the most queried verbs, one per line, rendered at startup')
+    parser.add_argument('--ascii-renderer', default=local_api.ASCII_RENDERER, choices=local_api.ASCII_RENDERERS, help='how format=ascii is rendered')
+    args = parser.parse_args()
+
+    local_api.set_ascii_renderer(args.ascii_renderer)
+
+    if args.warm is not None:
+        with open(args.warm) as f:
+            verbs = [ line.strip() for line in f if line.strip() ]
+        print('warmed {} renders'.format(local_api.warm_render_cache(verbs)))
+
+    server = make_server(args.host, args.port, args.cache_size, args.verbose)
+    print('serving on http://{}:{}'.format(*server.server_address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
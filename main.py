@@ -3,8 +3,20 @@ Files needed:
     - removeEditTag.py
     - twoSequenceAlignment.py
     - gpv_24.py
-    - verb_pattern.json
-    - EF877.edit.txt
+    - pattern_matcher.py
+    - spacy_model.py
+    - parse_cache.py
+    - aggregate.py
+    - extraction_records.py
+    - checkpoint.py
+    - compact_aggregator.py
+    - collins_lexicon.py
+    - corpus_reader.py
+    - partial_results.py
+    - run_stats.py
+    - prescreen.py
+    - verb_pattern.json: compiled into verb_pattern.idx on first run
+    - EF877.edit.txt: plain, or compressed with gzip, bz2 or xz
 
 Output files:
     - Error_message.txt
@@ -21,60 +33,73 @@ Output example:
         ('give', 'V to n>>V n', 325)
         (headword, wrong_pattern>>correct_pattern, frequency_in_EF)
 
+Usage:
+    python main.py --input EF877.edit.txt --workers 20 --block-size 1000 --batch-size 256
+    - Each worker gets block-size lines at once and parses them with nlp.pipe()
+    - --input EF877.edit.txt.gz is decompressed while reading (see corpus_reader.py)
+    - --no-batch parses line by line with nlp() instead
+    - --model selects the SpaCy model, each worker reports its load time and memory
+    - --parse-cache parse_cache.sqlite reuses sentence analyses of earlier runs
+    - --alignment-cache alignment_cache.json reuses twoSequenceAlignment() results of earlier runs
+    - --records records.jsonl.gz also writes per-line records, aggregate.py rebuilds outputs from them
+    - --checkpoint main.ckpt saves progress every --checkpoint-every lines,
+      run again with --resume to continue a killed run with the same output,
+      spilled examples are kept in main.ckpt.spill, both are removed once the outputs are written
+    - --stats stats.json times every stage and counts outcomes of lines (see run_stats.py),
+      --progress 30 prints lines/sec, ETA and queue depth every 30 seconds,
+      --prometheus gpv.prom also writes them into a Prometheus textfile
+    - --prescreen skips lines that cannot give a rule before parsing them, and counts each reason,
+      lines whose sentence is unchanged by the kept edits may still give rules without it (see prescreen.py)
+    - --memory-budget MB spills example indices to disk beyond that size (see compact_aggregator.py)
+    - --shard K/N processes only shard K of N line aligned byte ranges of the corpus
+      and writes raw counts and examples into --partial, before threshold(),
+      partial_results.py merges the partials of every shard into the output files (see partial_results.py)
+
 Note:
-    - adjust threshold() for desired result
+    - adjust threshold() in aggregate.py for desired result,
+      or filter with --min-count / --top-k / --min-score / --score (see rule_scoring.py)
 """
 
 from multiprocessing import Pool
-import re
-import json
-from collections import defaultdict
+from multiprocessing.util import Finalize
+from functools import partial
+from itertools import islice
+import argparse
+import glob
+import os
+import sys
 from datetime import datetime
 
-import spacy
-
-from removeEditTag import removeEditTag_exclusive # for EF877
-#from removeEditTag import removeEditTag_P_exclusive # for EF2014
-from gpv_24 import pattern_extract, sent2Collins_NP 
-from twoSequenceAlignment import twoSequenceAlignment
-
-nlp = spacy.load('en_core_web_lg')
-
-
-def threshold(dic):
-    """
-    Patterns with first 5 large frequency
-    Frequency > 10
-    """
-    for key in list(dic.keys()):
-        sub = dic[key]
-        sub = sorted(sub.items(), key=lambda v: v[1], reverse=True) #[:5]
-        sub = [ pat_freq for pat_freq in sub if pat_freq[1]>10 ]
-       
-        for item in list(dic[key].items()):
-            if item not in sub:
-                del dic[key][item[0]]
-
-        if list(dic[key].keys())==[]:
-            del dic[key]
-        
-    return dic
-
-
-with open('verb_pattern.json') as f:
-    Collins_verb_pattern = json.load(f)
+from removeEditTag import edit_sentences # EF877 and EF2014 formats are detected per line
+from gpv_24 import analyze_sentence, analyze_sentences, pattern_extract, sent2Collins_NP, set_parse_cache
+from parse_cache import ParseCache, cache_namespace
+from twoSequenceAlignment import twoSequenceAlignment, twoSequenceAlignment_batch, alignment_cache, load_alignment_cache, save_alignment_cache
+from spacy_model import set_model, get_nlp, model_report
+from aggregate import threshold, write_outputs, add_filter_arguments, filter_kwargs
+from compact_aggregator import CompactAggregator
+from extraction_records import RecordWriter
+from checkpoint import save_checkpoint, load_checkpoint, truncate_file
+from collins_lexicon import load_lexicon
+from pattern_matcher import edit_window
+from corpus_reader import read_lines, read_shard, shard_ranges, Shard, compression
+from partial_results import make_partial, save_partial
+from run_stats import StageStats, NullStats, Progress, write_report, write_prometheus
+from prescreen import PreScreen, lemma_tables, REASONS
+
+
+# Stage timing and outcome counters, StageStats with --stats (see run_stats.py)
+stats = NullStats()
+
+# PreScreen of every worker with --prescreen (see prescreen.py)
+prescreen = None
+
+# Compiled once into verb_pattern.idx, shared by forked workers
+Collins_lexicon = load_lexicon('verb_pattern.json')
 def checkInCollins(pattern_after):
     new_pattern_after = []
     for pattern in pattern_after:
-        if pattern[0] in Collins_verb_pattern.keys():
-            if pattern[1] in Collins_verb_pattern[ pattern[0] ]:
-                new_pattern_after.append( pattern )
-            else:
-                pass
-                #print('"{}" is not a pattern of "{}"'.format(pattern[1], pattern[0]))
-        else:
-            pass
-            #print('"{}" not in Collins'.format(pattern[0]))
+        if Collins_lexicon.has_pattern(pattern[0], pattern[1]):
+            new_pattern_after.append( pattern )
             
     return new_pattern_after
 
@@ -125,21 +150,184 @@ def alignment_post_process(s1, s2, score):
     return pat_before, pat_after
 
 
+def screen_line(EF_i, sent, before_edit, after_edit):
+    """
+    Result of a line skipped by the prescreen, None if it has to be parsed
+    """
+    if prescreen is None:
+        return None
+    with stats.stage('prescreen'):
+        reason = prescreen.reason(sent, before_edit, after_edit)
+    if reason is None:
+        return None
+    stats.count('skipped_'+reason)
+    return {"status": "skipped", "index": EF_i, "reason": reason}
+
+
 def gen_ef_pattern(sent_idx):
     
     EF_i, sent = sent_idx
     
-    before_edit, after_edit = removeEditTag_exclusive(sent)
+    with stats.stage('removeEditTag'):
+        before_edit, after_edit = edit_sentences(sent)
+
+    skipped = screen_line(EF_i, sent, before_edit, after_edit)
+    if skipped is not None:
+        return skipped
 
-    # Extract pattern
     try:
-        csent_before, NP_sent_before, noun_phrase_before = sent2Collins_NP(before_edit)
-        pattern_after, _, NP_sent_after, noun_phrase_after = pattern_extract(after_edit, return_sent=True)
+        with stats.stage('parse', calls=2):
+            analysis_before = analyze_sentence(before_edit)
+            analysis_after = analyze_sentence(after_edit)
     except:
-        return {"status": "error", "log": 'pattern_extract() fails\n{}\n{}'.format(before_edit, after_edit)}
+        stats.count('pattern_extract_failure')
+        return {"status": "error", "index": EF_i, "log": 'pattern_extract() fails\n{}\n{}'.format(before_edit, after_edit)}
+
+    return align_ef_pattern(EF_i, before_edit, after_edit, analysis_before, analysis_after)
+
+
+def gen_ef_pattern_batch(block, batch_size=256):
+    """
+    Batched version of gen_ef_pattern()
+    Parse all before/after sentences of a block of lines with nlp.pipe(),
+    and align the windows of every line with one twoSequenceAlignment_batch() call
+
+    Return a list of results, one for each line in block
+    """
+    # Lines left after the prescreen, (position in block, EF_i, before_edit, after_edit)
+    with stats.stage('removeEditTag', calls=len(block)):
+        edits = [ edit_sentences(sent) for _, sent in block ]
+    lines = []
+    results = []
+    for (EF_i, sent), (before_edit, after_edit) in zip(block, edits):
+        results.append(screen_line(EF_i, sent, before_edit, after_edit))
+        if results[-1] is None:
+            lines.append( (len(results)-1, EF_i, before_edit, after_edit) )
+
+    try:
+        with stats.stage('parse', calls=2*len(lines)):
+            analyses = analyze_sentences([ before_edit for _, _, before_edit, _ in lines ]+[ after_edit for _, _, _, after_edit in lines ], batch_size=batch_size)
+    except:
+        # Fall back to parse line by line, so that only the broken line fails
+        return [ gen_ef_pattern(sent_idx) for sent_idx in block ]
+    analyses_before = analyses[:len(lines)]
+    analyses_after = analyses[len(lines):]
+
+    # Collect windows of every line
+    line_windows = []
+    for (idx, EF_i, before_edit, after_edit), analysis_before, analysis_after in zip(lines, analyses_before, analyses_after):
+        if analysis_before is None or analysis_after is None:
+            stats.count('pattern_extract_failure')
+            results[idx] = {"status": "error", "index": EF_i, "log": 'pattern_extract() fails\n{}\n{}'.format(before_edit, after_edit)}
+        else:
+            windows, error = prepare_alignment(EF_i, before_edit, after_edit, analysis_before, analysis_after)
+            results[idx] = error
+            if windows is not None:
+                line_windows.append( (idx, EF_i, windows) )
+
+    # Align windows of the whole block in one call
+    pairs = [ (str1, str2) for _, _, windows in line_windows for _, str1, str2 in windows ]
+    with stats.stage('twoSequenceAlignment', calls=len(pairs)):
+        alignments = iter(twoSequenceAlignment_batch(pairs, 0, 0, 1))
+    for idx, EF_i, windows in line_windows:
+        results[idx] = finish_alignment(EF_i, windows, [ next(alignments) for _ in windows ])
+
+    return results
+
+
+def init_worker(model_name, parse_cache_path=None, parse_cache_namespace=None, alignment_cache_path=None, collect_stats=False, use_prescreen=False):
+    """
+    Pool initializer, load the SpaCy model once per worker and report its cost
+    """
+    global stats, prescreen
+    if collect_stats:
+        stats = StageStats()
+    set_model(model_name)
+    if parse_cache_path:
+        set_parse_cache(ParseCache(parse_cache_path, parse_cache_namespace))
+    if alignment_cache_path:
+        # Alignments inherited from the parent, the worker saves only the ones it adds when it exits
+        if not alignment_cache:
+            load_alignment_cache(alignment_cache_path)
+        Finalize(None, save_worker_alignment_cache, args=(alignment_cache_path, len(alignment_cache)), exitpriority=10)
+    get_nlp()
+    if use_prescreen:
+        prescreen = PreScreen(Collins_lexicon, lemma_tables(get_nlp()), tokenizer=getattr(get_nlp(), 'tokenizer', None))
+    report = model_report()
+    print('worker {}: {} loaded in {:.2f}s, rss {:.0f} MB'.format(
+        os.getpid(), report['model'], report['load_seconds'], report['rss_mb'] or report['max_rss_mb']), file=sys.stderr, flush=True)
+
+
+def instrumented(worker_fn, task):
+    """
+    Run worker_fn on a task, return its output with the stage stats of this task
+    """
+    stats.reset()
+    output = worker_fn(task)
+    return output, stats.state()
+
+
+def save_worker_alignment_cache(alignment_cache_path, initial_size):
+    """
+    Save the alignments added since the worker started, the first initial_size are in the parent's table
+    """
+    if len(alignment_cache) > initial_size:
+        save_alignment_cache('{}.{}'.format(alignment_cache_path, os.getpid()), initial_size)
+
+
+def merge_alignment_cache(alignment_cache_path):
+    """
+    Merge the tables saved by workers into alignment_cache_path
+    """
+    part_paths = [ path for path in glob.glob(alignment_cache_path+'.*') if path[len(alignment_cache_path)+1:].isdigit() ]
+    for path in part_paths:
+        load_alignment_cache(path)
+    save_alignment_cache(alignment_cache_path)
+    for path in part_paths:
+        os.remove(path)
+
+
+def read_blocks(input_f_idx, block_size):
+    """
+    Group (index, line) pairs into lists of block_size lines
+    """
+    block = []
+    for sent_idx in input_f_idx:
+        block.append(sent_idx)
+        if len(block)==block_size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def prepare_alignment(EF_i, before_edit, after_edit, analysis_before, analysis_after):
+    """
+    Detect patterns of after_edit and find the window of their headword in before_edit,
+    given the SentenceAnalysis of both sentences
+
+    Return (windows, None), windows are [(headword, str1, str2), ...] to be aligned,
+    or (None, error result)
+    """
+    # Extract pattern, with --stats also the patterns of verbs skipped for having no Collins entry
+    skipped = [] if isinstance(stats, StageStats) else None
+    try:
+        with stats.stage('pattern_extract'):
+            csent_before, NP_sent_before, noun_phrase_before = sent2Collins_NP(analysis_before)
+            pattern_after, _, NP_sent_after, noun_phrase_after = pattern_extract(analysis_after, return_sent=True, lexicon=Collins_lexicon, skipped=skipped)
+    except:
+        stats.count('pattern_extract_failure')
+        return None, {"status": "error", "index": EF_i, "log": 'pattern_extract() fails\n{}\n{}'.format(before_edit, after_edit)}
 
     # Only reserve if headword and pattern combination is in Collins
-    pattern_after = checkInCollins(pattern_after)
+    n_patterns = len(pattern_after) + len(skipped or ())
+    with stats.stage('checkInCollins'):
+        pattern_after = checkInCollins(pattern_after)
+    stats.count('collins_rejected_patterns', n_patterns - len(pattern_after))
+    if not n_patterns:
+        stats.count('no_pattern')
+    elif not pattern_after:
+        stats.count('collins_rejection')
 
     # Add noun text into patterns
     """
@@ -147,9 +335,8 @@ def gen_ef_pattern(sent_idx):
     """
 
     # Pattern alignment, using pattern_after's headword as index
-    doc = nlp(NP_sent_before)
-    NP_sent_before = [ token.lemma_ for token in doc ]
-    hw_pat_temp = []
+    NP_sent_before = analysis_before.lemmas
+    windows = []
     for hw_pat_after in pattern_after:
 
         # Preprocess
@@ -161,85 +348,234 @@ def gen_ef_pattern(sent_idx):
         if hw_pat_after[0] in NP_sent_before:
             hw_idx = NP_sent_before.index(hw_pat_after[0])
         else:
-            return {"status": "error", "log": '{} is newly inserted into after_edit'.format((hw_pat_after[0]))}
+            stats.count('newly_inserted')
+            return None, {"status": "error", "index": EF_i, "log": '{} is newly inserted into after_edit'.format((hw_pat_after[0]))}
 
         # Extract str2
-        if hw_idx+5 <= len(csent_before):
-            str2 = ['V'] + csent_before[ hw_idx+1:hw_idx+5 ]
-        else:
-            str2 = ['V'] + csent_before[ hw_idx+1: ]
-        for idx,tag in enumerate(str2[1:]):
-            if tag in ['V|inf|v','V']:
-                str2 = str2[:idx+1]+['inf']
+        str2 = edit_window(csent_before, hw_idx)
 
-        # Optimal alignment
-        try:
-            aligned_s1, aligned_s2, score = twoSequenceAlignment(str1, str2, 0, 0, 1)
-        except:
-            return {"status": "error", "log": 'twoSequenceAlignment() fails, str1={}, str2={}'.format(str1, str2)}
+        if not str1 or not str2:
+            stats.count('alignment_failure')
+            return None, {"status": "error", "index": EF_i, "log": 'twoSequenceAlignment() fails, str1={}, str2={}'.format(str1, str2)}
+        windows.append( (hw_pat_after[0], str1, str2) )
+
+    return windows, None
+
+
+def finish_alignment(EF_i, windows, alignments):
+    """
+    Turn optimal alignments of windows into (headword, change, index) result
+    """
+    hw_pat_temp = []
+    for (hw, str1, str2), (aligned_s1, aligned_s2, score) in zip(windows, alignments):
 
         # Post process optimal alignment
-        pat_before, pat_after = alignment_post_process(aligned_s1, aligned_s2, score)
+        with stats.stage('alignment_post_process'):
+            pat_before, pat_after = alignment_post_process(aligned_s1, aligned_s2, score)
 
         # Save result
+        if score<2:
+            stats.count('score_rejection')
+        elif pat_before==pat_after:
+            stats.count('same_pattern')
         if pat_before!='' and pat_before!=pat_after:
             change = ' '.join(pat_before)+'>>'+' '.join(pat_after)
-            if (hw_pat_after[0],change,EF_i) not in hw_pat_temp:
-                hw_pat_temp.append( (hw_pat_after[0],change,EF_i) )
-                
-                
-    return {"status": "success", "result": hw_pat_temp}
+            if (hw,change,EF_i) not in hw_pat_temp:
+                hw_pat_temp.append( (hw,change,EF_i) )
 
+    # Lines without window are counted in prepare_alignment()
+    if windows:
+        stats.count('extracted' if hw_pat_temp else 'no_change')
 
-if __name__=='__main__':
+    windows = [ (hw, ' '.join(str1), ' '.join(str2)) for hw, str1, str2 in windows ]
+    return {"status": "success", "index": EF_i, "result": hw_pat_temp, "windows": windows}
 
 
-    error_file = open('Error_message.txt','w')
+def align_ef_pattern(EF_i, before_edit, after_edit, analysis_before, analysis_after):
+    """
+    Detect patterns of after_edit and align them with before_edit,
+    given the SentenceAnalysis of both sentences
+    """
+    windows, error = prepare_alignment(EF_i, before_edit, after_edit, analysis_before, analysis_after)
+    if error is not None:
+        return error
 
-    hw_pat_dict = defaultdict(lambda:defaultdict(lambda:0))
-    hw_pat_dict_example = defaultdict(lambda:defaultdict(list))
+    # Optimal alignment
+    alignments = []
+    for hw, str1, str2 in windows:
+        try:
+            with stats.stage('twoSequenceAlignment'):
+                alignments.append( twoSequenceAlignment(str1, str2, 0, 0, 1) )
+        except:
+            stats.count('alignment_failure')
+            return {"status": "error", "index": EF_i, "log": 'twoSequenceAlignment() fails, str1={}, str2={}'.format(str1, str2)}
+
+    return finish_alignment(EF_i, windows, alignments)
+
+
+if __name__=='__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', default='EF877.edit.txt', help='edit tagged corpus')
+    parser.add_argument('--workers', type=int, default=20, help='number of processes')
+    parser.add_argument('--model', default='en_core_web_lg', help='SpaCy model name')
+    parser.add_argument('--block-size', type=int, default=1000, help='lines sent to a worker at once')
+    parser.add_argument('--batch-size', type=int, default=256, help='batch_size of nlp.pipe()')
+    parser.add_argument('--no-batch', action='store_true', help='parse line by line with nlp()')
+    parser.add_argument('--parse-cache', default=None, help='sqlite file caching sentence analyses across runs')
+    parser.add_argument('--alignment-cache', default=None, help='json file keeping twoSequenceAlignment() results across runs')
+    parser.add_argument('--records', default=None, help='write per-line extraction records, for aggregate.py')
+    parser.add_argument('--checkpoint', default=None, help='file to save progress into periodically')
+    parser.add_argument('--checkpoint-every', type=int, default=50000, help='lines between checkpoints')
+    parser.add_argument('--resume', action='store_true', help='continue from --checkpoint if it exists')
+    parser.add_argument('--memory-budget', type=int, default=None, help='MB of example indices kept in memory before spilling to disk')
+    parser.add_argument('--no-delta', action='store_true', help='keep example indices as array(\'I\') instead of varint deltas')
+    parser.add_argument('--shard', default=None, help='K/N, process shard K of N and write a partial result instead of the outputs')
+    parser.add_argument('--partial', default=None, help='partial result file of --shard, Error_partial.K-of-N.json.gz by default')
+    parser.add_argument('--error-file', default='Error_message.txt', help='where error logs are written')
+    parser.add_argument('--prescreen', action='store_true', help='skip lines without kept edit, unchanged or without Collins headword before parsing')
+    parser.add_argument('--stats', default=None, help='time stages and count outcomes, write the report into this json file')
+    parser.add_argument('--progress', type=float, default=None, help='seconds between progress lines (lines/sec, ETA, queue depth)')
+    parser.add_argument('--prometheus', default=None, help='Prometheus textfile updated with every progress line and at the end')
+    add_filter_arguments(parser)
+    args = parser.parse_args()
+
+    set_model(args.model)
+    parse_cache_namespace = cache_namespace() if args.parse_cache else None
+    if args.alignment_cache:
+        load_alignment_cache(args.alignment_cache)
+
+    # Shard K of N, every node splits the corpus the same way
+    shard = None
+    if args.shard:
+        shard_k, n_shards = map(int, args.shard.split('/'))
+        if not 0 <= shard_k < n_shards:
+            parser.error('--shard K/N needs 0 <= K < N')
+        shards = shard_ranges(args.input, n_shards)
+        corpus_size = shards[-1].end
+        # A small corpus may give fewer than N shards, the others are empty
+        shard = shards[shard_k] if shard_k < len(shards) else Shard(args.input, corpus_size, corpus_size, None)
+        partial_path = args.partial or 'Error_partial.{}-of-{}.json.gz'.format(shard_k, n_shards)
+
+    # Resume from checkpoint
+    checkpoint = load_checkpoint(args.checkpoint) if args.checkpoint and args.resume else None
+    if checkpoint is not None:
+        if checkpoint['input'] != args.input:
+            raise ValueError('checkpoint {} is for {}, not {}'.format(args.checkpoint, checkpoint['input'], args.input))
+        if checkpoint.get('shard') != args.shard:
+            raise ValueError('checkpoint {} is for shard {}, not {}'.format(args.checkpoint, checkpoint.get('shard'), args.shard))
+        offset = checkpoint['offset']
+        aggregator = CompactAggregator.from_state(checkpoint['aggregator'])
+        truncate_file(args.error_file, checkpoint['error_file_size'])
+        error_file = open(args.error_file,'a')
+        record_writer = RecordWriter(args.records, checkpoint['records_size']) if args.records else None
+        print('resume from line {}'.format(offset), file=sys.stderr)
+    else:
+        offset = 0
+        aggregator = CompactAggregator(delta=not args.no_delta, memory_budget=args.memory_budget*2**20 if args.memory_budget else None,
+                                       spill_path=args.checkpoint+'.spill' if args.checkpoint else None)
+        error_file = open(args.error_file,'w')
+        record_writer = RecordWriter(args.records) if args.records else None
+
+    def make_checkpoint(offset):
+        error_file.flush()
+        save_checkpoint(args.checkpoint, {
+            'input': args.input,
+            'shard': args.shard,
+            'offset': offset,
+            'aggregator': aggregator.state(),
+            'error_file_size': error_file.tell(),
+            'records_size': record_writer.checkpoint() if record_writer is not None else 0,
+        })
 
     # Start timing
     start_time = datetime.now()
     
-    input_f_idx = enumerate(open('EF877.edit.txt'))
-    
-    workers = 20
-    with Pool(workers) as p:
-        for res in p.imap(gen_ef_pattern, input_f_idx):
-            if res['status'] == 'success':
-                for hw,change,i in res['result']:
-                    hw_pat_dict[hw][change]+=1
-                    hw_pat_dict_example[hw][change].append(i)
-            elif res['status'] == 'error':
-                print(res['log'], file=error_file)
-
-    
-    # Threshold
-    hw_pat_dict = threshold(hw_pat_dict)
-    
-    # End timing
-    print(str(datetime.now()-start_time))
-
-    # Output json file
-    with open('Error_pattern.json', 'w') as f:
-        json.dump(hw_pat_dict, f)
-
-    # Output in txt format
-    hw_pat_dict = [ (hw, pat, hw_pat_dict[hw][pat]) for hw in hw_pat_dict for pat in hw_pat_dict[hw] ]
-    with open('Error_pattern.txt', 'w') as f:
-        for line in hw_pat_dict:
-            f.write(str(line)+'\n')
-
-    # Output example json file
-    with open('Error_pattern_example.json','w') as f:
-        json.dump(hw_pat_dict_example, f)
-
-    # Ouput in txt format
-    hw_pat_dict_example = [ (hw, pat, hw_pat_dict_example[hw][pat]) for hw in hw_pat_dict_example for pat in hw_pat_dict_example[hw] ]
-    with open('Error_pattern_example.txt', 'w') as f:
-        for line in hw_pat_dict_example:
-            f.write(str(line)+'\n')
+    if shard is not None:
+        input_f_idx = islice(read_shard(shard), offset, None)
+    else:
+        input_f_idx = read_lines(args.input, offset)
+
+    # Progress of this run, ETA needs the size of what is left to read
+    if offset:
+        total_bytes = None
+    elif shard is not None:
+        total_bytes = shard.end - shard.start
+    else:
+        total_bytes = os.path.getsize(args.input) if compression(args.input) is None else None
+    if args.stats or args.prometheus:
+        stats = StageStats()
+    on_report = (lambda snapshot: write_prometheus(args.prometheus, stats, snapshot)) if args.prometheus else None
+    progress = Progress(total_bytes, args.progress, on_report=on_report)
+    input_f_idx = progress.track(input_f_idx)
+
+    if args.no_batch:
+        tasks = input_f_idx
+        worker_fn = gen_ef_pattern
+    else:
+        tasks = read_blocks(input_f_idx, args.block_size)
+        worker_fn = partial(gen_ef_pattern_batch, batch_size=args.batch_size)
+    if isinstance(stats, StageStats):
+        worker_fn = partial(instrumented, worker_fn)
     
-    error_file.close()
+    with Pool(args.workers, initializer=init_worker, initargs=(args.model, args.parse_cache, parse_cache_namespace, args.alignment_cache, isinstance(stats, StageStats), args.prescreen)) as p:
+        outputs = p.imap(worker_fn, tasks)
+        if isinstance(stats, StageStats):
+            outputs = stats.collect(outputs)
+        results = ( res for res_block in outputs for res in ([res_block] if args.no_batch else res_block) )
+        if record_writer is not None:
+            results = record_writer.tee(results)
+        skipped = dict.fromkeys(REASONS, 0)
+        for res in results:
+            if res['status'] == 'skipped':
+                skipped[res['reason']] += 1
+            with stats.stage('aggregation'):
+                aggregator.add_result(res, error_file)
+            offset += 1
+            progress.done()
+            if args.checkpoint and offset % args.checkpoint_every == 0:
+                make_checkpoint(offset)
+
+        # Let workers exit normally, so that they save their alignment tables
+        p.close()
+        p.join()
+
+    if args.alignment_cache:
+        merge_alignment_cache(args.alignment_cache)
+
+    if args.prescreen:
+        print('prescreen skipped {} of {} lines: {}'.format(sum(skipped.values()), progress.done_lines,
+              ', '.join( '{} {}'.format(reason, n) for reason, n in skipped.items() )), file=sys.stderr)
+
+    if args.checkpoint:
+        make_checkpoint(offset)
+    if record_writer is not None:
+        record_writer.close()
     
+    if shard is not None:
+        # Raw counts and examples of the shard, threshold() runs after merging every shard
+        error_file.close()
+        with open(args.error_file) as f:
+            error_text = f.read()
+        save_partial(partial_path, make_partial(args.input, corpus_size, shard, error_text, aggregator))
+        print(str(datetime.now()-start_time))
+        print('shard {} written into {}'.format(args.shard, partial_path), file=sys.stderr)
+    else:
+        # Threshold
+        hw_pat_dict = threshold(aggregator.counts_dict(), **filter_kwargs(args))
+
+        # End timing
+        print(str(datetime.now()-start_time))
+
+        write_outputs(hw_pat_dict, aggregator)
+        error_file.close()
+
+    # The outputs are written, the checkpoint and its spill file are not needed anymore
+    aggregator.close()
+    if args.checkpoint:
+        os.remove(args.checkpoint)
+
+    if args.stats:
+        write_report(args.stats, stats, progress.snapshot())
+    if args.prometheus:
+        write_prometheus(args.prometheus, stats, progress.snapshot())
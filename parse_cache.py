@@ -0,0 +1,100 @@
+"""
+Persistent, content-addressed cache of sentence analyses,
+so that runs which only change downstream logic (threshold(), alignment_post_process(),
+checkInCollins()) do not parse the corpus with SpaCy again.
+
+from parse_cache import ParseCache
+
+Sample:
+    from gpv_24 import set_parse_cache
+    set_parse_cache(ParseCache('parse_cache.sqlite'))
+    # analyze_sentence(), analyze_sentences(), pattern_extract() now hit the cache first
+
+Note:
+    - Records are SentenceAnalysis.to_record(): NP sentence, Collins' tags, lemmas and
+      noun phrase spans (as text), stored as json in a sqlite file
+    - The key is a hash of the sentence, the model name/version, alignment.json and
+      CACHE_VERSION, so a new model or tag alignment never reads stale records
+    - Bump CACHE_VERSION when makeNPsent() or alignment() changes
+    - Can be shared by Pool workers, each process opens its own connection
+"""
+import hashlib
+import json
+import os
+import sqlite3
+
+import spacy_model
+
+CACHE_VERSION = 2
+
+
+def cache_namespace(alignment_path='alignment.json'):
+    """
+    Everything besides the sentence that the analysis depends on
+    """
+    with open(alignment_path, 'rb') as f:
+        alignment_hash = hashlib.sha1(f.read()).hexdigest()
+    return '{}|{}|{}|{}'.format(CACHE_VERSION, spacy_model.model_name, spacy_model.model_version(), alignment_hash)
+
+
+class ParseCache:
+    """
+    sqlite backed mapping from sentence to analysis record
+    """
+    def __init__(self, path, namespace=None):
+        self.path = path
+        self.namespace = namespace if namespace is not None else cache_namespace()
+        self._conn = None
+        self._pid = None
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        # A connection must not cross fork(), reconnect in each worker
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=60)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS analysis (key BLOB PRIMARY KEY, record TEXT) WITHOUT ROWID')
+            self._conn.commit()
+            self._pid = os.getpid()
+        return self._conn
+
+    def key(self, sent):
+        return hashlib.sha1('{}\0{}'.format(self.namespace, sent).encode('utf-8')).digest()
+
+    def get(self, sent):
+        return self.get_many([sent]).get(sent)
+
+    def get_many(self, sents):
+        """
+        Return {sent: record} for the sentences found in cache
+        """
+        conn = self._connect()
+        key_sent = { self.key(sent): sent for sent in sents }
+        keys = list(key_sent)
+        found = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i+500]
+            rows = conn.execute('SELECT key, record FROM analysis WHERE key IN ({})'.format(','.join('?'*len(chunk))), chunk)
+            for key, record in rows:
+                found[key_sent[key]] = json.loads(record)
+        self.hits += len(found)
+        self.misses += len(key_sent) - len(found)
+        return found
+
+    def put(self, sent, record):
+        self.put_many([(sent, record)])
+
+    def put_many(self, sent_records):
+        if not sent_records:
+            return
+        conn = self._connect()
+        with conn:
+            conn.executemany('INSERT OR IGNORE INTO analysis VALUES (?, ?)',
+                             [ (self.key(sent), json.dumps(record, separators=(',', ':'))) for sent, record in sent_records ])
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
@@ -0,0 +1,175 @@
+"""
+Partial results of a sharded main.py run, and their merge into the output files.
+
+from partial_results import make_partial, merge_partials, partial_aggregator
+
+Sample:
+    python main.py --input EF877.edit.txt --shard 0/3 --partial part0.json.gz   # node 0
+    python main.py --input EF877.edit.txt --shard 1/3 --partial part1.json.gz   # node 1
+    python main.py --input EF877.edit.txt --shard 2/3 --partial part2.json.gz   # node 2
+    python partial_results.py part0.json.gz part1.json.gz part2.json.gz         # same outputs as one main.py run
+
+Usage:
+    python partial_results.py part*.json.gz                       # merge, threshold, write Error_pattern*.json
+    python partial_results.py part0.json.gz part1.json.gz --output part01.json.gz   # merge into a partial only
+
+Format:
+    {"version": 1, "input": "EF877.edit.txt", "size": 1234567,
+     "ranges": [[0, 411522, 0], ...],
+     "errors": [[0, "give is newly inserted into after_edit\\n..."], ...],
+     "pairs": [["give", "V to n>>V n", 2, [9, 7469]], ...]}
+    - size: bytes of the uncompressed corpus, every partial of a run must agree on it
+    - ranges: [start byte, end byte, first line index] of the shards covered
+    - errors: [first line index of a shard, its Error_message.txt content]
+    - pairs: (headword, change, raw count, example line indices) before threshold(),
+      in the order they were first seen
+    - json, gzip compressed if the file name ends with .gz
+
+Merge:
+    - Partials must cover disjoint byte ranges, so a line is counted once
+    - Counts are added and examples concatenated in line order
+    - Pairs are ordered by (line first seen, order in the partial it was first seen in);
+      two partials never share a line, so this is the order of a single run,
+      and the merge is associative and independent of the order of partials
+    - The final merge requires the ranges to cover the whole corpus,
+      then threshold() and write_outputs() run as in main.py
+"""
+import argparse
+import json
+from datetime import datetime
+
+from aggregate import threshold, write_outputs, add_filter_arguments, filter_kwargs
+from compact_aggregator import CompactAggregator
+from extraction_records import open_text
+
+PARTIAL_VERSION = 1
+
+
+def make_partial(input_path, size, shard, error_text, aggregator):
+    """
+    Partial of one shard, from the CompactAggregator of its lines and its error log
+    """
+    ranges = [ [shard.start, shard.end, shard.first_line] ] if shard.end > shard.start else []
+    return {
+        'version': PARTIAL_VERSION,
+        'input': input_path,
+        'size': size,
+        'ranges': ranges,
+        'errors': [ [shard.first_line, error_text] ] if error_text else [],
+        'pairs': [ [hw, change, count, examples] for hw, change, count, examples in aggregator.iter_first_seen() ],
+    }
+
+
+def save_partial(path, partial):
+    with open_text(path, 'wt') as f:
+        json.dump(partial, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def load_partial(path):
+    with open_text(path) as f:
+        partial = json.load(f)
+    if partial.get('version') != PARTIAL_VERSION:
+        raise ValueError('{} is not a partial result of version {}'.format(path, PARTIAL_VERSION))
+    return partial
+
+
+def merge_partials(partials):
+    """
+    One partial holding every given partial
+    """
+    if not partials:
+        raise ValueError('no partial to merge')
+    sizes = set( partial['size'] for partial in partials )
+    if len(sizes) != 1:
+        raise ValueError('partials are of corpora of different sizes: {}'.format(sorted(sizes)))
+
+    ranges = sorted( tuple(r) for partial in partials for r in partial['ranges'] )
+    for prev, cur in zip(ranges, ranges[1:]):
+        if cur[0] < prev[1]:
+            raise ValueError('byte ranges {} and {} overlap, lines would be counted twice'.format(list(prev), list(cur)))
+
+    # (headword, change) -> [(first line, rank in its partial), count, [examples of each partial]]
+    merged = {}
+    for partial in partials:
+        for rank, (hw, change, count, examples) in enumerate(partial['pairs']):
+            key = (examples[0], rank)
+            entry = merged.get( (hw, change) )
+            if entry is None:
+                merged[(hw, change)] = [key, count, [examples]]
+            else:
+                entry[0] = min(entry[0], key)
+                entry[1] += count
+                entry[2].append(examples)
+
+    pairs = []
+    for (hw, change), (_, count, example_lists) in sorted(merged.items(), key=lambda item: item[1][0]):
+        example_lists.sort(key=lambda examples: examples[0])
+        pairs.append( [hw, change, count, [ i for examples in example_lists for i in examples ]] )
+
+    return {
+        'version': PARTIAL_VERSION,
+        'input': partials[0]['input'],
+        'size': sizes.pop(),
+        'ranges': [ list(r) for r in ranges ],
+        'errors': sorted( error for partial in partials for error in partial['errors'] ),
+        'pairs': pairs,
+    }
+
+
+def missing_ranges(partial):
+    """
+    [[start, end], ...] of corpus bytes not covered by the ranges of partial
+    """
+    missing = []
+    position = 0
+    for start, end, _ in sorted(partial['ranges']):
+        if start > position:
+            missing.append([position, start])
+        position = max(position, end)
+    if position < partial['size']:
+        missing.append([position, partial['size']])
+    return missing
+
+
+def partial_aggregator(partial, aggregator=None):
+    """
+    CompactAggregator of the pairs of partial, iterated in the order of a single run
+    """
+    if aggregator is None:
+        aggregator = CompactAggregator()
+    for hw, change, count, examples in partial['pairs']:
+        aggregator.add_counted(hw, change, count, examples)
+    return aggregator
+
+
+if __name__=='__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('partials', nargs='+', help='partial files written by main.py --shard')
+    parser.add_argument('--output', default=None, help='write the merged partial into this file, without threshold()')
+    parser.add_argument('--prefix', default='Error_pattern', help='prefix of output files')
+    parser.add_argument('--error-file', default='Error_message.txt', help='where error logs are written')
+    parser.add_argument('--memory-budget', type=int, default=None, help='MB of example indices kept in memory before spilling to disk')
+    add_filter_arguments(parser)
+    args = parser.parse_args()
+
+    start_time = datetime.now()
+
+    partial = merge_partials([ load_partial(path) for path in args.partials ])
+    if args.output:
+        save_partial(args.output, partial)
+    else:
+        missing = missing_ranges(partial)
+        if missing:
+            raise ValueError('partials do not cover bytes {} of {}'.format(missing, partial['input']))
+
+        with open(args.error_file, 'w') as error_file:
+            for _, error_text in partial['errors']:
+                error_file.write(error_text)
+
+        aggregator = partial_aggregator(partial, CompactAggregator(memory_budget=args.memory_budget*2**20 if args.memory_budget else None))
+        hw_pat_dict = threshold(aggregator.counts_dict(), **filter_kwargs(args))
+        write_outputs(hw_pat_dict, aggregator, args.prefix)
+        aggregator.close()
+
+    print(str(datetime.now()-start_time))
@@ -0,0 +1,129 @@
+"""
+Token level matcher for Collins' verb grammar patterns.
+
+from pattern_matcher import PatternMatcher
+
+Sample:
+    matcher = PatternMatcher([['V', 'n'], ['V', 'to', 'n'], ['V']])
+    matcher.match(['V', 'to', 'n', 'and'])
+Return:
+    ['V to n', 'V']
+    - Patterns are compiled once into a trie over tags
+    - Only patterns that are a prefix of the window match, longest first
+
+Note:
+    - Matching compares whole tags, so 'V n' does not match 'V n-ed'
+    - Patterns that do not start with 'V' can never be anchored at a verb,
+      they are kept in the trie but never returned by pattern_detection()
+"""
+
+_END = None
+
+
+class PatternMatcher:
+    """
+    Trie of tag sequences, one pass along the window returns every matching pattern.
+    """
+    def __init__(self, patterns):
+        self.root = {}
+        self.max_len = 0
+        for pattern in patterns:
+            if not pattern:
+                continue
+            node = self.root
+            for tag in pattern:
+                node = node.setdefault(tag, {})
+            node[_END] = ' '.join(pattern)
+            self.max_len = max(self.max_len, len(pattern))
+
+    def match(self, window):
+        """
+        Return patterns which are a prefix of window (list of tags), longest first
+        """
+        matched = []
+        node = self.root
+        for tag in window:
+            node = node.get(tag)
+            if node is None:
+                break
+            if _END in node:
+                matched.append(node[_END])
+        matched.reverse()
+        return matched
+
+
+def normalize_window(c_sent, start_idx, max_len):
+    """
+    Window of Collins sentence starting at the verb of start_idx,
+    with misleading tags substituded as in Collins' patterns
+    """
+    window = ['V']
+    for tag in c_sent[start_idx+1:start_idx+max_len]:
+        if tag=='V|inf|v':
+            window.append('inf')
+        elif tag=='it':
+            window.append('n')
+        else:
+            window.append(tag)
+    return window
+
+
+def edit_window(c_sent, hw_idx):
+    """
+    Window of Collins sentence at the headword of hw_idx, as aligned by main.py
+    (headword as 'V', 4 tags after it, a following verb becomes 'inf' and ends the window)
+    """
+    window = ['V'] + c_sent[hw_idx+1:hw_idx+5]
+    for idx,tag in enumerate(window[1:]):
+        if tag in ['V|inf|v','V']:
+            window = window[:idx+1]+['inf']
+    return window
+
+
+# Micro-benchmark, compared with the substring scanning of gpv_24 before PatternMatcher
+if __name__ == '__main__':
+    import json
+    import random
+    import timeit
+
+    with open('Collins_verb_pattern.txt') as f:
+        patterns = [ pattern.split() for pattern in f.read().split('\n') if pattern.split() ]
+    with open('alignment.json') as f:
+        tags = sorted(set(json.load(f).values())) + ['prep', 'n', 'n', 'n', 'V', 'and', '.']
+
+    random.seed(0)
+    sents = [ [ random.choice(tags) for _ in range(random.randint(5, 30)) ] for _ in range(2000) ]
+    verb_tags = ['V|inf|v','V','-ed','-ing']
+
+    def substring_detection(c_sent):
+        hw_pat = []
+        for start_idx,tag in enumerate(c_sent):
+            if tag in verb_tags:
+                extract = c_sent[start_idx:start_idx+5]
+                extract = ['V']+(' '.join(extract[1:])).replace('V|inf|v','inf').replace(' it ',' n ').split()
+                extract = ' '.join(extract)
+                for pattern in patterns:
+                    pattern = ' '.join(pattern)
+                    if pattern in extract:
+                        hw_pat.append( (start_idx, pattern) )
+        return hw_pat
+
+    matcher = PatternMatcher(patterns)
+    def trie_detection(c_sent):
+        hw_pat = []
+        for start_idx,tag in enumerate(c_sent):
+            if tag in verb_tags:
+                for pattern in matcher.match(normalize_window(c_sent, start_idx, 5)):
+                    hw_pat.append( (start_idx, pattern) )
+        return hw_pat
+
+    # Matches of the trie are the anchored subset of the substring matches
+    for c_sent in sents:
+        anchored = [ (i, pat) for i, pat in substring_detection(c_sent)
+                     if normalize_window(c_sent, i, 5)[:len(pat.split())]==pat.split() ]
+        assert sorted(anchored)==sorted(trie_detection(c_sent)), c_sent
+
+    n_verbs = sum( tag in verb_tags for c_sent in sents for tag in c_sent )
+    for name, fn in [('substring', substring_detection), ('trie', trie_detection)]:
+        seconds = min(timeit.repeat(lambda: [ fn(c_sent) for c_sent in sents ], number=1, repeat=5))
+        print('{:10} {:8.2f} ms / {} sentences, {:6.2f} us / verb'.format(name, seconds*1000, len(sents), seconds/n_verbs*1e6))
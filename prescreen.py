@@ -0,0 +1,239 @@
+"""
+Cheap checks of a corpus line before any SpaCy work, to skip lines that cannot give a rule.
+
+from prescreen import PreScreen
+
+Sample:
+    nlp = get_nlp()
+    screen = PreScreen(load_lexicon('verb_pattern.json'), lemma_tables(nlp), tokenizer=nlp.tokenizer)
+    screen.reason('He gave me a pen [-,//PU-]{+.//PU+}', 'He gave me a pen .', 'He gave me a pen .')
+    screen.reason('He [-give//XC-]{+gave//XC+} it .', 'He give it .', 'He gave it .')
+Return:
+    'no_kept_edit'
+    None
+
+Reasons, checked in this order:
+    - no_kept_edit: no edit has a feature in KEEP_FEATURES (one regex search)
+    - unchanged: before_edit == after_edit, e.g. [-a//XC-]{+a//XC+}
+    - no_headword: no word of after_edit can have a lemma that is a headword of the Collins lexicon
+
+Where results could change:
+    - no_kept_edit and unchanged lines have the same sentence before and after editing,
+      yet main.prepare_alignment() aligns the pattern found in after_edit with a window
+      built differently from before_edit (see pattern_matcher.edit_window()), which starts
+      at the first occurrence of the headword. When a headword occurs twice, or the window
+      tags differ from the pattern tags, an unchanged sentence can still give a rule.
+      Such rules are lost with the prescreen; on a corpus, compare a run with and without it.
+    - Error_message.txt has no log for skipped lines (pattern_extract() failures
+      and twoSequenceAlignment() failures of these lines are not seen)
+    - no_headword is conservative, not exact: pattern_detection() only starts at verbs whose lemma
+      is in the lexicon, and a line is skipped only when no token can get such a lemma.
+      Tokens are split by the model's own tokenizer (gonna -> gon na, norms going to),
+      the lemmas of a token's text and norm are generated with the rules, exception and lookup
+      tables of the model's lemmatizer for every part of speech, plus the LEMMA overrides of the
+      attribute_ruler (see lemma_tables()), plus every lemma a contraction can get.
+      So it can keep lines the parse would not give a rule for, but should not drop one
+      it would give a rule for. Other components setting lemmas are not known to it:
+      with a trainable lemmatizer, no lemmatizer tables, or an attribute_ruler override
+      not bound to given words, the check is not done.
+      Without a tokenizer, words are split at spaces, hyphens and punctuation, which misses
+      tokenizer exceptions such as gonna/gotta.
+"""
+import re
+from collections import namedtuple
+
+from removeEditTag import KEEP_FEATURES
+
+REASONS = ['no_kept_edit', 'unchanged', 'no_headword']
+
+# Lemmas of "'s", "'re", "'d", "'ll", "wo", "ca", "ai" ... which SpaCy splits off or out of a word
+CONTRACTION_LEMMAS = ['be', 'have', 'will', 'would', 'can', 'do', 'shall', 'should', 'could', 'must', 'need', 'dare']
+
+_WORD = re.compile(r"[^\W\d_]+")
+
+# rules: [(old suffix, new suffix), ...] of every part of speech
+# exceptions: {word: [lemma, ...]} of every part of speech
+# lookup: {word: lemma} of a lookup lemmatizer
+# overrides: {lowercase word: [lemma, ...]} set by attribute_ruler patterns on that word
+# any_token: lemmas attribute_ruler may set on tokens not bound to given words
+LemmaTables = namedtuple('LemmaTables', ['rules', 'exceptions', 'lookup', 'overrides', 'any_token'])
+
+_WORD_KEYS = ['ORTH', 'TEXT', 'LOWER', 'NORM']
+
+
+def kept_edit_pattern(keep=KEEP_FEATURES):
+    """
+    Regex finding an edit with a kept feature, in either format
+    """
+    features = '|'.join(sorted(keep))
+    return re.compile(r'//(?:{0})[-+]|[\]}}]\((?:{0})\)'.format(features))
+
+
+def _pattern_words(token_pattern):
+    """
+    Words a token pattern of the Matcher can match, None if it is not bound to given words
+    """
+    for key, value in token_pattern.items():
+        if key.upper() not in _WORD_KEYS:
+            continue
+        if isinstance(value, str):
+            return [value]
+        if isinstance(value, dict) and list(value) == ['IN']:
+            return list(value['IN'])
+    return None
+
+
+def ruler_lemmas(nlp):
+    """
+    (overrides, any_token) of the LEMMA set by the attribute_ruler of nlp
+    """
+    overrides = {}
+    any_token = set()
+    if 'attribute_ruler' not in nlp.pipe_names:
+        return overrides, any_token
+    for rule in nlp.get_pipe('attribute_ruler').patterns:
+        lemma = { key.upper(): value for key, value in rule['attrs'].items() }.get('LEMMA')
+        if lemma is None:
+            continue
+        for pattern in rule['patterns']:
+            words = _pattern_words(pattern[rule.get('index', 0)]) if isinstance(pattern, list) else None
+            if words is None:
+                any_token.add(lemma)
+            for word in words or ():
+                overrides.setdefault(word.lower(), []).append(lemma)
+    return overrides, any_token
+
+
+def lemma_tables(nlp):
+    """
+    LemmaTables of the lemmatizer and attribute_ruler of nlp,
+    None if it has no lemmatizer tables, or a lemmatizer this check does not know
+    """
+    pipe_names = getattr(nlp, 'pipe_names', [])
+    if 'lemmatizer' not in pipe_names or 'trainable_lemmatizer' in pipe_names:
+        return None
+    lookups = getattr(nlp.get_pipe('lemmatizer'), 'lookups', None)
+    if lookups is None:
+        return None
+
+    rules = set()
+    exceptions = {}
+    lookup = {}
+    if lookups.has_table('lemma_rules'):
+        for pos_rules in lookups.get_table('lemma_rules').values():
+            rules.update( (old, new) for old, new in pos_rules )
+    if lookups.has_table('lemma_exc'):
+        for pos_exceptions in lookups.get_table('lemma_exc').values():
+            for word, lemmas in pos_exceptions.items():
+                exceptions.setdefault(word, []).extend(lemmas)
+    if lookups.has_table('lemma_lookup'):
+        lookup = dict(lookups.get_table('lemma_lookup').items())
+
+    if not rules and not exceptions and not lookup:
+        return None
+    overrides, any_token = ruler_lemmas(nlp)
+    return LemmaTables(sorted(rules), exceptions, lookup, overrides, any_token)
+
+
+class PreScreen:
+    """
+    Reason to skip a line, or None to parse it.
+    tables are lemma_tables() of the model, tokenizer its nlp.tokenizer
+    """
+    def __init__(self, lexicon, tables=None, keep=KEEP_FEATURES, cache_size=2**18, tokenizer=None):
+        self.lexicon = lexicon
+        self.kept_edit = kept_edit_pattern(keep)
+        self.tables = tables
+        self.tokenizer = tokenizer
+        self.cache_size = cache_size
+        self.word_cache = {}   # word -> whether it can have a headword lemma
+        self.contraction = any( lemma in lexicon for lemma in CONTRACTION_LEMMAS )
+        # attribute_ruler may give any token a headword lemma, no line can be skipped for no_headword
+        self.check_headword = tables is not None and not any( lemma in lexicon for lemma in tables.any_token )
+
+    def lemmas(self, word):
+        """
+        Every lemma the lemmatizer could give word
+        """
+        rules, exceptions, lookup, overrides, _ = self.tables
+        lower = word.lower()
+        candidates = {word, lower}
+        for old, new in rules:
+            if lower.endswith(old):
+                candidates.add(lower[:len(lower)-len(old)] + new)
+        candidates.update(exceptions.get(lower, ()))
+        if lower in lookup:
+            candidates.add(lookup[lower])
+        candidates.update(overrides.get(lower, ()))
+        return candidates
+
+    def may_be_headword(self, word):
+        found = self.word_cache.get(word)
+        if found is None:
+            found = any( lemma in self.lexicon for lemma in self.lemmas(word) )
+            if len(self.word_cache) < self.cache_size:
+                self.word_cache[word] = found
+        return found
+
+    def has_headword(self, sent):
+        if self.contraction and "'" in sent:
+            return True
+        if self.tokenizer is not None:
+            # The tokens the parse lemmatizes, by their text and by their norm (gon -> going)
+            for token in self.tokenizer(sent.strip()):
+                if self.may_be_headword(token.text) or self.may_be_headword(token.norm_):
+                    return True
+            return False
+        for token in sent.split():
+            # The whole token, and its pieces as split by the tokenizer at hyphens or punctuation
+            if self.may_be_headword(token):
+                return True
+            for word in _WORD.findall(token):
+                if word != token and self.may_be_headword(word):
+                    return True
+        return False
+
+    def reason(self, sent, before_edit, after_edit):
+        if not self.kept_edit.search(sent):
+            return 'no_kept_edit'
+        if before_edit == after_edit:
+            return 'unchanged'
+        if self.check_headword and not self.has_headword(after_edit):
+            return 'no_headword'
+        return None
+
+
+# Skip counts of a corpus, without parsing
+if __name__ == '__main__':
+    import argparse
+    import time
+    from collections import Counter
+
+    from collins_lexicon import load_lexicon
+    from corpus_reader import read_lines
+    from removeEditTag import edit_sentences
+    from spacy_model import set_model, get_nlp
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('corpus')
+    parser.add_argument('--model', default='en_core_web_lg', help='SpaCy model, whose lemmatizer tables are read')
+    args = parser.parse_args()
+
+    set_model(args.model)
+    nlp = get_nlp()
+    tables = lemma_tables(nlp)
+    if tables is None:
+        print('{} has no lemmatizer tables, no_headword is not checked'.format(args.model))
+    screen = PreScreen(load_lexicon('verb_pattern.json'), tables, tokenizer=nlp.tokenizer)
+
+    reasons = Counter()
+    start_time = time.perf_counter()
+    for i, sent in read_lines(args.corpus):
+        before_edit, after_edit = edit_sentences(sent)
+        reasons[screen.reason(sent, before_edit, after_edit)] += 1
+    seconds = time.perf_counter() - start_time
+
+    n_lines = sum(reasons.values())
+    for reason in REASONS + [None]:
+        print('{:14} {:9d} {:6.1%}'.format(reason or 'parsed', reasons[reason], reasons[reason]/n_lines if n_lines else 0))
+    print('{} lines in {:.2f}s'.format(n_lines, seconds))
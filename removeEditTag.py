@@ -1,9 +1,158 @@
 """
 Functions for removing various format of edit tags.
+
+from removeEditTag import edit_sentences
+
+Sample:
+    edit_sentences('He gave [-to//XC-] me a pen [-,//PU-]{+.//PU+}')
+    edit_sentences('He gave [-to-](XC) me a pen [-,-]{+.+}(PU)')
+Return:
+    ('He gave to me a pen .', 'He gave me a pen .')
+    ('He gave to me a pen .', 'He gave me a pen .')
+
+Single pass parser:
+    - tokenize_edits() scans a line once with one precompiled pattern of its format into segments,
+      (TEXT, text), (DELETION, text), (INSERTION, text) and (FEATURE, code)
+    - A feature applies to the edits right before it: the edit it is written in for
+      EF877 ([-x//XC-]{+y//XC+}), or the whole [-x-]{+y+} group for EF2014 ([-x-]{+y+}(XC))
+    - build_sentences() gives before/after of segments for any set of kept features:
+        before: text, deletions with a kept feature, insertions without one
+        after: text and every insertion
+      keep=None undoes every edit, as removeEditTag() and removeEditTag_P()
+    - edit_sentences() gives the same from the scan directly, without building segments
+    - The format is detected from the line, see detect_format()
+
+Note:
+    - removeEditTag*() are the former regex functions, kept for comparison
+    - Unlike removeEditTag_exclusive() and removeEditTag_P_exclusive(),
+      edits of several words are handled the same as single words,
+      e.g. 'I want [-discuss//XC-]{+to discuss//XC+} it' gives 'I want discuss it' before editing,
+      not 'I want discussto discuss it'
 """
 
 import re
 
+TEXT = 'text'
+DELETION = 'deletion'
+INSERTION = 'insertion'
+FEATURE = 'feature'
+
+KEEP_FEATURES = frozenset(['XC', 'D', 'IS', 'MW', 'PR', 'WC'])
+
+SLASH = 'slash'  # EF877, [-x//XC-]{+y//XC+}
+PAREN = 'paren'  # EF2014, [-x-]{+y+}(XC)
+
+# split() of a line gives text, then the groups of each edit and the text after it
+_SLASH_EDIT = re.compile(r'\[-([^\]/]*(?:/(?!/)[^\]/]*)*)(?://([A-Z]*))?-\]|\{\+([^}/]*(?:/(?!/)[^}/]*)*)(?://([A-Z]*))?\+\}')
+_PAREN_EDIT = re.compile(r'\[-([^\]]*?)-\](?:\{\+([^}]*?)\+\})?(?:\(([A-Z]+)\))?|\{\+([^}]*?)\+\}(?:\(([A-Z]+)\))?')
+_PAREN_FEATURE = re.compile(r'(?:-\]|\+\})\([A-Z]+\)')
+
+
+def detect_format(sent):
+    """
+    PAREN if a feature follows an edit in brackets, otherwise SLASH
+    """
+    return PAREN if _PAREN_FEATURE.search(sent) else SLASH
+
+
+def _edits(sent, fmt):
+    """
+    Yield (deletion, deletion feature, insertion, insertion feature, text after), None for what is absent,
+    after the text before the first edit
+    """
+    if fmt==SLASH:
+        parts = _SLASH_EDIT.split(sent)
+        yield parts[0]
+        for i in range(1, len(parts), 5):
+            yield parts[i:i+5]
+    else:
+        parts = _PAREN_EDIT.split(sent)
+        yield parts[0]
+        for i in range(1, len(parts), 6):
+            deletion, insertion, code, single_insertion, single_code, text = parts[i:i+6]
+            if deletion is None:
+                insertion, code = single_insertion, single_code
+            yield deletion, code, insertion, code, text
+
+
+def tokenize_edits(sent, fmt=None):
+    """
+    Segments of a line, [(kind, value), ...], in one scan
+    """
+    if fmt is None:
+        fmt = detect_format(sent)
+
+    edits = _edits(sent, fmt)
+    text = next(edits)
+    segments = [ (TEXT, text) ] if text else []
+    for deletion, del_code, insertion, ins_code, text in edits:
+        if deletion is not None:
+            segments.append( (DELETION, deletion) )
+            if del_code and (fmt==SLASH or insertion is None):
+                segments.append( (FEATURE, del_code) )
+        if insertion is not None:
+            segments.append( (INSERTION, insertion) )
+            if ins_code:
+                segments.append( (FEATURE, ins_code) )
+        if text:
+            segments.append( (TEXT, text) )
+    return segments
+
+
+def build_sentences(segments, keep=KEEP_FEATURES):
+    """
+    (before_edit, after_edit) of segments, only edits with a feature in keep are undone in before_edit,
+    keep=None undoes every edit
+    """
+    before = []
+    after = []
+    pending = []  # edits waiting for their feature, (kind, text, index in before)
+    for kind, value in segments:
+        if kind==TEXT:
+            before.append(value)
+            after.append(value)
+            pending = []
+        elif kind==FEATURE:
+            # Edits with a kept feature are undone in before_edit
+            if keep is not None and value in keep:
+                for edit_kind, text, idx in pending:
+                    before[idx] = text if edit_kind==DELETION else ''
+            pending = []
+        else:
+            if kind==INSERTION:
+                after.append(value)
+            if keep is None:
+                before.append(value if kind==DELETION else '')
+            else:
+                # Edits without a kept feature stay applied in before_edit
+                before.append(value if kind==INSERTION else '')
+                pending.append( (kind, value, len(before)-1) )
+    return ' '.join(''.join(before).split()), ' '.join(''.join(after).split())
+
+
+def edit_sentences(sent, keep=KEEP_FEATURES, fmt=None):
+    """
+    Sentences before and after editing of a line in either format,
+    the same as build_sentences(tokenize_edits(sent, fmt), keep) without building segments
+    """
+    if fmt is None:
+        fmt = detect_format(sent)
+
+    edits = _edits(sent, fmt)
+    text = next(edits)
+    before = [text]
+    after = [text]
+    for deletion, del_code, insertion, ins_code, text in edits:
+        if deletion is not None and (keep is None or del_code in keep):
+            before.append(deletion)
+        if insertion is not None:
+            after.append(insertion)
+            if keep is not None and ins_code not in keep:
+                before.append(insertion)
+        before.append(text)
+        after.append(text)
+    return ' '.join(''.join(before).split()), ' '.join(''.join(after).split())
+
 
 def removeEditTag(sent):
     """Remove edit tags of a sentence.
@@ -116,4 +265,33 @@ if __name__=='__main__':
     
     before, after = removeEditTag_P_exclusive('Hello [-A-]{+B+}(XC) [-.-]{+!+}(PU)')
     print(before)
-    print(after)
\ No newline at end of file
+    print(after)
+    before, after = edit_sentences('Hello [-A-]{+B+}(XC) [-.-]{+!+}(PU)')
+    print(before)
+    print(after)
+
+    # Benchmark on tag heavy lines, against the regex functions
+    import random
+    import timeit
+
+    random.seed(0)
+    words = ['the', 'a', 'park', 'music', 'give', 'to', 'about', 'see', 'him', 'book']
+    features = ['XC', 'VT', 'PU', 'SP', 'D', 'WO']
+    def make_line(fmt, n_tokens=30):
+        tokens = []
+        for _ in range(n_tokens):
+            word, other, feature = random.choice(words), random.choice(words), random.choice(features)
+            if random.random() < 0.5:
+                tokens.append(word)
+            elif fmt==SLASH:
+                tokens.append('[-{}//{}-]{{+{}//{}+}}'.format(word, feature, other, feature))
+            else:
+                tokens.append('[-{}-]{{+{}+}}({})'.format(word, other, feature))
+        return ' '.join(tokens)
+
+    for fmt, regex_fn in [(SLASH, removeEditTag_exclusive), (PAREN, removeEditTag_P_exclusive)]:
+        lines = [ make_line(fmt) for _ in range(2000) ]
+        regex_seconds = min(timeit.repeat(lambda: [ regex_fn(line) for line in lines ], number=1, repeat=5))
+        single_seconds = min(timeit.repeat(lambda: [ edit_sentences(line) for line in lines ], number=1, repeat=5))
+        print('{:5} {:28} {:6.1f} us/line, edit_sentences {:6.1f} us/line, {:.1f}x'.format(
+            fmt, regex_fn.__name__, regex_seconds/len(lines)*1e6, single_seconds/len(lines)*1e6, regex_seconds/single_seconds))
@@ -0,0 +1,162 @@
+"""
+Scoring and filtering of (headword, change) counts, replacing the fixed rule of threshold().
+
+from rule_scoring import RuleScores
+
+Sample:
+    scores = RuleScores.from_counts({'give': {'V to n>>V n': 316, 'V n to>>V n': 33}, 'discuss': {'V about n>>V n': 52}})
+    scores.filter(min_count=11)
+    scores.filter(top_k=1)
+    scores.filter(min_score=1.0, score='pmi')
+Return:
+    {'give': {'V to n>>V n': 316, 'V n to>>V n': 33}, 'discuss': {'V about n>>V n': 52}}
+    {'give': {'V to n>>V n': 316}, 'discuss': {'V about n>>V n': 52}}
+    {'discuss': {'V about n>>V n': 52}}
+
+Scores, one value per (headword, change):
+    - count: frequency in corpus
+    - rel_freq: count / frequency of all changes of the headword
+    - pmi: log2( P(headword, change) / P(headword)P(change) )
+    - llr: log-likelihood ratio (G^2) of the 2x2 table of headword and change
+
+Note:
+    - The headword x change table is kept as a sparse matrix in coordinate form
+      (rows, cols, count), every score is computed once for all entries with NumPy
+    - filter() can be called many times with different settings without recomputing
+    - top_k keeps the best entries of each headword among those passing min_count and min_score,
+      ranked by score if given, otherwise by count
+    - Output keeps the order of the input dict, like threshold()
+"""
+import numpy as np
+
+SCORES = ['count', 'rel_freq', 'pmi', 'llr']
+
+
+class RuleScores:
+    """
+    Sparse headword x change count table and its association scores
+    """
+    def __init__(self, headwords, changes, rows, cols, counts):
+        self.headwords = headwords
+        self.changes = changes
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.cols = np.asarray(cols, dtype=np.int64)
+        self.count = np.asarray(counts, dtype=np.float64)
+
+        n_rows = len(headwords)
+        n_cols = len(changes)
+        total = self.count.sum()
+        row_total = np.bincount(self.rows, weights=self.count, minlength=n_rows)[self.rows]
+        col_total = np.bincount(self.cols, weights=self.count, minlength=n_cols)[self.cols]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.rel_freq = self.count / row_total
+            self.pmi = np.log2(self.count * total / (row_total * col_total))
+
+            # 2x2 table: (headword, change), (headword, other), (other, change), (other, other)
+            observed = [self.count, row_total - self.count, col_total - self.count, total - row_total - col_total + self.count]
+            expected = [row_total * col_total, row_total * (total - col_total),
+                        (total - row_total) * col_total, (total - row_total) * (total - col_total)]
+            llr = np.zeros_like(self.count)
+            for k, e in zip(observed, expected):
+                e = e / total
+                llr += np.where(k > 0, k * np.log(k / e), 0.0)
+            self.llr = 2 * llr
+
+    @classmethod
+    def from_counts(cls, hw_pat_dict):
+        """
+        Build from {headword: {change: count}}
+        """
+        headwords = []
+        changes = []
+        change_id = {}
+        rows = []
+        cols = []
+        counts = []
+        for hw, sub in hw_pat_dict.items():
+            row = len(headwords)
+            headwords.append(hw)
+            for change, count in sub.items():
+                col = change_id.get(change)
+                if col is None:
+                    col = change_id[change] = len(changes)
+                    changes.append(change)
+                rows.append(row)
+                cols.append(col)
+                counts.append(count)
+        return cls(headwords, changes, rows, cols, counts)
+
+    def to_sparse(self):
+        """
+        scipy.sparse.coo_matrix of counts, requires scipy
+        """
+        from scipy.sparse import coo_matrix
+        return coo_matrix((self.count, (self.rows, self.cols)), shape=(len(self.headwords), len(self.changes)))
+
+    def mask(self, min_count=None, top_k=None, min_score=None, score=None):
+        """
+        Boolean mask of entries passing every given condition,
+        top_k ranks the entries of each headword passing the other conditions,
+        by score if given, otherwise by count
+        """
+        keep = np.ones(len(self.count), dtype=bool)
+        if min_count is not None:
+            keep &= self.count >= min_count
+        if min_score is not None:
+            keep &= getattr(self, score or 'pmi') >= min_score
+        if top_k is not None:
+            # Rank entries of each headword by score, ties in input order
+            idx = np.flatnonzero(keep)
+            values = getattr(self, score or 'count')[idx]
+            order = np.lexsort((idx, -values, self.rows[idx]))
+            sorted_rows = self.rows[idx][order]
+            first = np.searchsorted(sorted_rows, sorted_rows, side='left')
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order)) - first
+            keep[idx] = rank < top_k
+        return keep
+
+    def filter(self, min_count=None, top_k=None, min_score=None, score=None):
+        """
+        {headword: {change: count}} of entries passing every given condition,
+        headwords without any entry left are dropped
+
+        score is compared with min_score (pmi if not given) and ranks the top_k (count if not given)
+        """
+        if score is not None and score not in SCORES:
+            raise ValueError('score must be one of {}'.format(SCORES))
+        keep = self.mask(min_count, top_k, min_score, score)
+        dic = {}
+        for idx in np.flatnonzero(keep).tolist():
+            hw = self.headwords[self.rows[idx]]
+            dic.setdefault(hw, {})[self.changes[self.cols[idx]]] = int(self.count[idx])
+        return dic
+
+    def iter_scores(self):
+        """
+        Yield (headword, change, count, rel_freq, pmi, llr) of every entry
+        """
+        for idx in range(len(self.count)):
+            yield (self.headwords[self.rows[idx]], self.changes[self.cols[idx]], int(self.count[idx]),
+                   float(self.rel_freq[idx]), float(self.pmi[idx]), float(self.llr[idx]))
+
+
+# Testing code
+if __name__ == '__main__':
+    import random
+    import time
+
+    random.seed(0)
+    counts = {}
+    for hw in range(20000):
+        for change in random.sample(range(3000), random.randint(1, 5)):
+            counts.setdefault('hw{}'.format(hw), {})['ch{}'.format(change)] = random.randint(1, 500)
+
+    start_time = time.perf_counter()
+    scores = RuleScores.from_counts(counts)
+    built = time.perf_counter()
+    for setting in [dict(min_count=11), dict(top_k=5), dict(min_count=11, min_score=2.0, score='llr')]:
+        result = scores.filter(**setting)
+        print(setting, sum( len(sub) for sub in result.values() ))
+    print('{} entries, scoring {:.3f}s, 3 filters {:.3f}s'.format(len(scores.count), built-start_time, time.perf_counter()-built))
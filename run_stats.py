@@ -0,0 +1,240 @@
+"""
+Per stage timing, outcome counters and progress of a main.py run.
+
+from run_stats import StageStats, NullStats, Progress
+
+Sample:
+    stats = StageStats()
+    with stats.stage('parse', calls=2):
+        analyze_sentences([before_edit, after_edit])
+    stats.count('newly_inserted')
+    stats.state()
+Return:
+    {'calls': {'parse': 2}, 'seconds': {'parse': 0.0132}, 'outcomes': {'newly_inserted': 1}}
+
+Workers:
+    - Each worker times its own stages into a StageStats, instrumented() sends its state
+      back with every task output and the main process merges it with collect()
+    - NullStats has the same methods and does nothing, it is used when --stats is not given
+
+Outcomes counted in main.py:
+    - every line is counted once as pattern_extract_failure, no_pattern, collins_rejection
+      (every pattern of after_edit dropped by checkInCollins, or of a verb skipped by
+      pattern_extract() for having no Collins entry), newly_inserted, alignment_failure,
+      no_change (aligned, no rule found), extracted,
+      or skipped_no_kept_edit, skipped_unchanged, skipped_no_headword with --prescreen
+    - every aligned window as score_rejection (alignment score < 2), same_pattern, or neither
+    - collins_rejected_patterns: patterns dropped by checkInCollins, and patterns of skipped verbs,
+      which are only detected to be counted when stats are collected
+
+Progress:
+    - Progress.track() counts lines handed to the Pool, done() counts results,
+      queue depth is the difference: lines read but not processed yet
+    - ETA is estimated from the average size of the lines read so far,
+      unknown when the size of the input is not (compressed corpus, resumed run)
+
+Report:
+    - write_report() writes lines, lines/sec, time and share of each stage, and outcome counts as json
+    - write_prometheus() writes the same into a Prometheus textfile (node_exporter textfile collector),
+      replaced atomically so it is never read half written
+"""
+import json
+import os
+import sys
+import time
+from datetime import timedelta
+
+
+class _Timer:
+    __slots__ = ['stats', 'name', 'calls', 'start']
+
+    def __init__(self, stats, name, calls):
+        self.stats = stats
+        self.name = name
+        self.calls = calls
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.stats.add(self.name, time.perf_counter() - self.start, self.calls)
+
+
+class StageStats:
+    """
+    Seconds and calls of each stage, and counts of outcomes
+    """
+    def __init__(self):
+        self.calls = {}
+        self.seconds = {}
+        self.outcomes = {}
+
+    def stage(self, name, calls=1):
+        """
+        Context manager timing name
+        """
+        return _Timer(self, name, calls)
+
+    def add(self, name, seconds, calls=1):
+        self.calls[name] = self.calls.get(name, 0) + calls
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def count(self, outcome, n=1):
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + n
+
+    def state(self):
+        return {'calls': self.calls, 'seconds': self.seconds, 'outcomes': self.outcomes}
+
+    def reset(self):
+        self.calls = {}
+        self.seconds = {}
+        self.outcomes = {}
+
+    def merge(self, state):
+        for name, calls in state['calls'].items():
+            self.add(name, state['seconds'][name], calls)
+        for outcome, n in state['outcomes'].items():
+            self.count(outcome, n)
+
+    def collect(self, outputs):
+        """
+        Merge the states of (output, state) pairs from instrumented tasks, yield the outputs
+        """
+        for output, state in outputs:
+            self.merge(state)
+            yield output
+
+
+class _NullTimer:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+_NULL_TIMER = _NullTimer()
+
+
+class NullStats:
+    """
+    StageStats that records nothing
+    """
+    def stage(self, name, calls=1):
+        return _NULL_TIMER
+
+    def add(self, name, seconds, calls=1):
+        pass
+
+    def count(self, outcome, n=1):
+        pass
+
+    def reset(self):
+        pass
+
+    def state(self):
+        return {'calls': {}, 'seconds': {}, 'outcomes': {}}
+
+
+class Progress:
+    """
+    Lines per second, ETA and queue depth of a run, printed every `every` seconds
+    """
+    def __init__(self, total_bytes=None, every=None, stream=sys.stderr, on_report=None):
+        self.total_bytes = total_bytes
+        self.every = every
+        self.stream = stream
+        self.on_report = on_report
+        self.read_lines = 0
+        self.read_bytes = 0
+        self.done_lines = 0
+        self.start_time = time.monotonic()
+        self.next_report = self.start_time + every if every else None
+
+    def track(self, input_f_idx):
+        """
+        Pass (index, line) pairs on, counting them
+        """
+        for sent_idx in input_f_idx:
+            self.read_lines += 1
+            self.read_bytes += len(sent_idx[1])
+            yield sent_idx
+
+    def done(self, n=1):
+        self.done_lines += n
+        if self.next_report is not None and time.monotonic() >= self.next_report:
+            self.report()
+            self.next_report = time.monotonic() + self.every
+
+    def snapshot(self):
+        seconds = time.monotonic() - self.start_time
+        lines_per_sec = self.done_lines / seconds if seconds > 0 else None
+        eta_seconds = None
+        if self.total_bytes and self.read_bytes and lines_per_sec:
+            total_lines = self.read_lines * self.total_bytes / self.read_bytes
+            eta_seconds = max(total_lines - self.done_lines, 0) / lines_per_sec
+        return {
+            'lines': self.done_lines,
+            'seconds': seconds,
+            'lines_per_sec': lines_per_sec,
+            'eta_seconds': eta_seconds,
+            'queue_depth': self.read_lines - self.done_lines,
+        }
+
+    def report(self):
+        snapshot = self.snapshot()
+        eta = str(timedelta(seconds=int(snapshot['eta_seconds']))) if snapshot['eta_seconds'] is not None else '?'
+        print('{} lines, {:.0f} lines/sec, ETA {}, queue {} lines'.format(
+            snapshot['lines'], snapshot['lines_per_sec'] or 0, eta, snapshot['queue_depth']), file=self.stream, flush=True)
+        if self.on_report is not None:
+            self.on_report(snapshot)
+
+
+def make_report(stats, snapshot):
+    """
+    Json serializable summary of a run
+    """
+    total_seconds = sum(stats.seconds.values())
+    stages = { name: {'calls': stats.calls[name], 'seconds': seconds,
+                      'share': seconds/total_seconds if total_seconds else None}
+               for name, seconds in sorted(stats.seconds.items(), key=lambda item: -item[1]) }
+    return {
+        'lines': snapshot['lines'],
+        'seconds': snapshot['seconds'],
+        'lines_per_sec': snapshot['lines_per_sec'],
+        'stages': stages,
+        'outcomes': dict(sorted(stats.outcomes.items())),
+    }
+
+
+def write_report(path, stats, snapshot):
+    with open(path, 'w') as f:
+        json.dump(make_report(stats, snapshot), f, indent=2)
+
+
+def write_prometheus(path, stats, snapshot, prefix='gpv'):
+    """
+    Stage seconds, calls, outcomes and progress in Prometheus text format
+    """
+    lines = []
+    def metric(name, kind, help_text, samples):
+        lines.append('# HELP {}_{} {}'.format(prefix, name, help_text))
+        lines.append('# TYPE {}_{} {}'.format(prefix, name, kind))
+        for labels, value in samples:
+            lines.append('{}_{}{} {}'.format(prefix, name, labels, value))
+
+    metric('stage_seconds_total', 'counter', 'Seconds spent in each stage, summed over workers',
+           [ ('{{stage="{}"}}'.format(name), seconds) for name, seconds in sorted(stats.seconds.items()) ])
+    metric('stage_calls_total', 'counter', 'Items processed by each stage',
+           [ ('{{stage="{}"}}'.format(name), calls) for name, calls in sorted(stats.calls.items()) ])
+    metric('outcomes_total', 'counter', 'Lines, windows and patterns by outcome',
+           [ ('{{outcome="{}"}}'.format(outcome), n) for outcome, n in sorted(stats.outcomes.items()) ])
+    metric('lines_total', 'counter', 'Lines processed', [ ('', snapshot['lines']) ])
+    metric('lines_per_second', 'gauge', 'Lines processed per second since the start', [ ('', snapshot['lines_per_sec'] or 0) ])
+    metric('queue_depth', 'gauge', 'Lines read but not processed yet', [ ('', snapshot['queue_depth']) ])
+    if snapshot['eta_seconds'] is not None:
+        metric('eta_seconds', 'gauge', 'Estimated seconds left', [ ('', snapshot['eta_seconds']) ])
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write('\n'.join(lines)+'\n')
+    os.replace(tmp_path, path)
@@ -0,0 +1,105 @@
+"""
+Shared SpaCy model for every module of the extraction.
+
+from spacy_model import get_nlp
+
+Sample:
+    set_model('en_core_web_sm')  # optional, default is en_core_web_lg or $SPACY_MODEL
+    nlp = get_nlp()              # loaded on first call, then reused
+    doc = nlp('I go to a beautiful park.')
+    print(model_report())
+Return:
+    {'model': 'en_core_web_sm', 'pipeline': [...], 'load_seconds': 0.61, 'rss_mb': 212.4, 'max_rss_mb': 212.4}
+
+Note:
+    - The model is loaded lazily, once per process, so importing gpv_24 or main is cheap
+    - Components that Collins alignment never reads (see DISABLE) are not loaded
+    - Collins alignment needs tag_, lemma_ and noun_chunks,
+      so tok2vec, tagger, parser, attribute_ruler and lemmatizer are kept
+"""
+import os
+import resource
+import time
+
+DEFAULT_MODEL = 'en_core_web_lg'
+DISABLE = ['ner']
+
+model_name = os.environ.get('SPACY_MODEL', DEFAULT_MODEL)
+
+_nlp = None
+_load_seconds = None
+
+
+def set_model(name):
+    """
+    Select the model used by get_nlp()
+    Must be called before the model is loaded
+    """
+    global model_name
+    if _nlp is not None and name!=model_name:
+        raise RuntimeError('{} is already loaded, cannot switch to {}'.format(model_name, name))
+    model_name = name
+
+
+def get_nlp():
+    """
+    Return the shared SpaCy model, loading it on first call.
+    """
+    global _nlp, _load_seconds
+    if _nlp is None:
+        import spacy
+
+        start_time = time.perf_counter()
+        _nlp = spacy.load(model_name, exclude=DISABLE)
+        _load_seconds = time.perf_counter() - start_time
+    return _nlp
+
+
+def model_version():
+    """
+    Version of the selected model, read from its package without loading it if possible
+    """
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+        return version(model_name)
+    except (ImportError, PackageNotFoundError, ValueError):
+        return get_nlp().meta.get('version', '')
+
+
+def is_loaded():
+    return _nlp is not None
+
+
+def rss_mb():
+    """
+    Current resident memory of this process in MB, None if unknown
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+
+def model_report():
+    """
+    Model name, loaded components, startup time and memory of this process
+    """
+    return {
+        'model': model_name,
+        'pipeline': list(_nlp.pipe_names) if _nlp is not None else [],
+        'load_seconds': _load_seconds,
+        'rss_mb': rss_mb(),
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+# Testing code
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) > 1:
+        set_model(sys.argv[1])
+    get_nlp()
+    print(model_report())
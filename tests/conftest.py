@@ -0,0 +1,11 @@
+"""
+Modules of this repository are top-level scripts which read their data files
+(alignment.json, Collins_verb_pattern.txt, ...) from the working directory,
+make them importable from tests/ and run the tests from the repository root
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
@@ -0,0 +1,39 @@
+"""
+run_end_to_end() passes --block-size and --batch-size on to the workers, as main.py does
+"""
+import benchmark
+import main
+
+
+class InlinePool:
+    """Pool running tasks in this process, without the initializer"""
+
+    def __init__(self, processes, initializer=None, initargs=()):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def map(self, fn, iterable, chunksize=None):
+        return list(map(fn, iterable))
+
+    def imap(self, fn, iterable, chunksize=1):
+        return map(fn, iterable)
+
+
+def test_batch_size_reaches_workers(monkeypatch):
+    calls = []
+
+    def gen_ef_pattern_batch(block, batch_size=256):
+        calls.append( (len(block), batch_size) )
+        return [ None for _ in block ]
+
+    monkeypatch.setattr(benchmark, 'Pool', InlinePool)
+    monkeypatch.setattr(main, 'gen_ef_pattern_batch', gen_ef_pattern_batch)
+    lines = benchmark.make_corpus(5, seed=1)
+    run = benchmark.run_end_to_end(lines, 1, None, block_size=2, batch_size=7)
+    assert run['lines'] == 5
+    assert calls == [ (2, 7), (2, 7), (1, 7) ]
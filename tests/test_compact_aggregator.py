@@ -0,0 +1,91 @@
+"""
+CompactAggregator against plain nested dicts, with and without spilling and checkpoint restore
+"""
+import json
+import random
+
+import pytest
+
+from compact_aggregator import CompactAggregator
+
+
+def make_adds(n=3000, seed=0):
+    rng = random.Random(seed)
+    headwords = ['give', 'go', 'discuss', 'listen', 'want']
+    changes = ['V n>>V to n', 'V to n>>V n', 'V about n>>V n', 'V>>V n', 'V n n>>V n to n']
+    return [ (rng.choice(headwords), rng.choice(changes), i*3 + rng.randrange(3)) for i in range(n) ]
+
+
+def expected(adds):
+    counts = {}
+    examples = {}
+    for hw, change, i in adds:
+        counts.setdefault(hw, {})[change] = counts.get(hw, {}).get(change, 0) + 1
+        examples.setdefault(hw, {}).setdefault(change, []).append(i)
+    return counts, examples
+
+
+def add_all(aggregator, adds):
+    for hw, change, i in adds:
+        aggregator.add(hw, change, i)
+    return aggregator
+
+
+def restored(aggregator):
+    return CompactAggregator.from_state(json.loads(json.dumps(aggregator.state())))
+
+
+@pytest.mark.parametrize('delta', [True, False])
+@pytest.mark.parametrize('memory_budget', [None, 1, 4096])
+def test_same_as_dicts(tmp_path, delta, memory_budget):
+    adds = make_adds()
+    aggregator = add_all(CompactAggregator(delta, memory_budget, str(tmp_path/'agg.spill')), adds)
+    counts, examples = expected(adds)
+    assert json.dumps(aggregator.counts_dict()) == json.dumps(counts)
+    assert json.dumps(aggregator.examples_dict()) == json.dumps(examples)
+    if memory_budget is not None:
+        assert aggregator.spill_file is not None
+    aggregator.close()
+    assert not (tmp_path/'agg.spill').exists()
+
+
+@pytest.mark.parametrize('delta', [True, False])
+def test_restore_from_state(tmp_path, delta):
+    adds = make_adds()
+    aggregator = add_all(CompactAggregator(delta, 1024, str(tmp_path/'agg.spill')), adds[:1500])
+    state = json.loads(json.dumps(aggregator.state()))
+    # Spilled after the checkpoint, cut off on restore
+    add_all(aggregator, adds[1500:2000])
+    aggregator.spill_file.close()
+
+    aggregator = add_all(CompactAggregator.from_state(state), adds[1500:])
+    counts, examples = expected(adds)
+    assert json.dumps(aggregator.counts_dict()) == json.dumps(counts)
+    assert json.dumps(aggregator.examples_dict()) == json.dumps(examples)
+    aggregator.close()
+
+
+def test_restore_without_spill_file(tmp_path):
+    aggregator = add_all(CompactAggregator(True, 1, str(tmp_path/'agg.spill')), make_adds(100))
+    state = aggregator.state()
+    aggregator.close()
+    with pytest.raises(ValueError):
+        CompactAggregator.from_state(state)
+
+
+def test_restore_without_spill(tmp_path):
+    adds = make_adds(100)
+    aggregator = add_all(CompactAggregator(True, None, str(tmp_path/'agg.spill')), adds)
+    aggregator = restored(aggregator)
+    assert json.dumps(aggregator.examples_dict()) == json.dumps(expected(adds)[1])
+
+
+def test_budget_counts_pairs(tmp_path):
+    # One example per pair: the cost of pairs triggers spills, buffers stay small
+    adds = [ ('give', 'change {}'.format(i), i) for i in range(2000) ]
+    memory_budget = 64*1024
+    aggregator = add_all(CompactAggregator(True, memory_budget, str(tmp_path/'agg.spill')), adds)
+    assert aggregator.spill_file is not None
+    assert aggregator.buffer_bytes <= max(memory_budget - aggregator.fixed_bytes, memory_budget // 8)
+    assert list(aggregator.iter_first_seen()) == [ (hw, change, 1, [i]) for hw, change, i in adds ]
+    aggregator.close()
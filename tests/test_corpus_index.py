@@ -0,0 +1,30 @@
+"""
+CorpusIndex against corpus_reader.read_lines(), and on compressed corpora
+"""
+import gzip
+
+import pytest
+
+from corpus_index import CorpusIndex
+from corpus_reader import read_lines
+
+LINES = ['He gave [-to//XC-] me a pen .\n', 'I go to a beautiful park .\r\n', '\n', 'Tschüss [-,//PU-]{+.//PU+}\n', 'no line break']
+
+
+def test_same_as_read_lines(tmp_path):
+    corpus_path = tmp_path/'corpus.txt'
+    corpus_path.write_bytes(''.join(LINES).encode('utf-8'))
+    corpus = CorpusIndex(str(corpus_path))
+    expected = [ line.rstrip('\r\n') for _, line in read_lines(str(corpus_path)) ]
+    assert len(corpus) == len(expected)
+    assert corpus.lines(range(len(corpus))) == expected
+    # Again from the saved index
+    assert CorpusIndex(str(corpus_path)).lines(range(len(corpus))) == expected
+
+
+def test_compressed_corpus(tmp_path):
+    corpus_path = tmp_path/'corpus.txt.gz'
+    with gzip.open(str(corpus_path), 'wt', encoding='utf-8') as f:
+        f.write(''.join(LINES))
+    with pytest.raises(ValueError, match='decompress'):
+        CorpusIndex(str(corpus_path))
@@ -0,0 +1,60 @@
+"""
+ErrorChecker on the sentences of an edit-tagged line, parsed by hand into SpaCy Docs
+"""
+import spacy
+from spacy.tokens import Doc
+
+from error_checker import ErrorChecker
+from gpv_24 import SentenceAnalysis
+from removeEditTag import edit_sentences
+
+# Rules as main.py writes them, {headword: {'wrong>>correct': frequency}}
+RULES = {
+    'discuss': {'V about n>>V n': 52, 'V about n>>V n with n': 4},
+    'give': {'V to n n>>V n n': 316},
+}
+
+# Tag, part of speech, head, dependency and lemma of each word
+PARSES = {
+    'We discussed about the plan .': [
+        ('PRP', 'PRON', 1, 'nsubj', 'we'), ('VBD', 'VERB', 1, 'ROOT', 'discuss'), ('IN', 'ADP', 1, 'prep', 'about'),
+        ('DT', 'DET', 4, 'det', 'the'), ('NN', 'NOUN', 2, 'pobj', 'plan'), ('.', 'PUNCT', 1, 'punct', '.')],
+    'We discussed the plan .': [
+        ('PRP', 'PRON', 1, 'nsubj', 'we'), ('VBD', 'VERB', 1, 'ROOT', 'discuss'),
+        ('DT', 'DET', 3, 'det', 'the'), ('NN', 'NOUN', 1, 'dobj', 'plan'), ('.', 'PUNCT', 1, 'punct', '.')],
+}
+
+
+def analyze(sentence):
+    words = sentence.split()
+    tags, pos, heads, deps, lemmas = zip(*PARSES[sentence])
+    doc = Doc(spacy.blank('en').vocab, words=words, tags=list(tags), pos=list(pos), heads=list(heads), deps=list(deps), lemmas=list(lemmas))
+    return SentenceAnalysis.from_doc(doc)
+
+
+def test_flags_the_edited_error():
+    before_edit, after_edit = edit_sentences('We discussed [-about//XC-] the plan .')
+    checker = ErrorChecker(RULES)
+    assert checker.check(analyze(before_edit)) == [{
+        'headword': 'discuss',
+        'start': 1,
+        'end': 4,
+        'text': 'discussed about the plan',
+        'wrong': 'V about n',
+        'suggestions': [('V n', 52), ('V n with n', 4)],
+    }]
+    assert checker.check(analyze(after_edit)) == []
+
+
+def test_min_count():
+    before_edit, _ = edit_sentences('We discussed [-about//XC-] the plan .')
+    flags = ErrorChecker(RULES, min_count=11).check(analyze(before_edit))
+    assert [ flag['suggestions'] for flag in flags ] == [ [('V n', 52)] ]
+    assert ErrorChecker(RULES, min_count=100).check(analyze(before_edit)) == []
+
+
+def test_suggestion_already_in_sentence():
+    # The correct pattern also matches the window, nothing to suggest
+    before_edit, _ = edit_sentences('We discussed [-about//XC-] the plan .')
+    checker = ErrorChecker({'discuss': {'V about n>>V': 20}})
+    assert checker.check(analyze(before_edit)) == []
@@ -0,0 +1,18 @@
+"""
+Pattern detection of gpv_24 against its former behaviour
+"""
+from gpv_24 import pattern_detection
+
+# NP frobnicate NP and go to NP
+C_SENT = ['n', 'V', 'n', 'and', 'V', 'to', 'n']
+LEMMAS = ['NP', 'frobnicate', 'NP', 'and', 'go', 'to', 'NP']
+
+
+def test_lexicon_skipped_patterns():
+    # Patterns kept with a lexicon, plus the skipped ones, are the patterns found without lexicon
+    everything = pattern_detection(C_SENT, LEMMAS, LEMMAS)
+    skipped = []
+    kept = pattern_detection(C_SENT, LEMMAS, LEMMAS, {'go'}, skipped)
+    assert kept == pattern_detection(C_SENT, LEMMAS, LEMMAS, {'go'})
+    assert [ hw for hw, _, _ in kept ] == ['go', 'go']
+    assert sorted(kept + skipped, key=lambda hw_pat: hw_pat[2]) == everything
@@ -0,0 +1,86 @@
+"""
+html_to_text() against golden pages in tests/golden/html_text, and against `w3m -dump -cols 80`,
+the layout it replaces in local_api
+
+Usage:
+    python tests/test_html_text.py    # rewrite the golden pages with w3m
+
+Note:
+    - The golden pages are compared on every run, with or without w3m
+    - The committed pages were written by html_to_text(), w3m was not available;
+      rewrite them with w3m, test_golden_same_as_w3m() checks them whenever w3m is installed
+"""
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))   # also run as a script, see conftest.py
+from html_text import html_to_text, w3m_dump
+
+
+def verb_table(header, verbs, border='1'):
+    rows = [ verbs[idx:idx+4] for idx in range(0, len(verbs), 4) ]
+    return ('<table border="{}"><tr><th colspan="4">{}</th></tr>'.format(border, header)
+            + ''.join( '<tr>' + ''.join( '<td>{}</td>'.format(verb) for verb in row ) + '</tr>' for row in rows )
+            + '</table>')
+
+
+# Pages in the shape turn_json_to_html() writes: description, verb tables, chapter and page
+PAGES = {
+    'one_group': '<p>Verbs in this group</p>' + verb_table('kill', ['abandon', 'destroy', 'end', 'stop']) + '<div> chapter: 0 page: 20 </div>',
+    'short_last_row': '<p>These verbs are concerned with stopping or abandoning something.</p>'
+                      + verb_table('start/stop', [ 'verb{}'.format(i) for i in range(10) ]) + '<br><div> chapter: 0 page: 40 </div>',
+    'wide_table': verb_table('communicate', [ 'communicate_with_someone_{}'.format(i) for i in range(8) ]),
+    'long_description': '<p>' + ' '.join(['These verbs are concerned with talking to someone about something.']*6) + '</p>'
+                        + verb_table('talk', ['argue', 'chat', 'talk', 'speak', 'write']),
+    'two_groups': verb_table('like', ['adore', 'like', 'love']) + '<br>' + verb_table('hate', ['detest', 'hate', 'loathe']),
+    'no_border': verb_table('give', ['give', 'hand', 'lend', 'pass', 'sell'], border='0') + '<div> chapter: 1 page: 3 </div>',
+}
+
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden', 'html_text')
+
+
+def golden_path(name):
+    return os.path.join(GOLDEN_DIR, name + '.txt')
+
+
+def read_golden(name):
+    with open(golden_path(name), encoding='utf-8') as f:
+        return f.read()
+
+
+def normalize(text):
+    lines = [ line.rstrip() for line in text.split('\n') ]
+    while lines and lines[-1]=='':
+        lines.pop()
+    return lines
+
+
+@pytest.mark.parametrize('name', sorted(PAGES))
+def test_fits_width(name):
+    lines = html_to_text(PAGES[name]).split('\n')
+    assert all( len(line) <= 80 for line in lines )
+
+
+@pytest.mark.parametrize('name', sorted(PAGES))
+def test_same_as_golden(name):
+    assert normalize(html_to_text(PAGES[name])) == normalize(read_golden(name))
+
+
+@pytest.mark.skipif(shutil.which('w3m') is None, reason='w3m is not installed')
+@pytest.mark.parametrize('name', sorted(PAGES))
+def test_golden_same_as_w3m(name):
+    assert normalize(read_golden(name)) == normalize(w3m_dump(PAGES[name]))
+
+
+if __name__ == '__main__':
+    if shutil.which('w3m') is None:
+        sys.exit('w3m is not installed')
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    for name, html in sorted(PAGES.items()):
+        with open(golden_path(name), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(normalize(w3m_dump(html))) + '\n')
+        print(golden_path(name))
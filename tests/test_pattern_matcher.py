@@ -0,0 +1,78 @@
+"""
+PatternMatcher against the linear scan of Collins' patterns it replaced in gpv_24.pattern_detection()
+"""
+import json
+import random
+
+from pattern_matcher import PatternMatcher, normalize_window
+
+VERB_TAGS = ['V|inf|v', 'V', '-ed', '-ing']
+
+
+def load_patterns():
+    with open('Collins_verb_pattern.txt') as f:
+        return [ pattern.split() for pattern in f.read().split('\n') if pattern.split() ]
+
+
+def random_sents(n=2000, seed=0, extra_tags=('it',)):
+    with open('alignment.json') as f:
+        tags = sorted(set(json.load(f).values())) + ['prep', 'n', 'n', 'n', 'V', 'and', '.'] + list(extra_tags)
+    rng = random.Random(seed)
+    return [ [ rng.choice(tags) for _ in range(rng.randint(1, 30)) ] for _ in range(n) ]
+
+
+def linear_match(patterns, window):
+    """
+    Every pattern which is a whole-tag prefix of window, longest first
+    """
+    matched = [ ' '.join(pattern) for pattern in patterns if window[:len(pattern)]==pattern ]
+    return sorted(matched, key=lambda pattern: -len(pattern.split()))
+
+
+def substring_detection(patterns, c_sent):
+    """
+    pattern_detection() before PatternMatcher, without headwords
+    """
+    hw_pat = []
+    for start_idx,tag in enumerate(c_sent):
+        if tag in VERB_TAGS:
+            extract = c_sent[start_idx:start_idx+5]
+            extract = ['V']+(' '.join(extract[1:])).replace('V|inf|v','inf').replace(' it ',' n ').split()
+            extract = ' '.join(extract)
+            for pattern in patterns:
+                pattern = ' '.join(pattern)
+                if pattern in extract:
+                    hw_pat.append( (start_idx, pattern) )
+    return hw_pat
+
+
+def test_same_as_linear_scan():
+    patterns = load_patterns()
+    matcher = PatternMatcher(patterns)
+    assert matcher.max_len == max( len(pattern) for pattern in patterns )
+    for c_sent in random_sents():
+        for start_idx, tag in enumerate(c_sent):
+            if tag in VERB_TAGS:
+                window = normalize_window(c_sent, start_idx, matcher.max_len)
+                assert matcher.match(window) == linear_match(patterns, window), window
+
+
+def test_anchored_substring_matches():
+    # Matches of the trie are the substring matches of the old scan which start at the verb,
+    # except for 'it', which the old scan only turned into 'n' between two tags
+    patterns = load_patterns()
+    matcher = PatternMatcher(patterns)
+    for c_sent in random_sents(seed=1, extra_tags=()):
+        trie = [ (start_idx, pattern) for start_idx, tag in enumerate(c_sent) if tag in VERB_TAGS
+                 for pattern in matcher.match(normalize_window(c_sent, start_idx, 5)) ]
+        anchored = [ (start_idx, pattern) for start_idx, pattern in substring_detection(patterns, c_sent)
+                     if normalize_window(c_sent, start_idx, 5)[:len(pattern.split())]==pattern.split() ]
+        assert sorted(trie) == sorted(anchored), c_sent
+
+
+def test_whole_tags():
+    matcher = PatternMatcher([['V', 'n'], ['V', 'to', 'n'], ['V']])
+    assert matcher.match(['V', 'to', 'n', 'and']) == ['V to n', 'V']
+    assert matcher.match(['V', 'n-ed']) == ['V']
+    assert matcher.match(['n', 'V']) == []
+    assert matcher.match(normalize_window(['n', 'V', 'it'], 1, 3)) == ['V n', 'V']
@@ -0,0 +1,81 @@
+"""
+PreScreen no_headword against the lemmas of a full parse,
+with a small rule lemmatizer pipeline standing in for the SpaCy model
+"""
+import warnings
+
+import pytest
+import spacy
+from spacy.lookups import Lookups
+
+from prescreen import PreScreen, lemma_tables
+
+LEXICON = {'give', 'go', 'get', 'want', 'discuss'}
+
+SENTENCES = [
+    'He gave me a pen .',
+    'I am gonna leave now .',
+    'You gotta see this .',
+    'We wanna eat .',
+    'She is discussing it with him .',
+    'They went home early .',
+    'The cat sat on the mat .',
+    'Nice weather , is it not ?',
+    'The well-given speech ended .',
+    'My parents gives me money .',
+    'Apples and oranges .',
+]
+
+
+def make_nlp():
+    nlp = spacy.blank('en')
+    ruler = nlp.add_pipe('attribute_ruler')
+    ruler.add([[{'LOWER': {'IN': ['gave', 'gives', 'gon', 'got', 'went', 'discussing', 'leave', 'sat', 'eat', 'see', 'ended']}}]], {'POS': 'VERB'})
+    ruler.add([[{'LOWER': 'gon'}, {'LOWER': 'na'}]], {'LEMMA': 'go'}, index=0)
+    ruler.add([[{'LOWER': 'wanna'}]], {'LEMMA': 'want'})
+    lemmatizer = nlp.add_pipe('lemmatizer', config={'mode': 'rule'})
+    lookups = Lookups()
+    lookups.add_table('lemma_rules', {'verb': [['ing', ''], ['ed', 'e'], ['ed', ''], ['s', '']], 'noun': [['s', '']]})
+    lookups.add_table('lemma_exc', {'verb': {'gave': ['give'], 'went': ['go'], 'got': ['get'], 'sat': ['sit']}})
+    lookups.add_table('lemma_index', {'verb': ['give', 'go', 'get', 'discuss', 'leave', 'sit', 'eat', 'see', 'end'], 'noun': []})
+    lemmatizer.initialize(lookups=lookups)
+    return nlp
+
+
+@pytest.fixture(scope='module')
+def nlp():
+    return make_nlp()
+
+
+def parse_lemmas(nlp, sent):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return [ token.lemma_ for token in nlp(sent) ]
+
+
+def test_never_skips_a_headword(nlp):
+    screen = PreScreen(LEXICON, lemma_tables(nlp), tokenizer=nlp.tokenizer)
+    assert screen.check_headword
+    skipped = 0
+    for sent in SENTENCES:
+        if not screen.has_headword(sent):
+            skipped += 1
+            assert not set(parse_lemmas(nlp, sent)) & LEXICON, sent
+    assert skipped >= 2
+
+
+def test_ruler_overrides(nlp):
+    tables = lemma_tables(nlp)
+    assert tables.overrides == {'gon': ['go'], 'wanna': ['want']}
+    assert tables.any_token == set()
+    screen = PreScreen(LEXICON, tables, tokenizer=nlp.tokenizer)
+    assert screen.has_headword('I am gonna leave now .')
+    assert screen.has_headword('We wanna eat .')
+
+
+def test_unbound_override_disables_check():
+    nlp = make_nlp()
+    nlp.get_pipe('attribute_ruler').add([[{'POS': 'AUX'}]], {'LEMMA': 'get'})
+    tables = lemma_tables(nlp)
+    assert tables.any_token == {'get'}
+    assert not PreScreen(LEXICON, tables, tokenizer=nlp.tokenizer).check_headword
@@ -0,0 +1,62 @@
+"""
+The single pass parser against the former regex functions, on lines of both formats
+"""
+import pytest
+
+from removeEditTag import (PAREN, SLASH, build_sentences, detect_format, edit_sentences, removeEditTag,
+                           removeEditTag_P, removeEditTag_P_exclusive, removeEditTag_exclusive, tokenize_edits)
+
+# EF877, [-x//XC-]{+y//XC+}
+SLASH_LINES = [
+    'He gave [-to//XC-] me a pen .',
+    'I {+give//XC+} him a car .',
+    'He [-gave//VT-]{+gives//VT+} [-to//XC-] her a book .',
+    'Hello [-,//PU-]{+.//PU+} bye',
+    'She gave [-to//XC-] him a pen and [-see//XC-]{+saw//XC+} a park .',
+    'a [-b//WC-]{+c//WC+} d [-e//SP-]{+f//SP+} g {+h//AR+} i [-j//D-] k',
+    'plain line .',
+]
+
+# EF2014, [-x-]{+y+}(XC)
+PAREN_LINES = [
+    'He gave [-to-](XC) me a pen .',
+    'I {+give+}(XC) him a car .',
+    'Hello [-,-]{+.+}(PU) bye',
+    'Hello [-A-]{+B+}(XC) [-.-]{+!+}(PU)',
+    'He [-gave-]{+gives+}(VT) [-to-](XC) her a book .',
+    'a [-b-]{+c+}(WC) d [-e-]{+f+}(SP) g {+h+}(AR) i [-j-](D) k',
+]
+
+
+@pytest.mark.parametrize('sent', SLASH_LINES)
+def test_slash_same_as_regex(sent):
+    assert detect_format(sent) == SLASH
+    assert edit_sentences(sent) == removeEditTag_exclusive(sent)
+    assert edit_sentences(sent, keep=None) == removeEditTag(sent)
+    assert build_sentences(tokenize_edits(sent)) == edit_sentences(sent)
+    assert build_sentences(tokenize_edits(sent), keep=None) == edit_sentences(sent, keep=None)
+
+
+@pytest.mark.parametrize('sent', PAREN_LINES)
+def test_paren_same_as_regex(sent):
+    assert detect_format(sent) == PAREN
+    assert edit_sentences(sent) == removeEditTag_P_exclusive(sent)
+    assert build_sentences(tokenize_edits(sent)) == edit_sentences(sent)
+    assert build_sentences(tokenize_edits(sent), keep=None) == edit_sentences(sent, keep=None)
+
+
+@pytest.mark.parametrize('sent', PAREN_LINES[:4])
+def test_paren_undo_all_same_as_regex(sent):
+    assert edit_sentences(sent, keep=None) == removeEditTag_P(sent)
+
+
+def test_paren_undo_all_several_edits():
+    # removeEditTag_P() matches from one edit to the feature of the next in after_edit
+    sent = 'He [-gave-]{+gives+}(VT) [-to-](XC) her a book .'
+    assert edit_sentences(sent, keep=None) == ('He gave to her a book .', 'He gives her a book .')
+
+
+def test_several_words():
+    sent = 'I want [-discuss//XC-]{+to discuss//XC+} it'
+    assert edit_sentences(sent) == ('I want discuss it', 'I want to discuss it')
+    assert edit_sentences('I want [-discuss-]{+to discuss+}(XC) it') == edit_sentences(sent)
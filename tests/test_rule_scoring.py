@@ -0,0 +1,81 @@
+"""
+RuleScores.filter() against the former threshold(), and top_k ranked by score among entries passing the other conditions
+"""
+import random
+
+import pytest
+
+from rule_scoring import RuleScores, SCORES
+
+# pmi of give: 'a' 0.558, 'b' 0.571
+COUNTS = {'give': {'a': 100, 'b': 16}, 'take': {'a': 64, 'b': 10, 'c': 90}}
+
+
+def threshold_linear(dic):
+    """
+    threshold() of main.py before rule_scoring.py, on a copy
+    """
+    dic = { key: dict(sub) for key, sub in dic.items() }
+    for key in list(dic.keys()):
+        sub = dic[key]
+        sub = sorted(sub.items(), key=lambda v: v[1], reverse=True) #[:5]
+        sub = [ pat_freq for pat_freq in sub if pat_freq[1]>10 ]
+
+        for item in list(dic[key].items()):
+            if item not in sub:
+                del dic[key][item[0]]
+
+        if list(dic[key].keys())==[]:
+            del dic[key]
+    return dic
+
+
+def random_counts(seed):
+    rng = random.Random(seed)
+    counts = {}
+    for hw in range(200):
+        for change in rng.sample(range(50), rng.randint(1, 6)):
+            counts.setdefault('hw{}'.format(hw), {})['ch{}'.format(change)] = rng.randint(1, 30)
+    return counts
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_min_count_same_as_threshold(seed):
+    counts = random_counts(seed)
+    result = RuleScores.from_counts(counts).filter(min_count=11)
+    expected = threshold_linear(counts)
+    assert result == expected
+    assert list(result) == list(expected)
+    assert all( list(result[hw]) == list(expected[hw]) for hw in expected )
+
+
+def test_top_k_by_count():
+    scores = RuleScores.from_counts(COUNTS)
+    assert scores.filter(top_k=1) == {'give': {'a': 100}, 'take': {'c': 90}}
+    assert scores.filter(top_k=2) == {'give': {'a': 100, 'b': 16}, 'take': {'a': 64, 'c': 90}}
+
+
+def test_top_k_by_score():
+    scores = RuleScores.from_counts(COUNTS)
+    pmi = { (hw, change): pmi for hw, change, _, _, pmi, _ in scores.iter_scores() }
+    assert pmi['give', 'b'] > 0.56 > pmi['give', 'a']
+    assert scores.filter(top_k=1, score='pmi')['give'] == {'b': 16}
+    for score in SCORES:
+        values = { (hw, change): value for hw, change, *row in scores.iter_scores() for name, value in zip(SCORES, row) if name==score }
+        best = { hw: max(sub, key=lambda change: values[hw, change]) for hw, sub in COUNTS.items() }
+        assert scores.filter(top_k=1, score=score) == { hw: {best[hw]: COUNTS[hw][best[hw]]} for hw in COUNTS }
+
+
+def test_top_k_among_passing_entries():
+    scores = RuleScores.from_counts(COUNTS)
+    # 'a' is the most frequent but fails min_score, 'b' is the best one left
+    assert scores.filter(top_k=1, min_score=0.56, score='pmi')['give'] == {'b': 16}
+    assert scores.filter(top_k=1, min_score=0.56)['give'] == {'b': 16}
+    # 'c' is the most frequent of take but fails min_count
+    assert scores.filter(top_k=1, min_count=91) == {'give': {'a': 100}}
+    assert scores.filter(top_k=1, min_count=65)['take'] == {'c': 90}
+
+
+def test_unknown_score():
+    with pytest.raises(ValueError):
+        RuleScores.from_counts(COUNTS).filter(top_k=1, score='chi2')
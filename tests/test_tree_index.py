@@ -0,0 +1,127 @@
+"""
+VerbTree and PatternTree against json.load(), and the rebuild when the json changes
+"""
+import json
+import os
+import shutil
+
+import pytest
+
+from tree_index import load_pattern_tree, load_verb_tree
+
+PATTERN_TREE = {
+    'V n -ed': {
+        'Verb with Object': {
+            'have/get': {'describe': ['<p>V n -ed Verb with Object</p>'], 'verb': [['have/get', 'fixed']], 'page': 305},
+            'want': {'describe': [], 'verb': [], 'page': 306},
+        },
+    },
+    'V n to n': {
+        'Verb with Object and Adjunct': {
+            'devote': {'describe': ['<p>“devote” – ünïcode</p>'], 'verb': [['devote', 'time'], ['dedicate']], 'page': 425},
+        },
+        'Verb with Object': {
+            'give': {'describe': ['<p>give</p>'], 'verb': [[]], 'page': 0},
+        },
+    },
+}
+
+
+def assert_same_pattern_tree(tree, value):
+    assert list(tree) == list(value)
+    assert len(tree) == len(value)
+    for p in value:
+        assert list(tree[p]) == list(value[p])
+        for s in value[p]:
+            assert list(tree[p][s]) == list(value[p][s])
+            for g, leaf in value[p][s].items():
+                assert tree[p][s][g] == leaf
+
+
+def test_verb_tree_same_as_json(tmp_path):
+    json_path = str(tmp_path/'verb_tree.json')
+    shutil.copy('verb_tree.json', json_path)
+    with open(json_path) as f:
+        value = json.load(f)
+    for _ in range(2):    # built, then opened from the saved index
+        tree = load_verb_tree(json_path)
+        assert os.path.exists(str(tmp_path/'verb_tree.idx'))
+        assert list(tree) == list(value)
+        assert len(tree) == len(value)
+        assert all( tree[verb] == entries for verb, entries in value.items() )
+        assert all( verb in tree for verb in value )
+        assert 'not a verb' not in tree
+        with pytest.raises(KeyError):
+            tree['not a verb']
+
+
+def test_pattern_tree_same_as_json(tmp_path):
+    json_path = str(tmp_path/'pattern_tree.json')
+    with open(json_path, 'w') as f:
+        json.dump(PATTERN_TREE, f)
+    for _ in range(2):
+        tree = load_pattern_tree(json_path)
+        assert_same_pattern_tree(tree, PATTERN_TREE)
+        assert 'V n' not in tree
+        with pytest.raises(KeyError):
+            tree['V n']
+
+
+def test_rebuilt_when_json_changes(tmp_path):
+    json_path = str(tmp_path/'pattern_tree.json')
+    with open(json_path, 'w') as f:
+        json.dump(PATTERN_TREE, f)
+    load_pattern_tree(json_path)
+
+    changed = {'V n': {'Verb with Object': {'like': {'describe': [], 'verb': [['like']], 'page': 1}}}}
+    changed.update(PATTERN_TREE)
+    with open(json_path, 'w') as f:
+        json.dump(changed, f)
+    stat = os.stat(json_path)
+    os.utime(json_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert_same_pattern_tree(load_pattern_tree(json_path), changed)
+
+    verb_path = str(tmp_path/'verb_tree.json')
+    with open(verb_path, 'w') as f:
+        json.dump({'give': [['V n n', 'Verb with two Objects', 'give', 0, 1, 2, 3]]}, f)
+    assert dict(load_verb_tree(verb_path)) == {'give': [['V n n', 'Verb with two Objects', 'give', 0, 1, 2, 3]]}
+    with open(verb_path, 'w') as f:
+        json.dump({'take': [], 'give': [['V n', 'Verb with Object', 'give', 0, 0, 0, 1]]}, f)
+    stat = os.stat(verb_path)
+    os.utime(verb_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    tree = load_verb_tree(verb_path)
+    assert list(tree) == ['take', 'give']
+    assert tree['give'] == [['V n', 'Verb with Object', 'give', 0, 0, 0, 1]]
+
+
+@pytest.mark.parametrize('tree', [
+    {'give': [['V n n', 'Verb with two Objects', 'give', 0, 1, 2, 2**40]]},   # out of the record's int range
+    {'give': [['V n n', 'Verb with two Objects', 'give', 0, 1, 2]]},
+    {'give': [['V n n', 'Verb with two Objects', 'give', 0, 1, 2, 3.5]]},
+    {'give': 'V n n'},
+    [['V n n']],
+])
+def test_verb_tree_json_when_index_fails(tmp_path, tree):
+    json_path = str(tmp_path/'verb_tree.json')
+    with open(json_path, 'w') as f:
+        json.dump({'take': [['V n', 'Verb with Object', 'take', 0, 0, 0, 1]]}, f)
+    load_verb_tree(json_path)
+    with open(json_path, 'w') as f:
+        json.dump(tree, f)
+    stat = os.stat(json_path)
+    os.utime(json_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert load_verb_tree(json_path) == tree
+    assert sorted(os.listdir(str(tmp_path))) == ['verb_tree.json']
+
+
+@pytest.mark.parametrize('tree', [
+    {'V n n': ['Verb with two Objects']},
+    {'V n n': {'Verb with two Objects': 'give'}},
+])
+def test_pattern_tree_json_when_index_fails(tmp_path, tree):
+    json_path = str(tmp_path/'pattern_tree.json')
+    with open(json_path, 'w') as f:
+        json.dump(tree, f)
+    assert load_pattern_tree(json_path) == tree
+    assert sorted(os.listdir(str(tmp_path))) == ['pattern_tree.json']
@@ -0,0 +1,113 @@
+"""
+Iterative and batch twoSequenceAlignment() against the original recursive implementation,
+and the persistent alignment cache
+"""
+import random
+
+import pytest
+
+import twoSequenceAlignment as tsa
+from twoSequenceAlignment import twoSequenceAlignment, twoSequenceAlignment_batch, load_alignment_cache, save_alignment_cache
+
+TAGS = ['V', 'n', 'to', 'about', 'for', 'that', 'adj', 'wh', 'inf', '-ing']
+
+
+def recursive_alignment(str1, str2, p_xy, p_gap, r_match):
+    """
+    twoSequenceAlignment() before it was made iterative and memoized
+    """
+    dp_matrix = [ [ j*p_gap for j in range(len(str1)+1) ] ]
+    for i in range(1, len(str2)+1):
+        dp_matrix.append( [i*p_gap] + [0]*len(str1) )
+    for i in range(1, len(str2)+1):
+        for j in range(1, len(str1)+1):
+            word_miss = dp_matrix[i-1][j] + p_gap
+            if str1[j-1]==str2[i-1]:
+                word_word = dp_matrix[i-1][j-1] + r_match
+            else:
+                word_word = dp_matrix[i-1][j-1] + p_xy
+            miss_word = dp_matrix[i][j-1] + p_gap
+            dp_matrix[i][j] = max(word_miss, word_word, miss_word)
+    final_score = dp_matrix[i][j]
+    s1, s2 = recursive_backtrack(dp_matrix, str1, str2, p_xy, p_gap, r_match, i, j, [], [])
+    return s1, s2, final_score
+
+
+def recursive_backtrack(dp_matrix, str1, str2, p_xy, p_gap, r_match, i, j, s1, s2):
+    if i==0 and j==0:
+        s1.reverse()
+        s2.reverse()
+        return s1, s2
+    if dp_matrix[i-1][j-1] + p_xy == dp_matrix[i][j] and i-1>=0 and j-1>=0:
+        s1.append(str1[j-1])
+        s2.append(str2[i-1])
+        recursive_backtrack(dp_matrix, str1, str2, p_xy, p_gap, r_match, i-1, j-1, s1, s2)
+    elif dp_matrix[i-1][j] + p_gap == dp_matrix[i][j] and i-1>=0 and j>=0:
+        s1.append('-')
+        s2.append(str2[i-1])
+        recursive_backtrack(dp_matrix, str1, str2, p_xy, p_gap, r_match, i-1, j, s1, s2)
+    elif dp_matrix[i][j-1] + p_gap == dp_matrix[i][j] and i>=0 and j-1>=0:
+        s1.append(str1[j-1])
+        s2.append('-')
+        recursive_backtrack(dp_matrix, str1, str2, p_xy, p_gap, r_match, i, j-1, s1, s2)
+    elif dp_matrix[i-1][j-1] + r_match == dp_matrix[i][j] and str1[j-1]==str2[i-1] and i-1>=0 and j-1>=0:
+        s1.append(str1[j-1])
+        s2.append(str2[i-1])
+        recursive_backtrack(dp_matrix, str1, str2, p_xy, p_gap, r_match, i-1, j-1, s1, s2)
+    return s1, s2
+
+
+def random_pairs(n=500, seed=0):
+    rng = random.Random(seed)
+    return [ ([ rng.choice(TAGS) for _ in range(rng.randint(1, 6)) ],
+              [ rng.choice(TAGS) for _ in range(rng.randint(1, 8)) ]) for _ in range(n) ]
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    tsa.alignment_cache.clear()
+    yield
+    tsa.alignment_cache.clear()
+
+
+@pytest.mark.parametrize('scores', [(0, 0, 1), (-1, -1, 2), (-1, -2, 1)])
+def test_same_as_recursive(scores):
+    for str1, str2 in random_pairs():
+        expected = recursive_alignment(str1, str2, *scores)
+        assert twoSequenceAlignment(str1, str2, *scores) == expected
+        # Again from alignment_cache
+        assert twoSequenceAlignment(str1, str2, *scores) == expected
+
+
+@pytest.mark.parametrize('scores', [(0, 0, 1), (-1, -1, 2), (-1, -2, 1)])
+def test_batch_same_as_recursive(scores):
+    pairs = random_pairs(seed=1) + [ ([], ['V']) ]
+    results = twoSequenceAlignment_batch(pairs, *scores, use_cache=False)
+    assert results[-1] is None
+    for (str1, str2), result in zip(pairs, results[:-1]):
+        assert tuple(result) == recursive_alignment(str1, str2, *scores)
+
+
+def test_save_added_entries(tmp_path):
+    pairs = random_pairs(20, seed=2)
+    for str1, str2 in pairs[:10]:
+        twoSequenceAlignment(str1, str2, 0, 0, 1)
+    initial_size = len(tsa.alignment_cache)
+    for str1, str2 in pairs[10:]:
+        twoSequenceAlignment(str1, str2, 0, 0, 1)
+    added = list(tsa.alignment_cache.items())[initial_size:]
+
+    save_alignment_cache(str(tmp_path/'added.json'), initial_size)
+    tsa.alignment_cache.clear()
+    assert load_alignment_cache(str(tmp_path/'added.json')) == len(added)
+    assert list(tsa.alignment_cache.items()) == added
+
+
+def test_load_respects_cache_size(tmp_path, monkeypatch):
+    for str1, str2 in random_pairs(50, seed=3):
+        twoSequenceAlignment(str1, str2, 0, 0, 1)
+    save_alignment_cache(str(tmp_path/'cache.json'))
+    tsa.alignment_cache.clear()
+    monkeypatch.setattr(tsa, 'ALIGNMENT_CACHE_SIZE', 10)
+    assert load_alignment_cache(str(tmp_path/'cache.json')) == 10
+    assert len(tsa.alignment_cache) == 10
@@ -0,0 +1,357 @@
+"""
+Compact binary, memory-mapped form of verb_tree.json and pattern_tree.json for local_api,
+decoded lazily, one verb or one verb group at a time.
+
+from tree_index import load_verb_tree, load_pattern_tree
+
+Sample:
+    VT = load_verb_tree('verb_tree.json')
+    VT['abandon'][2]
+    PT = load_pattern_tree('pattern_tree.json')
+    PT['V n to n']['Verb with Object and Adjunct']['devote']['page']
+Return:
+    ['V n to n', 'Verb with Object and Adjunct', 'devote', 0, 0, 4, 425]
+    425
+    - Both behave as read-only dicts in the order of the json,
+      and return the same values as json.load()
+
+Usage:
+    python tree_index.py verb_tree.json pattern_tree.json    # build verb_tree.idx and pattern_tree.idx
+
+verb_tree.idx:
+    - header, then string offsets, verbs, verbs sorted by name, records, strings
+    - strings (verbs, patterns, structures, verb groups) are interned once
+    - each entry [pattern, struct, verb_group, int, int, int, int] is a fixed-width record
+      of 3 string ids and 4 ints, a verb is (name id, first record, number of records)
+    - a verb is found by binary search over the sorted verbs, without reading the others
+
+pattern_tree.idx:
+    - header, then the nested keys {pattern: {struct: {verb_group: leaf id}}} as json,
+      leaf offsets, and each leaf as its own json blob, parsed on first access
+
+Note:
+    - An index records size and mtime of its json and is rebuilt when they change
+    - load_*() return the value of json.load() if the index cannot be built,
+      e.g. on a read-only directory or entries out of the fixed-width format
+    - Decoded values are cached and shared between calls, as the dicts of json.load() are
+"""
+import bisect
+import json
+import mmap
+import os
+import struct
+from array import array
+from collections.abc import Mapping
+
+VERB_MAGIC = b'VTR1'
+PATTERN_MAGIC = b'PTR1'
+_VERB_HEADER = struct.Struct('<4sQqIII')     # magic, json size, json mtime_ns, n_strings, n_verbs, n_records
+_PATTERN_HEADER = struct.Struct('<4sQqII')   # magic, json size, json mtime_ns, keys bytes, n_leaves
+_VERB = struct.Struct('<III')                # name id, first record, number of records
+_RECORD = struct.Struct('<IIIiiii')          # pattern id, struct id, verb group id, 4 ints
+
+
+def _json_stat(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _write_atomic(path, chunks):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp_path, path)
+
+
+def _open_mmap(path, magic, header, json_stat):
+    """
+    (mmap, header fields), or None if path is missing, not an index or built from another json
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        fields = header.unpack_from(data)
+    except struct.error:
+        data.close()
+        return None
+    if fields[0] != magic or (json_stat is not None and fields[1:3] != tuple(json_stat)):
+        data.close()
+        return None
+    return data, fields
+
+
+def compile_verb_tree(tree, path, json_stat=(0, 0)):
+    """
+    Write {verb: [[pattern, struct, verb_group, int, int, int, int], ...]} into path
+    """
+    strings = []
+    string_id = {}
+    def intern(string):
+        sid = string_id.get(string)
+        if sid is None:
+            sid = string_id[string] = len(strings)
+            strings.append(string)
+        return sid
+
+    if not isinstance(tree, dict):
+        raise ValueError('unsupported verb tree: {}'.format(type(tree).__name__))
+    verbs = []
+    records = []
+    for verb, entries in tree.items():
+        if not isinstance(entries, list):
+            raise ValueError('unsupported entries of {}: {}'.format(verb, entries))
+        verbs.append( (intern(verb), len(records), len(entries)) )
+        for entry in entries:
+            if not isinstance(entry, list) or len(entry)!=7 or not all( isinstance(value, str) for value in entry[:3] ) \
+                    or not all( isinstance(value, int) for value in entry[3:] ):
+                raise ValueError('unsupported entry of {}: {}'.format(verb, entry))
+            records.append( (intern(entry[0]), intern(entry[1]), intern(entry[2])) + tuple(entry[3:]) )
+
+    encoded = [ string.encode('utf-8') for string in strings ]
+    offsets = array('I', [0])
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    by_name = sorted(range(len(verbs)), key=lambda idx: encoded[verbs[idx][0]])
+
+    _write_atomic(path, [
+        _VERB_HEADER.pack(VERB_MAGIC, json_stat[0], json_stat[1], len(strings), len(verbs), len(records)),
+        offsets.tobytes(),
+        b''.join( _VERB.pack(*verb) for verb in verbs ),
+        array('I', by_name).tobytes(),
+        b''.join( _RECORD.pack(*record) for record in records ),
+        b''.join(encoded),
+    ])
+
+
+class VerbTree(Mapping):
+    """
+    Read-only {verb: [[pattern, struct, verb_group, int, int, int, int], ...]} over a verb_tree.idx
+    """
+    def __init__(self, data, n_strings, n_verbs, n_records):
+        self.data = data
+        self.n_verbs = n_verbs
+        self.offsets_pos = _VERB_HEADER.size
+        self.verbs_pos = self.offsets_pos + 4*(n_strings+1)
+        self.sorted_pos = self.verbs_pos + _VERB.size*n_verbs
+        self.records_pos = self.sorted_pos + 4*n_verbs
+        self.strings_pos = self.records_pos + _RECORD.size*n_records
+        self.strings = {}   # string id -> str, decoded on first use
+        self.entries = {}   # verb position -> entries, decoded on first use
+
+    @classmethod
+    def open(cls, path, json_stat=None):
+        opened = _open_mmap(path, VERB_MAGIC, _VERB_HEADER, json_stat)
+        if opened is None:
+            return None
+        data, (_, _, _, n_strings, n_verbs, n_records) = opened
+        return cls(data, n_strings, n_verbs, n_records)
+
+    def _bytes(self, sid):
+        start, end = struct.unpack_from('<II', self.data, self.offsets_pos + 4*sid)
+        return self.data[self.strings_pos+start:self.strings_pos+end]
+
+    def _string(self, sid):
+        string = self.strings.get(sid)
+        if string is None:
+            string = self.strings[sid] = self._bytes(sid).decode('utf-8')
+        return string
+
+    def _verb(self, pos):
+        return _VERB.unpack_from(self.data, self.verbs_pos + _VERB.size*pos)
+
+    def _find(self, verb):
+        """
+        Position of verb in the json order, None if missing
+        """
+        key = verb.encode('utf-8')
+        names = _SortedNames(self)
+        idx = bisect.bisect_left(names, key)
+        if idx < self.n_verbs and names[idx]==key:
+            return names.position(idx)
+        return None
+
+    def _entries(self, pos):
+        entries = self.entries.get(pos)
+        if entries is None:
+            _, first, count = self._verb(pos)
+            entries = []
+            for idx in range(first, first+count):
+                record = _RECORD.unpack_from(self.data, self.records_pos + _RECORD.size*idx)
+                entries.append( [ self._string(sid) for sid in record[:3] ] + list(record[3:]) )
+            self.entries[pos] = entries
+        return entries
+
+    def __getitem__(self, verb):
+        pos = self._find(verb) if isinstance(verb, str) else None
+        if pos is None:
+            raise KeyError(verb)
+        return self._entries(pos)
+
+    def __contains__(self, verb):
+        return isinstance(verb, str) and self._find(verb) is not None
+
+    def __iter__(self):
+        for pos in range(self.n_verbs):
+            yield self._string(self._verb(pos)[0])
+
+    def __len__(self):
+        return self.n_verbs
+
+
+class _SortedNames:
+    """
+    Encoded verb names in sorted order, indexable for bisect
+    """
+    def __init__(self, tree):
+        self.tree = tree
+
+    def position(self, idx):
+        return struct.unpack_from('<I', self.tree.data, self.tree.sorted_pos + 4*idx)[0]
+
+    def __getitem__(self, idx):
+        return self.tree._bytes(self.tree._verb(self.position(idx))[0])
+
+    def __len__(self):
+        return self.tree.n_verbs
+
+
+def compile_pattern_tree(tree, path, json_stat=(0, 0)):
+    """
+    Write {pattern: {struct: {verb_group: leaf}}} into path, each leaf as a json blob
+    """
+    leaves = []
+    def number(node, depth):
+        if depth==3:
+            leaves.append(json.dumps(node, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+            return len(leaves) - 1
+        if not isinstance(node, dict):
+            raise ValueError('unsupported node at depth {}: {}'.format(depth, node))
+        return { key: number(child, depth+1) for key, child in node.items() }
+    keys = json.dumps(number(tree, 0), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    offsets = array('Q', [0])
+    for leaf in leaves:
+        offsets.append(offsets[-1] + len(leaf))
+
+    _write_atomic(path, [
+        _PATTERN_HEADER.pack(PATTERN_MAGIC, json_stat[0], json_stat[1], len(keys), len(leaves)),
+        keys,
+        offsets.tobytes(),
+        b''.join(leaves),
+    ])
+
+
+class PatternTree(Mapping):
+    """
+    Read-only {pattern: {struct: {verb_group: leaf}}} over a pattern_tree.idx
+    """
+    def __init__(self, data, keys, offsets_pos, blobs_pos, leaves=None):
+        self.data = data
+        self.keys_tree = keys
+        self.offsets_pos = offsets_pos
+        self.blobs_pos = blobs_pos
+        self.leaves = {} if leaves is None else leaves   # leaf id -> decoded leaf, shared by every level
+        self.children = {}
+
+    @classmethod
+    def open(cls, path, json_stat=None):
+        opened = _open_mmap(path, PATTERN_MAGIC, _PATTERN_HEADER, json_stat)
+        if opened is None:
+            return None
+        data, (_, _, _, keys_bytes, n_leaves) = opened
+        start = _PATTERN_HEADER.size
+        keys = json.loads(data[start:start+keys_bytes].decode('utf-8'))
+        offsets_pos = start + keys_bytes
+        return cls(data, keys, offsets_pos, offsets_pos + 8*(n_leaves+1))
+
+    def _leaf(self, leaf_id):
+        leaf = self.leaves.get(leaf_id)
+        if leaf is None:
+            start, end = struct.unpack_from('<QQ', self.data, self.offsets_pos + 8*leaf_id)
+            leaf = self.leaves[leaf_id] = json.loads(self.data[self.blobs_pos+start:self.blobs_pos+end].decode('utf-8'))
+        return leaf
+
+    def __getitem__(self, key):
+        child = self.keys_tree[key]
+        if isinstance(child, int):
+            return self._leaf(child)
+        node = self.children.get(key)
+        if node is None:
+            node = self.children[key] = PatternTree(self.data, child, self.offsets_pos, self.blobs_pos, self.leaves)
+        return node
+
+    def __contains__(self, key):
+        return key in self.keys_tree
+
+    def __iter__(self):
+        return iter(self.keys_tree)
+
+    def __len__(self):
+        return len(self.keys_tree)
+
+
+def _load(json_path, index_path, suffix, opener, compiler):
+    if index_path is None:
+        index_path = os.path.splitext(json_path)[0] + suffix
+    json_stat = _json_stat(json_path)
+
+    tree = opener(index_path, json_stat)
+    if tree is None:
+        with open(json_path) as f:
+            value = json.load(f)
+        try:
+            compiler(value, index_path, json_stat)
+        except (OSError, ValueError, struct.error):
+            # No index, the json is used as it is
+            for path in (index_path, index_path + '.tmp'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            return value
+        tree = opener(index_path, json_stat)
+    return tree
+
+
+def load_verb_tree(json_path='verb_tree.json', index_path=None):
+    """
+    VerbTree of json_path, building its index first if missing or out of date
+    """
+    return _load(json_path, index_path, '.idx', VerbTree.open, compile_verb_tree)
+
+
+def load_pattern_tree(json_path='pattern_tree.json', index_path=None):
+    """
+    PatternTree of json_path, building its index first if missing or out of date
+    """
+    return _load(json_path, index_path, '.idx', PatternTree.open, compile_pattern_tree)
+
+
+# Build indices, then compare with json
+if __name__ == '__main__':
+    import sys
+    import time
+
+    for json_path in sys.argv[1:] or ['verb_tree.json']:
+        loader = load_pattern_tree if os.path.basename(json_path).startswith('pattern') else load_verb_tree
+        loader(json_path)
+
+        start_time = time.perf_counter()
+        with open(json_path) as f:
+            value = json.load(f)
+        json_seconds = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        tree = loader(json_path)
+        index_seconds = time.perf_counter() - start_time
+
+        assert list(tree)==list(value)
+        if loader is load_verb_tree:
+            assert all( tree[verb]==entries for verb, entries in value.items() )
+        else:
+            assert all( tree[p][s][g]==leaf for p in value for s in value[p] for g, leaf in value[p][s].items() )
+        print('{}: json.load {:.1f} ms, index open {:.2f} ms, same values'.format(json_path, json_seconds*1000, index_seconds*1000))
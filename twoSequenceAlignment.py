@@ -9,11 +9,19 @@ Note:
     - the method is implemented using DP
     - but used greedy method while backtracking XD
     - so it only returns one alignment even if there are multiple kind of alignemets.
+    - results are memoized in alignment_cache, inputs are short and repeat constantly
+    - save_alignment_cache(path) / load_alignment_cache(path) keep the cache across runs,
+      save_alignment_cache(path, start) only the entries added after the first start ones
+    - twoSequenceAlignment_batch(pairs, p_xy, p_gap, r_match) aligns many pairs at once with NumPy
 """
+import json
+import os
+from itertools import islice
 
 
 def twoSequenceAlignment(str1, str2, p_xy, p_gap, r_match):
     """To generate alignment between two sequences with lowest cost.
+    Results are memoized in alignment_cache, keyed by all arguments.
 
     Args:
         str1 (list) : first sequence for alignment.
@@ -27,32 +35,43 @@ def twoSequenceAlignment(str1, str2, p_xy, p_gap, r_match):
         s2 (list) : second sequence after alignment.
         final_score (int) : score for output alignment.
     """
+    key = (tuple(str1), tuple(str2), p_xy, p_gap, r_match)
+    cached = alignment_cache.get(key)
+    if cached is None:
+        s1, s2, final_score = align(str1, str2, p_xy, p_gap, r_match)
+        if len(alignment_cache) < ALIGNMENT_CACHE_SIZE:
+            alignment_cache[key] = (tuple(s1), tuple(s2), final_score)
+        return s1, s2, final_score
+
+    s1, s2, final_score = cached
+    return list(s1), list(s2), final_score
+
+
+def align(str1, str2, p_xy, p_gap, r_match):
+    """Uncached twoSequenceAlignment()."""
+
+    if len(str1)==0 or len(str2)==0:
+        raise ValueError('cannot align an empty sequence, str1={}, str2={}'.format(str1, str2))
 
     # Initialize dp_matrix
-    dp_matrix = []
-    for i in range(len(str2)+1):
-        if i==0:
-            temp = [ j*p_gap for j in range(len(str1)+1) ]
-        else:
-            temp = []
-            for j in range(len(str1)+1):
-                if j==0:
-                    temp.append(i*p_gap)
-                else:
-                    temp.append(0)
-        dp_matrix.append(temp)
+    dp_matrix = [ [ j*p_gap for j in range(len(str1)+1) ] ]
+    for i in range(1, len(str2)+1):
+        dp_matrix.append( [i*p_gap] + [0]*len(str1) )
 
     # Fill in dp_matrix
     for i in range(1, len(str2)+1):
+        row = dp_matrix[i]
+        prev_row = dp_matrix[i-1]
+        tag2 = str2[i-1]
         for j in range(1, len(str1)+1):
-            word_miss = dp_matrix[i-1][j] + p_gap
-            if str1[j-1]==str2[i-1]:
-                word_word = dp_matrix[i-1][j-1] + r_match
+            word_miss = prev_row[j] + p_gap
+            if str1[j-1]==tag2:
+                word_word = prev_row[j-1] + r_match
             else:
-                word_word = dp_matrix[i-1][j-1] + p_xy
-            miss_word = dp_matrix[i][j-1] + p_gap
+                word_word = prev_row[j-1] + p_xy
+            miss_word = row[j-1] + p_gap
 
-            dp_matrix[i][j] = max(word_miss, word_word, miss_word)
+            row[j] = max(word_miss, word_word, miss_word)
     final_score = dp_matrix[i][j]
 
     # # Print dp_matrix
@@ -60,51 +79,208 @@ def twoSequenceAlignment(str1, str2, p_xy, p_gap, r_match):
     #    print(line)
 
     # Backtrack
-    s1 = []
-    s2 = []
-    s1, s2 = backtrack(dp_matrix, str1, str2, p_xy, p_gap, r_match, i, j, s1, s2)
+    s1, s2 = backtrack(dp_matrix, str1, str2, p_xy, p_gap, r_match, i, j, [], [])
 
     return s1, s2, final_score 
 
 
 def backtrack(dp_matrix, str1, str2, p_xy, p_gap, r_match, i, j, s1, s2):
+    """
+    Greedy backtracking from dp_matrix[i][j] to dp_matrix[0][0],
+    preferring mismatch, then gap in str1, gap in str2 and match.
+    """
+    while i!=0 or j!=0:
+        cur = dp_matrix[i][j]
+        if i>=1 and j>=1 and dp_matrix[i-1][j-1] + p_xy == cur:
+            s1.append(str1[j-1])
+            s2.append(str2[i-1])
+            i, j = i-1, j-1
+        elif i>=1 and dp_matrix[i-1][j] + p_gap == cur:
+            s1.append('-')
+            s2.append(str2[i-1])
+            i = i-1
+        elif j>=1 and dp_matrix[i][j-1] + p_gap == cur:
+            s1.append(str1[j-1])
+            s2.append('-')
+            j = j-1
+        elif i>=1 and j>=1 and dp_matrix[i-1][j-1] + r_match == cur and str1[j-1]==str2[i-1]:
+            s1.append(str1[j-1])
+            s2.append(str2[i-1])
+            i, j = i-1, j-1
+        else:
+            print('something wrong')
+            return s1, s2
+
+    s1.reverse()
+    s2.reverse()
+    return s1, s2
+
+
+def twoSequenceAlignment_batch(pairs, p_xy, p_gap, r_match, use_cache=True):
+    """To generate alignments of many pairs of sequences at once, with NumPy.
+    Same result and tie-breaking as twoSequenceAlignment() for every pair.
+
+    Args:
+        pairs (list) : [(str1, str2), ...], sequences of tags or of integer tag ids.
+        p_xy (int) : penalty for mismatch.
+        p_gap (int) : penalty for gap.
+        r_match (int) : reward for match.
+        use_cache (bool) : look up and fill alignment_cache.
+
+    Returns:
+        results (list) : [(s1, s2, final_score), ...] aligned with pairs,
+                         None for a pair with an empty sequence.
+    """
+    import numpy as np
+
+    results = [None]*len(pairs)
+
+    # Distinct pairs not in cache
+    todo = {}
+    for idx, (str1, str2) in enumerate(pairs):
+        if len(str1)==0 or len(str2)==0:
+            continue
+        if hasattr(str1, 'tolist'):
+            str1 = str1.tolist()
+        if hasattr(str2, 'tolist'):
+            str2 = str2.tolist()
+        key = (tuple(str1), tuple(str2), p_xy, p_gap, r_match)
+        cached = alignment_cache.get(key) if use_cache else None
+        if cached is not None:
+            results[idx] = (list(cached[0]), list(cached[1]), cached[2])
+        else:
+            todo.setdefault(key, []).append(idx)
+    if not todo:
+        return results
+    keys = list(todo)
+
+    # Encode tags into integer ids, padding never matches
+    vocab = {}
+    B = len(keys)
+    len1 = np.array([ len(key[0]) for key in keys ])
+    len2 = np.array([ len(key[1]) for key in keys ])
+    L1 = int(len1.max())
+    L2 = int(len2.max())
+    codes1 = np.full((B, L1), -1, dtype=np.int64)
+    codes2 = np.full((B, L2), -2, dtype=np.int64)
+    for codes, lens, part in [(codes1, len1, 0), (codes2, len2, 1)]:
+        flat = [ vocab.setdefault(tag, len(vocab)) for key in keys for tag in key[part] ]
+        rows = np.repeat(np.arange(B), lens)
+        cols = np.arange(len(flat)) - np.repeat(np.cumsum(lens) - lens, lens)
+        codes[rows, cols] = flat
+    match = codes2[:, :, None] == codes1[:, None, :]        # (B, L2, L1)
+    word_word_score = np.where(match, r_match, p_xy)
 
-    if i==0 and j==0:
-        s1.reverse()
-        s2.reverse()
-        return s1, s2
-
-    #print('cur:', dp_matrix[i][j])
-
-    if dp_matrix[i-1][j-1] + p_xy == dp_matrix[i][j] and i-1>=0 and j-1>=0:
-        s1.append(str1[j-1])
-        s2.append(str2[i-1])
-        #print(s1, s2)
-        #print(dp_matrix[i-1][j-1])
-        backtrack(dp_matrix, str1, str2, p_xy, p_gap, r_match, i-1, j-1, s1, s2)
-    elif dp_matrix[i-1][j] + p_gap == dp_matrix[i][j] and i-1>=0 and j>=0:
-        s1.append('-')
-        s2.append(str2[i-1])
-        #print(s1, s2)
-        #print(dp_matrix[i-1][j])
-        backtrack(dp_matrix, str1, str2, p_xy, p_gap, r_match, i-1, j, s1, s2)
-    elif dp_matrix[i][j-1] + p_gap == dp_matrix[i][j] and i>=0 and j-1>=0:
-        s1.append(str1[j-1])
-        s2.append('-')
-        #print(s1, s2)
-        #print(dp_matrix[i][j-1])
-        backtrack(dp_matrix, str1, str2, p_xy, p_gap, r_match, i, j-1, s1, s2)
-    elif dp_matrix[i-1][j-1] + r_match == dp_matrix[i][j] and str1[j-1]==str2[i-1] and i-1>=0 and j-1>=0:
-        #print(dp_matrix[i-1][j-1], r_match, dp_matrix[i][j])
-        s1.append(str1[j-1])
-        s2.append(str2[i-1])
-        #print(s1, s2)
-        #print(dp_matrix[i-1][j-1])
-        backtrack(dp_matrix, str1, str2, p_xy, p_gap, r_match, i-1, j-1, s1, s2)
-    else:
+    # Fill in all dp_matrix together, cell by cell
+    dp = np.zeros((B, L2+1, L1+1), dtype=np.int64)
+    dp[:, 0, :] = np.arange(L1+1) * p_gap
+    dp[:, :, 0] = (np.arange(L2+1) * p_gap)[None, :]
+    for i in range(1, L2+1):
+        for j in range(1, L1+1):
+            dp[:, i, j] = np.maximum(np.maximum(dp[:, i-1, j] + p_gap, dp[:, i-1, j-1] + word_word_score[:, i-1, j-1]),
+                                     dp[:, i, j-1] + p_gap)
+    batch = np.arange(B)
+    final_score = dp[batch, len2, len1]
+
+    # Backtrack all pairs together, same preference as backtrack(),
+    # collecting the tag ids of s1 and s2 (GAP for '-') from the end
+    GAP = len(vocab)
+    i = len2.copy()
+    j = len1.copy()
+    out1 = np.full((B, L1+L2), GAP, dtype=np.int64)
+    out2 = np.full((B, L1+L2), GAP, dtype=np.int64)
+    n_steps = np.zeros(B, dtype=np.int64)
+    wrong = np.zeros(B, dtype=bool)
+    for step in range(L1+L2):
+        active = ((i>0) | (j>0)) & ~wrong
+        if not active.any():
+            break
+        im1 = np.maximum(i-1, 0)
+        jm1 = np.maximum(j-1, 0)
+        cur = dp[batch, i, j]
+        has_i = i>=1
+        has_j = j>=1
+        diag = has_i & has_j & (dp[batch, im1, jm1] + p_xy == cur)
+        up = ~diag & has_i & (dp[batch, im1, j] + p_gap == cur)
+        left = ~diag & ~up & has_j & (dp[batch, i, jm1] + p_gap == cur)
+        diag |= ~up & ~left & has_i & has_j & (dp[batch, im1, jm1] + r_match == cur) & match[batch, im1, jm1]
+        wrong |= active & ~(diag | up | left)
+
+        moved = active & (diag | up | left)
+        out1[:, step] = np.where(diag | left, codes1[batch, jm1], GAP)
+        out2[:, step] = np.where(diag | up, codes2[batch, im1], GAP)
+        n_steps += moved
+        i = np.where(moved & (diag | up), i-1, i)
+        j = np.where(moved & (diag | left), j-1, j)
+
+    # Reverse the finished alignments, as backtrack() does unless something went wrong
+    col = np.arange(L1+L2)[None, :]
+    rev = np.where(wrong[:, None], col, n_steps[:, None] - 1 - col)
+    rev = np.clip(rev, 0, L1+L2-1)
+    id2tag = np.empty(GAP+1, dtype=object)
+    for tag, tag_id in vocab.items():
+        id2tag[tag_id] = tag
+    id2tag[GAP] = '-'
+    s1_rows = id2tag[out1[batch[:, None], rev]].tolist()
+    s2_rows = id2tag[out2[batch[:, None], rev]].tolist()
+    n_steps = n_steps.tolist()
+    final_score = final_score.tolist()
+    if wrong.any():
         print('something wrong')
 
-    return s1, s2
+    cache = use_cache and len(alignment_cache) + B <= ALIGNMENT_CACHE_SIZE
+    for b, key in enumerate(keys):
+        n = n_steps[b]
+        s1 = s1_rows[b][:n]
+        s2 = s2_rows[b][:n]
+        score = final_score[b]
+        if cache:
+            alignment_cache[key] = (tuple(s1), tuple(s2), score)
+        idxs = todo[key]
+        results[idxs[0]] = (s1, s2, score)
+        for idx in idxs[1:]:
+            results[idx] = (s1[:], s2[:], score)
+
+    return results
+
+
+def load_alignment_cache(path):
+    """
+    Add alignments saved by save_alignment_cache() into alignment_cache,
+    up to ALIGNMENT_CACHE_SIZE entries.
+    Return the number of entries added, 0 if path does not exist.
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        entries = json.load(f)
+    n_added = 0
+    for str1, str2, p_xy, p_gap, r_match, s1, s2, final_score in entries:
+        if len(alignment_cache) >= ALIGNMENT_CACHE_SIZE:
+            break
+        key = (tuple(str1), tuple(str2), p_xy, p_gap, r_match)
+        if key not in alignment_cache:
+            alignment_cache[key] = (tuple(s1), tuple(s2), final_score)
+            n_added += 1
+    return n_added
+
+
+def save_alignment_cache(path, start=0):
+    """
+    Save alignment_cache as json, so that later runs start warm.
+    Entries are never removed from alignment_cache, so its insertion order tells the new ones:
+    start=len(alignment_cache) taken earlier saves only the entries added since then.
+    """
+    entries = [ (list(str1), list(str2), p_xy, p_gap, r_match, list(s1), list(s2), final_score)
+                for (str1, str2, p_xy, p_gap, r_match), (s1, s2, final_score) in islice(alignment_cache.items(), start, None) ]
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(entries, f)
+    os.replace(tmp_path, path)
+
+
+ALIGNMENT_CACHE_SIZE = 1000000
+alignment_cache = {}
 
 
 # Testing code